@@ -0,0 +1,71 @@
+# Generated by Django 4.2.9 on 2026-10-19 04:47
+
+from django.conf import settings
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# Seed the ledger from existing queries so aggregated totals match
+# User.total_tokens_used from day one
+BACKFILL_LEDGER_SQL = """
+INSERT INTO token_usage (user_id, query_id, department, model, tokens, created_at)
+SELECT user_id, id, '', '', tokens_used, created_at
+FROM queries
+WHERE tokens_used > 0;
+"""
+
+BACKFILL_DAILY_SQL = """
+INSERT INTO token_usage_daily (day, user_id, department, tokens, queries)
+SELECT (created_at AT TIME ZONE %s)::date, user_id, department, SUM(tokens), COUNT(*)
+FROM token_usage
+GROUP BY 1, 2, 3;
+"""
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('retrieval', '0002_query_context_tokens'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TokenUsageDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(help_text='Calendar day (TIME_ZONE)')),
+                ('department', models.CharField(blank=True, max_length=100)),
+                ('tokens', models.BigIntegerField(default=0, validators=[django.core.validators.MinValueValidator(0)])),
+                ('queries', models.IntegerField(default=0, help_text='Number of charged queries', validators=[django.core.validators.MinValueValidator(0)])),
+                ('user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='token_usage_daily', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'token_usage_daily',
+                'ordering': ['-day'],
+                'indexes': [models.Index(fields=['day'], name='token_usage_day_39b256_idx'), models.Index(fields=['user', 'day'], name='token_usage_user_id_cbb2ea_idx'), models.Index(fields=['department', 'day'], name='token_usage_departm_3df3f3_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='TokenUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('department', models.CharField(blank=True, help_text='Department the usage is attributed to', max_length=100)),
+                ('model', models.CharField(blank=True, help_text='LLM that consumed the tokens', max_length=100)),
+                ('tokens', models.IntegerField(help_text='Tokens consumed (input + output)', validators=[django.core.validators.MinValueValidator(0)])),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('query', models.ForeignKey(blank=True, help_text='Query that used the tokens', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='token_usage', to='retrieval.query')),
+                ('user', models.ForeignKey(help_text='User who was charged', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='token_usage', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'token_usage',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['-created_at'], name='token_usage_created_44edbd_idx')],
+            },
+        ),
+        migrations.RunSQL(BACKFILL_LEDGER_SQL, migrations.RunSQL.noop),
+        migrations.RunSQL([(BACKFILL_DAILY_SQL, [settings.TIME_ZONE])], migrations.RunSQL.noop),
+    ]
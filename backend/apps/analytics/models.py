@@ -0,0 +1,101 @@
+from django.db import models
+from django.conf import settings
+from django.core.validators import MinValueValidator
+
+
+class TokenUsage(models.Model):
+    """
+    Append-only ledger: one row per charged LLM call. Recording usage is
+    an INSERT, so concurrent queries never contend on the users row.
+    Rolled up into TokenUsageDaily and User.total_tokens_used by
+    aggregate_token_usage_task.
+    """
+    
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='token_usage',
+        help_text="User who was charged"
+    )
+    
+    query = models.ForeignKey(
+        'retrieval.Query',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='token_usage',
+        help_text="Query that used the tokens"
+    )
+    
+    department = models.CharField(
+        max_length=100,
+        blank=True,
+        help_text="Department the usage is attributed to"
+    )
+    
+    model = models.CharField(
+        max_length=100,
+        blank=True,
+        help_text="LLM that consumed the tokens"
+    )
+    
+    tokens = models.IntegerField(
+        validators=[MinValueValidator(0)],
+        help_text="Tokens consumed (input + output)"
+    )
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'token_usage'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.tokens} tokens at {self.created_at}"
+
+
+class TokenUsageDaily(models.Model):
+    """Ledger totals per day, user and department, rebuilt from TokenUsage."""
+    
+    day = models.DateField(
+        help_text="Calendar day (TIME_ZONE)"
+    )
+    
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='token_usage_daily'
+    )
+    
+    department = models.CharField(
+        max_length=100,
+        blank=True
+    )
+    
+    tokens = models.BigIntegerField(
+        default=0,
+        validators=[MinValueValidator(0)]
+    )
+    
+    queries = models.IntegerField(
+        default=0,
+        validators=[MinValueValidator(0)],
+        help_text="Number of charged queries"
+    )
+    
+    class Meta:
+        db_table = 'token_usage_daily'
+        ordering = ['-day']
+        indexes = [
+            models.Index(fields=['day']),
+            models.Index(fields=['user', 'day']),
+            models.Index(fields=['department', 'day']),
+        ]
+    
+    def __str__(self):
+        return f"{self.day} {self.department or '-'}: {self.tokens} tokens"
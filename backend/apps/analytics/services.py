@@ -0,0 +1,88 @@
+import logging
+from datetime import datetime, time, timedelta
+from django.db import transaction
+from django.db.models import Sum, Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from apps.core.models import User
+from .models import TokenUsage, TokenUsageDaily
+
+logger = logging.getLogger(__name__)
+
+
+class TokenUsageService:
+
+    @staticmethod
+    def record(user, tokens: int, query=None, department: str = '', model: str = ''):
+        """Append one ledger entry. Call inside the transaction saving the query."""
+        if tokens <= 0:
+            return None
+        return TokenUsage.objects.create(
+            user=user,
+            query=query,
+            department=department or '',
+            model=model,
+            tokens=tokens
+        )
+    
+    @staticmethod
+    def record_many(entries: list):
+        """Append TokenUsage objects in one INSERT, skipping zero-token ones."""
+        return TokenUsage.objects.bulk_create(
+            [entry for entry in entries if entry.tokens > 0]
+        )
+    
+    @staticmethod
+    def aggregate(days: int = None) -> dict:
+        """
+        Rebuild TokenUsageDaily for the last `days` days (all history if
+        None) from the ledger, then refresh User.total_tokens_used for
+        every user seen in that range. Idempotent: re-running only
+        recomputes the same totals.
+        """
+        entries = TokenUsage.objects.all()
+        daily = TokenUsageDaily.objects.all()
+        
+        if days:
+            since = timezone.localdate() - timedelta(days=days - 1)
+            entries = entries.filter(
+                created_at__gte=timezone.make_aware(datetime.combine(since, time.min))
+            )
+            daily = daily.filter(day__gte=since)
+        
+        rows = list(
+            entries.annotate(day=TruncDate('created_at'))
+            .values('day', 'user_id', 'department')
+            .annotate(total=Sum('tokens'), count=Count('id'))
+            .order_by()
+        )
+        
+        with transaction.atomic():
+            daily.delete()
+            TokenUsageDaily.objects.bulk_create([
+                TokenUsageDaily(
+                    day=row['day'],
+                    user_id=row['user_id'],
+                    department=row['department'],
+                    tokens=row['total'],
+                    queries=row['count']
+                )
+                for row in rows
+            ], batch_size=1000)
+            
+            user_ids = {row['user_id'] for row in rows if row['user_id']}
+            totals = dict(
+                TokenUsageDaily.objects.filter(user_id__in=user_ids)
+                .values('user_id')
+                .annotate(total=Sum('tokens'))
+                .values_list('user_id', 'total')
+            )
+            
+            users = list(User.objects.filter(pk__in=totals).only('id', 'total_tokens_used'))
+            for user in users:
+                user.total_tokens_used = totals[user.pk]
+            User.objects.bulk_update(users, ['total_tokens_used'], batch_size=500)
+        
+        logger.info(f"Aggregated token usage: {len(rows)} daily rows, {len(users)} users")
+        return {'daily_rows': len(rows), 'users': len(users)}
@@ -0,0 +1,10 @@
+from celery import shared_task
+
+from .services import TokenUsageService
+
+
+@shared_task(ignore_result=True)
+def aggregate_token_usage_task(days: int = 2):
+    # Today and yesterday by default, so usage logged around midnight
+    # is picked up on the next run
+    return TokenUsageService.aggregate(days=days)
@@ -1,6 +1,6 @@
 
 from django.urls import path
-from .views import SystemStatsView, QueryAnalyticsView, UserAnalyticsView
+from .views import SystemStatsView, QueryAnalyticsView, UserAnalyticsView, TokenUsageView
 
 app_name = 'analytics'
 
@@ -8,4 +8,5 @@ urlpatterns = [
     path('stats/', SystemStatsView.as_view(), name='stats'),
     path('queries/', QueryAnalyticsView.as_view(), name='query-analytics'),
     path('me/', UserAnalyticsView.as_view(), name='user-analytics'),
+    path('tokens/', TokenUsageView.as_view(), name='token-usage'),
 ]
@@ -9,6 +9,8 @@ from apps.retrieval.models import Query, Feedback, FeedbackType
 from apps.documents.models import Document, DocumentStatus, ProcessingStatus
 from apps.core.models import User
 from apps.core.permissions import IsAdmin
+from apps.core.quota import QueryQuota
+from .models import TokenUsageDaily
 
 
 class SystemStatsView(views.APIView):
@@ -157,9 +159,56 @@ class UserAnalyticsView(views.APIView):
             'queries': {
                 'total': total_queries,
                 'today': queries_today,
-                'remaining_today': max(0, 100 - user.daily_query_count),  # Assuming 100 limit
+                'remaining_today': QueryQuota(user).remaining_today(),
             },
             'tokens_used': total_tokens,
             'feedback_given': feedback_given,
             'recent_queries': recent_queries_data,
         })
+
+
+class TokenUsageView(views.APIView):
+    """
+    Token cost dashboard from the aggregated ledger (refreshed every
+    TOKEN_USAGE_AGGREGATE_SECONDS), so it never scans queries.
+    """
+    
+    permission_classes = [IsAuthenticated, IsAdmin]
+    
+    def get(self, request):
+        days = int(request.query_params.get('days', 30))
+        since = timezone.localdate() - timedelta(days=days - 1)
+        
+        daily = TokenUsageDaily.objects.filter(day__gte=since)
+        department = request.query_params.get('department')
+        if department is not None:
+            daily = daily.filter(department=department)
+        
+        totals = daily.aggregate(tokens=Sum('tokens'), queries=Sum('queries'))
+        
+        by_day = daily.values('day').annotate(
+            tokens=Sum('tokens'),
+            queries=Sum('queries')
+        ).order_by('day')
+        
+        by_department = daily.values('department').annotate(
+            tokens=Sum('tokens'),
+            queries=Sum('queries')
+        ).order_by('-tokens')
+        
+        top_users = daily.filter(user__isnull=False).values('user__username').annotate(
+            tokens=Sum('tokens'),
+            queries=Sum('queries')
+        ).order_by('-tokens')[:10]
+        
+        return Response({
+            'period_days': days,
+            'total_tokens': totals['tokens'] or 0,
+            'total_queries': totals['queries'] or 0,
+            'by_day': [
+                {'date': row['day'].strftime('%Y-%m-%d'), 'tokens': row['tokens'], 'queries': row['queries']}
+                for row in by_day
+            ],
+            'by_department': list(by_department),
+            'top_users': list(top_users),
+        })
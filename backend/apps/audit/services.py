@@ -1,4 +1,5 @@
 import logging
+from django.db import transaction
 from .models import AuditLog
 
 logger = logging.getLogger(__name__)
@@ -45,6 +46,38 @@ class AuditService:
             )
             return None
     
+    @staticmethod
+    def log_action_async(
+        user,
+        action: str,
+        resource_type: str = None,
+        resource_id: int = None,
+        details: dict = None,
+        request=None
+    ):
+        # Cheap path for high-volume actions: request metadata is read now,
+        # the row is written by a Celery worker after the transaction commits
+        from .tasks import log_action_task
+        
+        ip_address, user_agent = AuditService._extract_request_metadata(request)
+        kwargs = {
+            'user_id': user.id if user else None,
+            'action': action,
+            'resource_type': resource_type or '',
+            'resource_id': resource_id,
+            'details': details or {},
+            'ip_address': ip_address,
+            'user_agent': user_agent,
+        }
+        
+        def enqueue():
+            try:
+                log_action_task.delay(**kwargs)
+            except Exception as e:
+                logger.error(f"Failed to enqueue audit log for action '{action}': {str(e)}")
+        
+        transaction.on_commit(enqueue)
+    
     @staticmethod
     def _extract_request_metadata(request):
         ip_address = '0.0.0.0'
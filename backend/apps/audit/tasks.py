@@ -0,0 +1,32 @@
+from celery import shared_task
+import logging
+
+from apps.core.models import User
+from .models import AuditLog
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(ignore_result=True)
+def log_action_task(
+    user_id: int,
+    action: str,
+    resource_type: str = '',
+    resource_id: int = None,
+    details: dict = None,
+    ip_address: str = '0.0.0.0',
+    user_agent: str = 'unknown'
+):
+    # Off-request audit write for high-volume actions, see AuditService.log_action_async
+    try:
+        AuditLog.objects.create(
+            user=User.objects.filter(id=user_id).first() if user_id else None,
+            action=action,
+            resource_type=resource_type,
+            resource_id=resource_id,
+            details=details or {},
+            ip_address=ip_address,
+            user_agent=user_agent
+        )
+    except Exception as e:
+        logger.error(f"Audit log creation failed for action '{action}': {str(e)}", exc_info=True)
@@ -42,7 +42,10 @@ def custom_exception_handler(exc, context):
 
 class RateLimitExceeded(Exception):
     """Raised when user exceeds their query quota"""
-    pass
+    
+    def __init__(self, message, retry_after: float = None):
+        super().__init__(message)
+        self.retry_after = retry_after
 
 
 class DocumentProcessingError(Exception):
@@ -58,3 +61,19 @@ class EmbeddingGenerationError(Exception):
 class LLMServiceError(Exception):
     """Raised when LLM service encounters an error"""
     pass
+
+
+class UpstreamRateLimited(Exception):
+    """Raised when an upstream API is still rate limiting after retries"""
+    
+    def __init__(self, message, retry_after: float = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(Exception):
+    """Raised when an upstream circuit breaker is rejecting calls"""
+    
+    def __init__(self, message, retry_after: float = None):
+        super().__init__(message)
+        self.retry_after = retry_after
@@ -57,14 +57,6 @@ class User(AbstractUser):
         return self.role in [UserRole.ADMIN, UserRole.CONTENT_OWNER]
     
     def can_query(self):
-        from django.conf import settings
-        max_queries = settings.RATE_LIMIT_CONFIG['MAX_QUERIES_PER_DAY']
-        return self.daily_query_count < max_queries
-    
-    def increment_query_count(self):
-        self.daily_query_count += 1
-        self.save(update_fields=['daily_query_count'])
-    
-    def add_token_usage(self, tokens):
-        self.total_tokens_used += tokens
-        self.save(update_fields=['total_tokens_used'])
+        # Counted in Redis; daily_query_count is only a synced copy
+        from .quota import QueryQuota
+        return QueryQuota(self).remaining_today() > 0
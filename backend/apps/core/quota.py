@@ -0,0 +1,188 @@
+import time
+import uuid
+import logging
+from datetime import datetime, time as dt_time, timedelta
+import redis
+from django.conf import settings
+from django.utils import timezone
+
+from .redis_client import get_redis
+from .exceptions import RateLimitExceeded
+
+logger = logging.getLogger(__name__)
+
+# Check both limits, then charge both, atomically. KEYS: day counter,
+# minute window (one member per question). Returns {1, used today} or
+# {0, limit hit, seconds to wait}.
+RESERVE_SCRIPT = """
+local count = tonumber(ARGV[1])
+local daily_limit = tonumber(ARGV[2])
+local minute_limit = tonumber(ARGV[3])
+local now = tonumber(ARGV[4])
+
+local used = tonumber(redis.call('GET', KEYS[1]) or '0')
+if daily_limit >= 0 and used + count > daily_limit then
+    return {0, 'day', ARGV[6]}
+end
+
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', now - 60)
+if minute_limit >= 0 then
+    local recent = redis.call('ZCARD', KEYS[2])
+    if recent + count > minute_limit then
+        -- Wait for the entry whose expiry frees enough room
+        local index = recent + count - minute_limit - 1
+        local oldest = redis.call('ZRANGE', KEYS[2], index, index, 'WITHSCORES')
+        return {0, 'minute', tostring(tonumber(oldest[2]) + 60 - now)}
+    end
+end
+
+used = redis.call('INCRBY', KEYS[1], count)
+redis.call('EXPIRE', KEYS[1], tonumber(ARGV[5]))
+for i = 1, count do
+    redis.call('ZADD', KEYS[2], now, ARGV[7] .. ':' .. i)
+end
+redis.call('EXPIRE', KEYS[2], 61)
+return {1, tostring(used)}
+"""
+
+# Never below zero, in case a release lands after the day rolled over
+RELEASE_SCRIPT = """
+local used = tonumber(redis.call('GET', KEYS[1]) or '0')
+if used <= 0 then
+    return 0
+end
+return redis.call('DECRBY', KEYS[1], math.min(used, tonumber(ARGV[1])))
+"""
+
+
+class QueryQuota:
+    """
+    A user's query allowance, counted in Redis so every web and Celery
+    process sees the same numbers without touching the users row.
+    
+    - daily cap: MAX_QUERIES_PER_DAY questions per calendar day
+      (TIME_ZONE), one counter per user per day that expires on its own
+    - sliding window: at most MAX_QUERIES_PER_MINUTE questions in any 60s
+      (0, the default, disables it); a batch counts each of its questions
+    
+    reserve() checks and charges both in one step, so concurrent requests
+    can't overshoot the cap. Questions that end up not being answered
+    (no results, errors) are handed back with release(). Admins are
+    counted but never limited. If Redis is unreachable queries are let
+    through uncounted.
+    
+    User.daily_query_count is a reporting copy, refreshed by
+    sync_query_counts_task.
+    """
+    
+    KEY_PREFIX = 'quota:queries'
+    
+    def __init__(self, user):
+        self.user = user
+        self.daily_limit = settings.RATE_LIMIT_CONFIG['MAX_QUERIES_PER_DAY']
+        self.minute_limit = settings.RATE_LIMIT_CONFIG['MAX_QUERIES_PER_MINUTE']
+        self.reserved = 0
+        # Fixed per instance so a release after midnight hits the same day
+        self.day = timezone.localdate()
+    
+    @classmethod
+    def day_key(cls, user_id: int, day=None) -> str:
+        day = day or timezone.localdate()
+        return f"{cls.KEY_PREFIX}:{user_id}:{day.isoformat()}"
+    
+    @property
+    def key(self) -> str:
+        return self.day_key(self.user.pk, self.day)
+    
+    @property
+    def minute_key(self) -> str:
+        return f"{self.KEY_PREFIX}:{self.user.pk}:minute"
+    
+    def reserve(self, count: int = 1):
+        """Charge count questions, or raise RateLimitExceeded."""
+        unlimited = self.user.is_admin()
+        seconds_left_today = self._seconds_until_midnight()
+        
+        if not unlimited and self.minute_limit and count > self.minute_limit:
+            # Would never fit in the window, however long the caller waits
+            raise RateLimitExceeded(
+                f"Request of {count} questions exceeds the per-minute limit ({self.minute_limit})."
+            )
+        
+        try:
+            result = get_redis().eval(
+                RESERVE_SCRIPT, 2, self.key, self.minute_key,
+                count,
+                -1 if unlimited else self.daily_limit,
+                -1 if unlimited or not self.minute_limit else self.minute_limit,
+                time.time(),
+                seconds_left_today + 3600,
+                seconds_left_today,
+                uuid.uuid4().hex
+            )
+        except redis.RedisError as e:
+            logger.warning(f"Query quota unavailable, not counting: {str(e)}")
+            return
+        
+        if result[0] == 1:
+            self.reserved += count
+            return
+        
+        limit, retry_after = result[1].decode(), float(result[2])
+        if limit == 'day':
+            remaining = self.remaining_today()
+            message = (
+                "Daily query limit exceeded. Please try again tomorrow."
+                if remaining <= 0 else
+                f"Request of {count} questions exceeds your remaining daily quota ({remaining})."
+            )
+        else:
+            message = (
+                f"Too many queries. You can ask {self.minute_limit} questions per minute; "
+                f"please try again in {max(int(retry_after), 1)} seconds."
+            )
+        raise RateLimitExceeded(message, retry_after=retry_after)
+    
+    def release(self, count: int = None):
+        """Hand back reserved questions that weren't answered (default: all)."""
+        count = self.reserved if count is None else min(count, self.reserved)
+        if count <= 0:
+            return
+        
+        self.reserved -= count
+        try:
+            get_redis().eval(RELEASE_SCRIPT, 1, self.key, count)
+        except redis.RedisError as e:
+            logger.warning(f"Could not release query quota: {str(e)}")
+    
+    def used_today(self) -> int:
+        try:
+            return int(get_redis().get(self.key) or 0)
+        except redis.RedisError:
+            return self.user.daily_query_count
+    
+    def remaining_today(self) -> int:
+        return max(0, self.daily_limit - self.used_today())
+    
+    @classmethod
+    def counts_for_day(cls, day=None) -> dict:
+        """{user_id: questions} for every user with a counter for the day."""
+        day = day or timezone.localdate()
+        client = get_redis()
+        keys = list(client.scan_iter(match=f"{cls.KEY_PREFIX}:*:{day.isoformat()}", count=1000))
+        
+        counts = {}
+        for start in range(0, len(keys), 1000):
+            batch = keys[start:start + 1000]
+            for key, value in zip(batch, client.mget(batch)):
+                if value is not None:
+                    counts[int(key.decode().split(':')[2])] = int(value)
+        return counts
+    
+    def _seconds_until_midnight(self) -> int:
+        now = timezone.localtime()
+        midnight = timezone.make_aware(
+            datetime.combine(now.date() + timedelta(days=1), dt_time.min),
+            now.tzinfo
+        )
+        return max(int((midnight - now).total_seconds()), 1)
@@ -0,0 +1,21 @@
+import redis
+from django.conf import settings
+
+_client = None
+
+
+def get_redis() -> redis.Redis:
+    """
+    Per-process Redis client for state shared between gunicorn workers
+    and Celery (locks, counters, pub/sub). Not the Django cache, whose
+    keys are versioned and pickled.
+    """
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(
+            settings.REDIS_URL,
+            socket_connect_timeout=1,
+            socket_timeout=5,
+            health_check_interval=30
+        )
+    return _client
@@ -0,0 +1,28 @@
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.db.models import Q
+from django.db.models.functions import Greatest, Upper
+
+
+def trigram_index(field: str, name: str) -> GinIndex:
+    """GIN trigram index on UPPER(field), matching trigram_search lookups"""
+    return GinIndex(OpClass(Upper(field), name='gin_trgm_ops'), name=name)
+
+
+def trigram_search(queryset, search: str, fields):
+    """
+    Case-insensitive substring search over `fields`, annotated with
+    `search_rank` (best word similarity across the fields) for ordering.
+    
+    icontains compiles to UPPER(col) LIKE UPPER('%term%'), which the
+    trigram_index on each field serves. Terms under three characters
+    have no trigrams and still scan.
+    """
+    condition = Q()
+    for field in fields:
+        condition |= Q(**{f'{field}__icontains': search})
+    
+    similarities = [TrigramWordSimilarity(search, field) for field in fields]
+    rank = Greatest(*similarities) if len(similarities) > 1 else similarities[0]
+    
+    return queryset.filter(condition).annotate(search_rank=rank)
@@ -0,0 +1,31 @@
+from celery import shared_task
+from django.utils import timezone
+import logging
+
+from .models import User
+from .quota import QueryQuota
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(ignore_result=True)
+def sync_query_counts_task():
+    """
+    Copy today's Redis query counters onto User.daily_query_count for
+    reporting. Users without a counter today are reset to 0.
+    """
+    counts = QueryQuota.counts_for_day()
+    
+    changed = []
+    for user in User.objects.filter(pk__in=counts).only('id', 'daily_query_count'):
+        if user.daily_query_count != counts[user.pk]:
+            user.daily_query_count = counts[user.pk]
+            changed.append(user)
+    User.objects.bulk_update(changed, ['daily_query_count'], batch_size=500)
+    
+    reset = User.objects.exclude(pk__in=counts).exclude(daily_query_count=0).update(
+        daily_query_count=0,
+        last_query_reset=timezone.now()
+    )
+    
+    logger.info(f"Synced query counts: {len(changed)} updated, {reset} reset")
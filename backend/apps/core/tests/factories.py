@@ -0,0 +1,14 @@
+import factory
+
+from apps.core.models import User, UserRole
+
+
+class UserFactory(factory.django.DjangoModelFactory):
+
+    class Meta:
+        model = User
+    
+    username = factory.Sequence(lambda n: f'user{n}')
+    email = factory.LazyAttribute(lambda user: f'{user.username}@example.com')
+    password = factory.django.Password('password123')
+    role = UserRole.EMPLOYEE
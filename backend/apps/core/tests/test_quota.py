@@ -0,0 +1,47 @@
+import pytest
+
+from apps.core.exceptions import RateLimitExceeded
+from apps.core.quota import QueryQuota
+from apps.core.redis_client import get_redis
+
+
+@pytest.fixture
+def quota(settings, user):
+    settings.RATE_LIMIT_CONFIG = {
+        **settings.RATE_LIMIT_CONFIG,
+        'MAX_QUERIES_PER_DAY': 100,
+        'MAX_QUERIES_PER_MINUTE': 5,
+    }
+    quota = QueryQuota(user)
+    # User ids repeat across test databases, Redis outlives them
+    get_redis().delete(quota.key, quota.minute_key)
+    return quota
+
+
+def test_minute_window_counts_each_question_in_a_batch(quota):
+    quota.reserve(4)
+    
+    with pytest.raises(RateLimitExceeded) as excinfo:
+        quota.reserve(2)
+    
+    assert 0 < excinfo.value.retry_after <= 60
+    quota.reserve(1)
+    assert quota.used_today() == 5
+
+
+def test_batch_larger_than_the_minute_window_is_rejected_outright(quota):
+    with pytest.raises(RateLimitExceeded) as excinfo:
+        quota.reserve(6)
+    
+    assert excinfo.value.retry_after is None
+    assert quota.used_today() == 0
+
+
+def test_minute_window_is_off_by_default(settings, user):
+    quota = QueryQuota(user)
+    get_redis().delete(quota.key, quota.minute_key)
+    
+    quota.reserve(50)
+    
+    assert quota.minute_limit == 0
+    assert quota.used_today() == 50
@@ -0,0 +1,65 @@
+# Generated by Django 4.2.9 on 2026-10-19 04:16
+
+from django.db import migrations, models
+
+
+BACKFILL_SQL = """
+UPDATE document_chunks AS c
+SET document_status = d.status,
+    document_title = d.title,
+    department = d.department,
+    version_number = v.version_number,
+    is_current = (v.id = (
+        SELECT lv.id FROM document_versions lv
+        WHERE lv.document_id = d.id AND lv.processing_status = 'READY'
+        ORDER BY lv.version_number DESC
+        LIMIT 1
+    ))
+FROM document_versions v
+JOIN documents d ON d.id = v.document_id
+WHERE c.version_id = v.id;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documentchunk',
+            name='department',
+            field=models.CharField(blank=True, help_text='Department of the parent document', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='documentchunk',
+            name='document_status',
+            field=models.CharField(choices=[('DRAFT', 'Draft'), ('APPROVED', 'Approved'), ('ARCHIVED', 'Archived')], default='DRAFT', help_text='Status of the parent document', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='documentchunk',
+            name='document_title',
+            field=models.CharField(blank=True, help_text='Title of the parent document', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='documentchunk',
+            name='is_current',
+            field=models.BooleanField(default=False, help_text='True if this chunk belongs to the latest READY version'),
+        ),
+        migrations.AddField(
+            model_name='documentchunk',
+            name='version_number',
+            field=models.IntegerField(default=1, help_text='Version number of the parent version'),
+        ),
+        migrations.AddIndex(
+            model_name='documentchunk',
+            index=models.Index(condition=models.Q(('is_current', True)), fields=['department', 'document_status'], name='chunk_search_dept_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='documentchunk',
+            index=models.Index(condition=models.Q(('is_current', True)), fields=['document_status'], name='chunk_search_status_idx'),
+        ),
+        migrations.RunSQL(BACKFILL_SQL, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.9 on 2026-10-19 04:18
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+import django.db.models.functions.comparison
+import pgvector.django.bit
+import pgvector.django.halfvec
+import pgvector.django.indexes
+
+
+class Migration(migrations.Migration):
+
+    # Build the compact indexes concurrently so existing chunk tables stay
+    # writable; the full-precision index is dropped once they exist.
+    atomic = False
+
+    dependencies = [
+        ('documents', '0003_chunk_embedding_hnsw'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='documentchunk',
+            index=pgvector.django.indexes.HnswIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.comparison.Cast('embedding', pgvector.django.halfvec.HalfVectorField(dimensions=768)), name='halfvec_cosine_ops'), ef_construction=64, m=16, name='chunk_embedding_half_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='documentchunk',
+            index=pgvector.django.indexes.HnswIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.comparison.Cast(models.Func('embedding', function='binary_quantize'), pgvector.django.bit.BitField(length=768)), name='bit_hamming_ops'), ef_construction=64, m=16, name='chunk_embedding_bit_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='documentchunk',
+            name='chunk_embedding_hnsw_idx',
+        ),
+    ]
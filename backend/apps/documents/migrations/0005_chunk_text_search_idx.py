@@ -0,0 +1,22 @@
+# Generated by Django 4.2.9 on 2026-10-19 04:32
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('documents', '0004_quantized_embedding_indexes'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='documentchunk',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.search.SearchVector('text', config='english'), name='chunk_text_search_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+import django.core.validators
+from django.db import migrations, models
+
+
+BACKFILL_LATEST_VERSION_SQL = """
+UPDATE documents d
+SET latest_version_number = v.latest
+FROM (
+    SELECT document_id, MAX(version_number) AS latest
+    FROM document_versions
+    GROUP BY document_id
+) v
+WHERE v.document_id = d.id
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0005_chunk_text_search_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='latest_version_number',
+            field=models.IntegerField(default=0, help_text='Highest version number uploaded (0 if none)', validators=[django.core.validators.MinValueValidator(0)]),
+        ),
+        migrations.RunSQL(BACKFILL_LATEST_VERSION_SQL, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.9 on 2026-10-19 04:51
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0006_document_latest_version_number'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='documentchunk',
+            options={'base_manager_name': 'objects'},
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.9 on 2026-10-19 04:57
+
+from django.conf import settings
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('documents', '0009_document_tags_gin_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_files', models.IntegerField(default=0, help_text='Files accepted for processing', validators=[django.core.validators.MinValueValidator(0)])),
+                ('skipped', models.JSONField(blank=True, default=list, help_text='Files rejected at upload, with the reason')),
+                ('task_group_id', models.CharField(blank=True, help_text='Celery group processing the batch', max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('owner', models.ForeignKey(help_text='User who uploaded the batch', on_delete=django.db.models.deletion.CASCADE, related_name='upload_batches', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'document_upload_batches',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='documentversion',
+            name='batch',
+            field=models.ForeignKey(blank=True, help_text='Bulk upload this version came from', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='versions', to='documents.uploadbatch'),
+        ),
+    ]
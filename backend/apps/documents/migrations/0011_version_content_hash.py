@@ -0,0 +1,22 @@
+# Generated by Django 4.2.9 on 2026-10-19 04:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0010_upload_batches'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documentversion',
+            name='content_hash',
+            field=models.CharField(blank=True, help_text='SHA-256 of the file, to reuse chunks of identical uploads', max_length=64),
+        ),
+        migrations.AddIndex(
+            model_name='documentversion',
+            index=models.Index(fields=['content_hash'], name='document_ve_content_7d6015_idx'),
+        ),
+    ]
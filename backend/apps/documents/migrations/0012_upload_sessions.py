@@ -0,0 +1,41 @@
+# Generated by Django 4.2.9 on 2026-10-19 05:00
+
+from django.conf import settings
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('documents', '0011_version_content_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadSession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('filename', models.CharField(help_text='Original file name', max_length=255)),
+                ('file_size', models.BigIntegerField(help_text='Total file size in bytes', validators=[django.core.validators.MinValueValidator(1)])),
+                ('part_size', models.IntegerField(help_text='Size of every part but the last, in bytes', validators=[django.core.validators.MinValueValidator(1)])),
+                ('title', models.CharField(blank=True, max_length=255)),
+                ('description', models.TextField(blank=True)),
+                ('tags', models.JSONField(blank=True, default=list)),
+                ('department', models.CharField(blank=True, max_length=100)),
+                ('status', models.CharField(choices=[('ACTIVE', 'Active'), ('COMPLETED', 'Completed')], default='ACTIVE', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('document', models.ForeignKey(blank=True, help_text='Document receiving a new version (blank for a new document)', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='upload_sessions', to='documents.document')),
+                ('owner', models.ForeignKey(help_text='User uploading the file', on_delete=django.db.models.deletion.CASCADE, related_name='upload_sessions', to=settings.AUTH_USER_MODEL)),
+                ('version', models.ForeignKey(blank=True, help_text='Version created on completion', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='documents.documentversion')),
+            ],
+            options={
+                'db_table': 'document_upload_sessions',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'updated_at'], name='document_up_status_354752_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.9 on 2026-10-19 05:28
+
+import django.core.validators
+from django.db import migrations, models
+
+
+BACKFILL_TOTAL_SKIPPED_SQL = """
+UPDATE document_upload_batches
+SET total_skipped = jsonb_array_length(skipped)
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0012_upload_sessions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadbatch',
+            name='total_skipped',
+            field=models.IntegerField(default=0, help_text='Files rejected at upload', validators=[django.core.validators.MinValueValidator(0)]),
+        ),
+        migrations.AlterField(
+            model_name='uploadbatch',
+            name='skipped',
+            field=models.JSONField(blank=True, default=list, help_text='Files rejected at upload, with the reason (first 100)'),
+        ),
+        migrations.RunSQL(BACKFILL_TOTAL_SKIPPED_SQL, migrations.RunSQL.noop),
+    ]
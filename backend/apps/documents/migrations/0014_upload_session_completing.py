@@ -0,0 +1,18 @@
+# Generated by Django 4.2.9 on 2026-10-19 05:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0013_upload_batch_total_skipped'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='uploadsession',
+            name='status',
+            field=models.CharField(choices=[('ACTIVE', 'Active'), ('COMPLETING', 'Completing'), ('COMPLETED', 'Completed')], default='ACTIVE', max_length=20),
+        ),
+    ]
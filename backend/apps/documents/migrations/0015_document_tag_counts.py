@@ -0,0 +1,79 @@
+# Generated by Django 4.2.9 on 2026-10-19 05:50
+
+from django.db import migrations, models
+
+
+# Each document counts once per distinct tag, under its current status.
+# An UPDATE that leaves tags and status alone (every save()) is skipped.
+TAG_COUNT_TRIGGERS_SQL = """
+CREATE FUNCTION document_tag_counts_apply() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') AND jsonb_typeof(OLD.tags) = 'array' THEN
+        UPDATE document_tag_counts c
+        SET count = c.count - 1
+        FROM (SELECT DISTINCT jsonb_array_elements_text(OLD.tags) AS tag) t
+        WHERE c.tag = t.tag AND c.status = OLD.status;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') AND jsonb_typeof(NEW.tags) = 'array' THEN
+        INSERT INTO document_tag_counts (tag, status, count)
+        SELECT DISTINCT jsonb_array_elements_text(NEW.tags), NEW.status, 1
+        ON CONFLICT (tag, status) DO UPDATE SET count = document_tag_counts.count + 1;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER documents_tag_counts_insert_delete
+AFTER INSERT OR DELETE ON documents
+FOR EACH ROW EXECUTE FUNCTION document_tag_counts_apply();
+
+CREATE TRIGGER documents_tag_counts_update
+AFTER UPDATE OF tags, status ON documents
+FOR EACH ROW
+WHEN (OLD.tags IS DISTINCT FROM NEW.tags OR OLD.status IS DISTINCT FROM NEW.status)
+EXECUTE FUNCTION document_tag_counts_apply();
+"""
+
+DROP_TAG_COUNT_TRIGGERS_SQL = """
+DROP TRIGGER IF EXISTS documents_tag_counts_update ON documents;
+DROP TRIGGER IF EXISTS documents_tag_counts_insert_delete ON documents;
+DROP FUNCTION IF EXISTS document_tag_counts_apply();
+"""
+
+# Same transaction as the triggers, which block writes to documents until
+# it commits, so nothing is counted twice or missed
+BACKFILL_TAG_COUNTS_SQL = """
+INSERT INTO document_tag_counts (tag, status, count)
+SELECT t.tag, d.status, COUNT(*)
+FROM documents d, LATERAL (SELECT DISTINCT jsonb_array_elements_text(d.tags) AS tag) t
+WHERE jsonb_typeof(d.tags) = 'array'
+GROUP BY t.tag, d.status
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0014_upload_session_completing'),
+    ]
+    
+    operations = [
+        migrations.CreateModel(
+            name='DocumentTagCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tag', models.TextField()),
+                ('status', models.CharField(choices=[('DRAFT', 'Draft'), ('APPROVED', 'Approved'), ('ARCHIVED', 'Archived')], max_length=20)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'document_tag_counts',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='documenttagcount',
+            constraint=models.UniqueConstraint(fields=('tag', 'status'), name='document_tag_counts_tag_status_uniq'),
+        ),
+        migrations.RunSQL(TAG_COUNT_TRIGGERS_SQL, DROP_TAG_COUNT_TRIGGERS_SQL),
+        migrations.RunSQL(BACKFILL_TAG_COUNTS_SQL, migrations.RunSQL.noop),
+    ]
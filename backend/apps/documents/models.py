@@ -1,16 +1,50 @@
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
 from django.core.validators import FileExtensionValidator, MinValueValidator
-from pgvector.django import VectorField
+from django.contrib.postgres.indexes import OpClass, GinIndex
+from django.contrib.postgres.search import SearchVector
+from django.db.models import F, Func
+from django.db.models.functions import Cast, Upper
+from pgvector.django import VectorField, HalfVectorField, BitField, HnswIndex
+from apps.core.search import trigram_index
+import math
 import os
 
 
+EMBEDDING_DIMENSION = settings.LLM_CONFIG['EMBEDDING_DIMENSION']
+
+
+def embedding_as_halfvec():
+    """Half-precision view of DocumentChunk.embedding (matches the halfvec index)"""
+    return Cast('embedding', HalfVectorField(dimensions=EMBEDDING_DIMENSION))
+
+
+def embedding_as_bits():
+    """Binary-quantized view of DocumentChunk.embedding (matches the bit index)"""
+    return Cast(
+        Func('embedding', function='binary_quantize'),
+        BitField(length=EMBEDDING_DIMENSION)
+    )
+
+
+def chunk_search_vector():
+    """English full-text vector of DocumentChunk.text (matches the GIN index)"""
+    return SearchVector('text', config='english')
+
+
 class DocumentStatus(models.TextChoices):
     DRAFT = 'DRAFT', 'Draft'
     APPROVED = 'APPROVED', 'Approved'
     ARCHIVED = 'ARCHIVED', 'Archived'
 
 
+class UploadSessionStatus(models.TextChoices):
+    ACTIVE = 'ACTIVE', 'Active'
+    # Parts are being assembled; no more parts are accepted
+    COMPLETING = 'COMPLETING', 'Completing'
+    COMPLETED = 'COMPLETED', 'Completed'
+
+
 class ProcessingStatus(models.TextChoices):
     UPLOADED = 'UPLOADED', 'Uploaded'
     PROCESSING = 'PROCESSING', 'Processing'
@@ -19,7 +53,7 @@ class ProcessingStatus(models.TextChoices):
 
 
 class Document(models.Model):
-    
+
     title = models.CharField(
         max_length=255,
         help_text="Document title or name"
@@ -56,6 +90,13 @@ class Document(models.Model):
         help_text="Department this document belongs to"
     )
     
+    # Maintained by create_version() so listings never query versions
+    latest_version_number = models.IntegerField(
+        default=0,
+        validators=[MinValueValidator(0)],
+        help_text="Highest version number uploaded (0 if none)"
+    )
+    
     # Metadata
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -81,6 +122,12 @@ class Document(models.Model):
             models.Index(fields=['owner']),
             models.Index(fields=['department']),
             models.Index(fields=['-created_at']),
+            # List filters: search and department__iexact
+            trigram_index('title', 'documents_title_trgm_idx'),
+            trigram_index('description', 'documents_description_trgm_idx'),
+            models.Index(Upper('department'), name='documents_department_upper_idx'),
+            # Tag containment (tags @> '[...]')
+            GinIndex(fields=['tags'], opclasses=['jsonb_path_ops'], name='documents_tags_path_idx'),
         ]
     
     def __str__(self):
@@ -89,8 +136,151 @@ class Document(models.Model):
     @property
     def current_version(self):
         """Get the latest version number"""
-        latest = self.versions.order_by('-version_number').first()
-        return latest.version_number if latest else 0
+        return self.latest_version_number
+    
+    def create_version(self, file, **fields):
+        """
+        Create the next DocumentVersion for `file`.
+        
+        The counter is bumped with a single UPDATE, which row-locks the
+        document until the transaction commits, so concurrent uploads
+        get distinct version numbers.
+        """
+        with transaction.atomic():
+            Document.objects.filter(pk=self.pk).update(
+                latest_version_number=F('latest_version_number') + 1
+            )
+            self.latest_version_number = Document.objects.filter(
+                pk=self.pk
+            ).values_list('latest_version_number', flat=True).get()
+            
+            return DocumentVersion.objects.create(
+                document=self,
+                version_number=self.latest_version_number,
+                file=file,
+                file_size=file.size,
+                file_type=file.name.split('.')[-1].lower(),
+                **fields
+            )
+    
+    def sync_chunk_search_fields(self):
+        """
+        Push search filter attributes to the vector store.
+        
+        Vector search filters on the denormalized columns of DocumentChunk
+        so it never joins versions/documents. Call this whenever status,
+        title or department change, or a version becomes READY.
+        """
+        from apps.retrieval.vector_stores import get_vector_store
+        
+        # Only the latest processed version is current
+        latest_ready = self.versions.filter(
+            processing_status=ProcessingStatus.READY
+        ).order_by('-version_number').values_list('id', flat=True).first()
+        
+        get_vector_store().update_document(
+            self.id,
+            status=self.status,
+            title=self.title,
+            department=self.department,
+            current_version_id=latest_ready
+        )
+
+
+class DocumentTagCount(models.Model):
+    """
+    How many documents in each status carry a tag.
+    
+    Maintained by triggers on the documents table (migration 0015), so
+    every write path counts, including bulk_create() and update(). Tag
+    facets read this instead of unnesting every document's tags. Rows that
+    drop to zero are kept; filter on count > 0.
+    """
+    
+    tag = models.TextField()
+    
+    status = models.CharField(
+        max_length=20,
+        choices=DocumentStatus.choices
+    )
+    
+    count = models.IntegerField(default=0)
+    
+    class Meta:
+        db_table = 'document_tag_counts'
+        constraints = [
+            models.UniqueConstraint(fields=['tag', 'status'], name='document_tag_counts_tag_status_uniq'),
+        ]
+    
+    def __str__(self):
+        return f"{self.tag} ({self.status}): {self.count}"
+
+
+class UploadBatch(models.Model):
+    """
+    One bulk upload. Its versions are processed as a single Celery group;
+    progress is read from their processing_status.
+    """
+    
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='upload_batches',
+        help_text="User who uploaded the batch"
+    )
+    
+    total_files = models.IntegerField(
+        default=0,
+        validators=[MinValueValidator(0)],
+        help_text="Files accepted for processing"
+    )
+    
+    skipped = models.JSONField(
+        default=list,
+        blank=True,
+        help_text="Files rejected at upload, with the reason (first 100)"
+    )
+    
+    total_skipped = models.IntegerField(
+        default=0,
+        validators=[MinValueValidator(0)],
+        help_text="Files rejected at upload"
+    )
+    
+    task_group_id = models.CharField(
+        max_length=255,
+        blank=True,
+        help_text="Celery group processing the batch"
+    )
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'document_upload_batches'
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"Upload batch {self.id} ({self.total_files} files)"
+    
+    def progress(self) -> dict:
+        """Version counts per processing status, plus overall completion"""
+        counts = dict(
+            self.versions.order_by()
+            .values_list('processing_status')
+            .annotate(count=models.Count('id'))
+        )
+        by_status = {
+            status.lower(): counts.get(status, 0)
+            for status in ProcessingStatus.values
+        }
+        completed = by_status['ready'] + by_status['failed']
+        
+        return {
+            'total': self.total_files,
+            **by_status,
+            'completed': completed,
+            'percent': round(100 * completed / self.total_files, 1) if self.total_files else 100.0
+        }
 
 
 class DocumentVersion(models.Model):
@@ -123,6 +313,12 @@ class DocumentVersion(models.Model):
         help_text="File extension (pdf, docx, txt)"
     )
     
+    content_hash = models.CharField(
+        max_length=64,
+        blank=True,
+        help_text="SHA-256 of the file, to reuse chunks of identical uploads"
+    )
+    
     processing_status = models.CharField(
         max_length=20,
         choices=ProcessingStatus.choices,
@@ -147,6 +343,15 @@ class DocumentVersion(models.Model):
         help_text="Error details if processing failed"
     )
     
+    batch = models.ForeignKey(
+        UploadBatch,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='versions',
+        help_text="Bulk upload this version came from"
+    )
+    
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
     processed_at = models.DateTimeField(
@@ -162,6 +367,7 @@ class DocumentVersion(models.Model):
         indexes = [
             models.Index(fields=['processing_status']),
             models.Index(fields=['-created_at']),
+            models.Index(fields=['content_hash']),
         ]
     
     def __str__(self):
@@ -172,8 +378,126 @@ class DocumentVersion(models.Model):
         return os.path.splitext(self.file.name)[1][1:].lower()
 
 
-class DocumentChunk(models.Model):
+class UploadSession(models.Model):
+    """
+    A resumable upload: the client sends the file as numbered parts, each
+    written to storage as it arrives, then completes the session to
+    assemble them into a DocumentVersion.
+    """
+    
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='upload_sessions',
+        help_text="User uploading the file"
+    )
     
+    document = models.ForeignKey(
+        Document,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='upload_sessions',
+        help_text="Document receiving a new version (blank for a new document)"
+    )
+    
+    filename = models.CharField(
+        max_length=255,
+        help_text="Original file name"
+    )
+    
+    file_size = models.BigIntegerField(
+        validators=[MinValueValidator(1)],
+        help_text="Total file size in bytes"
+    )
+    
+    part_size = models.IntegerField(
+        validators=[MinValueValidator(1)],
+        help_text="Size of every part but the last, in bytes"
+    )
+    
+    # New document fields (ignored for a new version)
+    title = models.CharField(max_length=255, blank=True)
+    description = models.TextField(blank=True)
+    tags = models.JSONField(default=list, blank=True)
+    department = models.CharField(max_length=100, blank=True)
+    
+    status = models.CharField(
+        max_length=20,
+        choices=UploadSessionStatus.choices,
+        default=UploadSessionStatus.ACTIVE
+    )
+    
+    version = models.ForeignKey(
+        'DocumentVersion',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        help_text="Version created on completion"
+    )
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Bumped by every part, so stale sessions can be cleaned up
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'document_upload_sessions'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'updated_at']),
+        ]
+    
+    def __str__(self):
+        return f"Upload {self.id}: {self.filename}"
+    
+    @property
+    def total_parts(self) -> int:
+        return math.ceil(self.file_size / self.part_size)
+    
+    @property
+    def parts_dir(self) -> str:
+        return f"uploads/{self.id}"
+    
+    def part_name(self, part_number: int) -> str:
+        return f"{self.parts_dir}/{part_number:06d}"
+    
+    def expected_part_size(self, part_number: int) -> int:
+        if part_number < self.total_parts:
+            return self.part_size
+        return self.file_size - self.part_size * (self.total_parts - 1)
+
+
+class DocumentChunkQuerySet(models.QuerySet):
+
+    # Columns DocumentChunkSerializer renders
+    DISPLAY_FIELDS = (
+        'id', 'version_id', 'chunk_index', 'text', 'metadata',
+        'document_title', 'version_number'
+    )
+    
+    def with_embeddings(self):
+        """Load the embedding column as well (needed to score or rerank)"""
+        return self.defer(None)
+    
+    def for_display(self):
+        """Only the columns the API renders"""
+        return self.only(*self.DISPLAY_FIELDS)
+
+
+class DocumentChunkManager(models.Manager.from_queryset(DocumentChunkQuerySet)):
+    """
+    Defers `embedding` on every query. Decoding 768 floats per row is
+    wasted outside vector scoring, so callers that need the vectors ask
+    for them with with_embeddings().
+    """
+    
+    def get_queryset(self):
+        return super().get_queryset().defer('embedding')
+
+
+class DocumentChunk(models.Model):
+
     version = models.ForeignKey(
         DocumentVersion,
         on_delete=models.CASCADE,
@@ -201,18 +525,79 @@ class DocumentChunk(models.Model):
         help_text="Additional metadata (page number, section, etc.)"
     )
     
+    # Denormalized from version/document so search filters without joins.
+    # Kept in sync by Document.sync_chunk_search_fields()
+    document_status = models.CharField(
+        max_length=20,
+        choices=DocumentStatus.choices,
+        default=DocumentStatus.DRAFT,
+        help_text="Status of the parent document"
+    )
+    
+    document_title = models.CharField(
+        max_length=255,
+        blank=True,
+        help_text="Title of the parent document"
+    )
+    
+    department = models.CharField(
+        max_length=100,
+        blank=True,
+        help_text="Department of the parent document"
+    )
+    
+    version_number = models.IntegerField(
+        default=1,
+        help_text="Version number of the parent version"
+    )
+    
+    is_current = models.BooleanField(
+        default=False,
+        help_text="True if this chunk belongs to the latest READY version"
+    )
+    
     created_at = models.DateTimeField(auto_now_add=True)
     
+    objects = DocumentChunkManager()
+    
     class Meta:
         db_table = 'document_chunks'
+        # Also used for related access such as QuerySource.chunk
+        base_manager_name = 'objects'
         unique_together = ['version', 'chunk_index']
         indexes = [
             models.Index(fields=['version', 'chunk_index']),
-            # Vector index for similarity search
+            # Search filters
+            models.Index(
+                fields=['department', 'document_status'],
+                name='chunk_search_dept_idx',
+                condition=models.Q(is_current=True),
+            ),
+            models.Index(
+                fields=['document_status'],
+                name='chunk_search_status_idx',
+                condition=models.Q(is_current=True),
+            ),
+            # Compact vector indexes for similarity search. Full-precision
+            # embeddings stay in the table and are used to rescore.
+            HnswIndex(
+                OpClass(embedding_as_halfvec(), name='halfvec_cosine_ops'),
+                name='chunk_embedding_half_idx',
+                m=16,
+                ef_construction=64,
+            ),
+            HnswIndex(
+                OpClass(embedding_as_bits(), name='bit_hamming_ops'),
+                name='chunk_embedding_bit_idx',
+                m=16,
+                ef_construction=64,
+            ),
+            # Keyword side of hybrid search
+            GinIndex(chunk_search_vector(), name='chunk_text_search_idx'),
         ]
     
     def __str__(self):
-        return f"{self.version.document.title} v{self.version.version_number} chunk {self.chunk_index}"
+        return f"{self.document_title} v{self.version_number} chunk {self.chunk_index}"
     
     @property
     def document(self):
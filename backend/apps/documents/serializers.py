@@ -1,12 +1,20 @@
 from rest_framework import serializers
 from django.conf import settings
-from .models import Document, DocumentVersion, DocumentChunk, DocumentStatus
+from .models import (
+    Document,
+    DocumentVersion,
+    DocumentChunk,
+    DocumentStatus,
+    UploadBatch,
+    UploadSession,
+    UploadSessionStatus
+)
+from .uploads import ChunkedUploadService, upload_error, file_sha256
 
 
 class DocumentChunkSerializer(serializers.ModelSerializer):
-
-    document_title = serializers.CharField(source='document.title', read_only=True)
-    version_number = serializers.IntegerField(source='version.version_number', read_only=True)
+    # Title and version number come from the chunk's denormalized columns,
+    # so DocumentChunk.objects.for_display() is all this needs to load
     
     class Meta:
         model = DocumentChunk
@@ -122,20 +130,9 @@ class DocumentUploadSerializer(serializers.Serializer):
         """
         Validate file size and type.
         """
-        # Check file size
-        max_size = settings.DOCUMENT_CONFIG['MAX_FILE_SIZE_MB'] * 1024 * 1024
-        if value.size > max_size:
-            raise serializers.ValidationError(
-                f"File size exceeds {settings.DOCUMENT_CONFIG['MAX_FILE_SIZE_MB']}MB limit."
-            )
-        
-        # Check file type
-        file_ext = value.name.split('.')[-1].lower()
-        allowed_types = settings.DOCUMENT_CONFIG['ALLOWED_FILE_TYPES']
-        if file_ext not in allowed_types:
-            raise serializers.ValidationError(
-                f"File type .{file_ext} not allowed. Allowed types: {', '.join(allowed_types)}"
-            )
+        error = upload_error(value.name, value.size)
+        if error:
+            raise serializers.ValidationError(error)
         
         return value
     
@@ -159,13 +156,7 @@ class DocumentUploadSerializer(serializers.Serializer):
         )
         
         # Create first version
-        version = DocumentVersion.objects.create(
-            document=document,
-            version_number=1,
-            file=file,
-            file_size=file.size,
-            file_type=file.name.split('.')[-1].lower()
-        )
+        version = document.create_version(file, content_hash=file_sha256(file))
         
         return {
             'document': document,
@@ -190,3 +181,98 @@ class DocumentApprovalSerializer(serializers.Serializer):
                 )
         
         return attrs
+
+
+class DocumentBulkUploadSerializer(serializers.Serializer):
+    """Common fields of a bulk upload; the files are read from request.FILES"""
+    
+    tags = serializers.ListField(
+        child=serializers.CharField(max_length=50),
+        required=False,
+        allow_empty=True
+    )
+    department = serializers.CharField(
+        max_length=100,
+        required=False,
+        allow_blank=True
+    )
+
+
+class UploadBatchSerializer(serializers.ModelSerializer):
+    
+    progress = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = UploadBatch
+        fields = ['id', 'total_files', 'skipped', 'total_skipped', 'task_group_id', 'progress', 'created_at']
+        read_only_fields = fields
+    
+    def get_progress(self, obj):
+        return obj.progress()
+
+
+class UploadSessionCreateSerializer(serializers.Serializer):
+    
+    filename = serializers.CharField(max_length=255)
+    file_size = serializers.IntegerField(min_value=1)
+    document = serializers.PrimaryKeyRelatedField(
+        queryset=Document.objects.all(),
+        required=False,
+        allow_null=True,
+        help_text="Existing document to add a version to"
+    )
+    title = serializers.CharField(max_length=255, required=False, allow_blank=True)
+    description = serializers.CharField(required=False, allow_blank=True)
+    tags = serializers.ListField(
+        child=serializers.CharField(max_length=50),
+        required=False,
+        allow_empty=True
+    )
+    department = serializers.CharField(
+        max_length=100,
+        required=False,
+        allow_blank=True
+    )
+    
+    def validate(self, attrs):
+        error = upload_error(
+            attrs['filename'],
+            attrs['file_size'],
+            max_size_mb=settings.DOCUMENT_CONFIG['CHUNKED_UPLOAD_MAX_SIZE_MB']
+        )
+        if error:
+            raise serializers.ValidationError({'filename': error})
+        
+        user = self.context['request'].user
+        document = attrs.get('document')
+        if document and document.owner_id != user.id and not user.is_admin():
+            raise serializers.ValidationError({'document': 'Permission denied'})
+        
+        return attrs
+    
+    def create(self, validated_data):
+        return UploadSession.objects.create(
+            owner=self.context['request'].user,
+            part_size=settings.DOCUMENT_CONFIG['CHUNKED_UPLOAD_PART_SIZE_MB'] * 1024 * 1024,
+            **validated_data
+        )
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    
+    total_parts = serializers.IntegerField(read_only=True)
+    received_parts = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = UploadSession
+        fields = [
+            'id', 'filename', 'file_size', 'part_size', 'total_parts',
+            'received_parts', 'document', 'status', 'version',
+            'created_at', 'updated_at'
+        ]
+        read_only_fields = fields
+    
+    def get_received_parts(self, obj):
+        if obj.status != UploadSessionStatus.ACTIVE:
+            return []
+        return ChunkedUploadService.received_parts(obj)
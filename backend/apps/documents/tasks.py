@@ -1,11 +1,20 @@
 from celery import shared_task
+from django.conf import settings
 from django.utils import timezone
 import logging
 import os
 
-from .models import DocumentVersion, DocumentChunk, ProcessingStatus
+from .models import (
+    DocumentVersion,
+    DocumentChunk,
+    ProcessingStatus,
+    UploadSession,
+    UploadSessionStatus
+)
 from .services import DocumentProcessingService
-from apps.retrieval.services import EmbeddingService
+from apps.retrieval.services import get_embedding_service
+from apps.retrieval.rate_limiting import background_calls
+from apps.retrieval.vector_stores import get_vector_store
 
 logger = logging.getLogger(__name__)
 
@@ -24,14 +33,25 @@ def process_document_task(self, version_id: int):
         
         logger.info(f"Starting processing for document version {version_id}")
         
-        # Step 1: Extract and chunk text
-        chunks_data = extract_and_chunk_task(version_id)
-        
-        if not chunks_data:
-            raise ValueError("No text extracted from document")
+        embedding_model = get_embedding_service().model
+        duplicate = find_processed_duplicate(version, embedding_model)
         
-        #generate embeddings
-        chunks_with_embeddings = generate_embeddings_task(chunks_data)
+        if duplicate:
+            # Identical file already embedded with this model
+            logger.info(
+                f"Version {version_id} matches processed version {duplicate.id}, "
+                f"reusing its chunks"
+            )
+            chunks_with_embeddings = copy_chunks_data(duplicate)
+        else:
+            # Step 1: Extract and chunk text
+            chunks_data = extract_and_chunk_task(version_id)
+            
+            if not chunks_data:
+                raise ValueError("No text extracted from document")
+            
+            #generate embeddings
+            chunks_with_embeddings = generate_embeddings_task(chunks_data)
         
         # Step 3: Save chunks to database
         save_chunks_to_db(version_id, chunks_with_embeddings)
@@ -41,8 +61,12 @@ def process_document_task(self, version_id: int):
         version.processing_status = ProcessingStatus.READY
         version.processed_at = timezone.now()
         version.total_chunks = len(chunks_with_embeddings)
+        version.embedding_model = embedding_model
         version.save()
         
+        # Make the new chunks searchable
+        version.document.sync_chunk_search_fields()
+        
         logger.info(
             f"Successfully processed document version {version_id}. "
             f"Created {len(chunks_with_embeddings)} chunks."
@@ -72,8 +96,34 @@ def process_document_task(self, version_id: int):
         raise self.retry(exc=exc)
 
 
+def find_processed_duplicate(version, embedding_model: str):
+    """
+    Another READY version of the same file (by content_hash) embedded with
+    `embedding_model`, or None. Versions processed before the model was
+    recorded are never reused.
+    """
+    if not version.content_hash:
+        return None
+    
+    return DocumentVersion.objects.filter(
+        content_hash=version.content_hash,
+        processing_status=ProcessingStatus.READY,
+        embedding_model=embedding_model,
+        total_chunks__gt=0
+    ).exclude(id=version.id).order_by('-processed_at').first()
+
+
+def copy_chunks_data(source) -> list[dict]:
+    """Chunks of `source` in the shape save_chunks_to_db() takes"""
+    return list(
+        DocumentChunk.objects.filter(version=source)
+        .order_by('chunk_index')
+        .values('chunk_index', 'text', 'embedding', 'metadata')
+    )
+
+
 def extract_and_chunk_task(version_id: int) -> list[dict]:
-    
+
     version = DocumentVersion.objects.get(id=version_id)
     processor = DocumentProcessingService()
     
@@ -100,14 +150,15 @@ def extract_and_chunk_task(version_id: int) -> list[dict]:
 
 
 def generate_embeddings_task(chunks_data: list[dict]) -> list[dict]:
-    embedding_service = EmbeddingService()
+    embedding_service = get_embedding_service()
     
     texts = [chunk['text'] for chunk in chunks_data]
     
     logger.info(f"Generating embeddings for {len(texts)} chunks")
     
-    # Generate embeddings
-    embeddings = embedding_service.generate_embeddings(texts)
+    # Generate embeddings (long retry budget, nobody is waiting on this)
+    with background_calls():
+        embeddings = embedding_service.generate_embeddings(texts)
     
     for i, chunk in enumerate(chunks_data):
         chunk['embedding'] = embeddings[i]
@@ -117,9 +168,11 @@ def generate_embeddings_task(chunks_data: list[dict]) -> list[dict]:
 
 def save_chunks_to_db(version_id: int, chunks_data: list[dict]):
 
-    version = DocumentVersion.objects.get(id=version_id)
+    version = DocumentVersion.objects.select_related('document').get(id=version_id)
+    document = version.document
     
-    DocumentChunk.objects.filter(version=version).delete()
+    store = get_vector_store()
+    store.delete_version(version.id)
     
     chunks_to_create = []
     for chunk_data in chunks_data:
@@ -129,11 +182,16 @@ def save_chunks_to_db(version_id: int, chunks_data: list[dict]):
                 chunk_index=chunk_data['chunk_index'],
                 text=chunk_data['text'],
                 embedding=chunk_data['embedding'],
-                metadata=chunk_data['metadata']
+                metadata=chunk_data['metadata'],
+                document_status=document.status,
+                document_title=document.title,
+                department=document.department,
+                version_number=version.version_number,
+                is_current=False  # set once the version is READY
             )
         )
     
-    DocumentChunk.objects.bulk_create(chunks_to_create)
+    store.upsert(chunks_to_create)
     
     logger.info(f"Saved {len(chunks_to_create)} chunks to database")
 
@@ -159,3 +217,33 @@ def cleanup_failed_uploads():
         logger.info(f"Marked {count} stale uploads as failed")
     
     return {'cleaned_up': count}
+
+
+@shared_task(ignore_result=True)
+def cleanup_upload_sessions_task():
+    """
+    Delete resumable uploads that received no part for
+    CHUNKED_UPLOAD_EXPIRY_HOURS, and any left COMPLETING that long by a
+    worker that died while assembling.
+    """
+    from datetime import timedelta
+    # uploads imports this module
+    from .uploads import ChunkedUploadService
+    
+    cutoff_time = timezone.now() - timedelta(
+        hours=settings.DOCUMENT_CONFIG['CHUNKED_UPLOAD_EXPIRY_HOURS']
+    )
+    
+    stale = UploadSession.objects.filter(
+        status__in=[UploadSessionStatus.ACTIVE, UploadSessionStatus.COMPLETING],
+        updated_at__lt=cutoff_time
+    )
+    
+    count = 0
+    for session in stale.iterator():
+        ChunkedUploadService.delete_parts(session)
+        session.delete()
+        count += 1
+    
+    if count > 0:
+        logger.info(f"Deleted {count} stale upload sessions")
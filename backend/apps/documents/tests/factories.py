@@ -0,0 +1,59 @@
+import factory
+import numpy as np
+from django.conf import settings
+
+from apps.core.tests.factories import UserFactory
+from apps.documents.models import (
+    Document,
+    DocumentVersion,
+    DocumentChunk,
+    DocumentStatus,
+    ProcessingStatus
+)
+
+
+def random_embedding(rng=np.random):
+    vector = rng.normal(size=settings.LLM_CONFIG['EMBEDDING_DIMENSION'])
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+class DocumentFactory(factory.django.DjangoModelFactory):
+
+    class Meta:
+        model = Document
+    
+    title = factory.Sequence(lambda n: f'Document {n}')
+    owner = factory.SubFactory(UserFactory)
+    status = DocumentStatus.APPROVED
+    department = 'Engineering'
+    tags = factory.LazyFunction(list)
+    latest_version_number = 1
+
+
+class DocumentVersionFactory(factory.django.DjangoModelFactory):
+
+    class Meta:
+        model = DocumentVersion
+    
+    document = factory.SubFactory(DocumentFactory)
+    version_number = 1
+    file = factory.django.FileField(filename='document.txt', data=b'Some document text.')
+    file_size = 19
+    file_type = 'txt'
+    processing_status = ProcessingStatus.READY
+
+
+class DocumentChunkFactory(factory.django.DjangoModelFactory):
+
+    class Meta:
+        model = DocumentChunk
+    
+    version = factory.SubFactory(DocumentVersionFactory)
+    chunk_index = factory.Sequence(lambda n: n)
+    text = factory.Sequence(lambda n: f'Chunk {n} text.')
+    embedding = factory.LazyFunction(random_embedding)
+    document_status = factory.LazyAttribute(lambda chunk: chunk.version.document.status)
+    document_title = factory.LazyAttribute(lambda chunk: chunk.version.document.title)
+    department = factory.LazyAttribute(lambda chunk: chunk.version.document.department)
+    version_number = factory.LazyAttribute(lambda chunk: chunk.version.version_number)
+    is_current = True
@@ -0,0 +1,55 @@
+import os
+import zipfile
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError
+
+from apps.documents.models import Document, DocumentVersion, UploadBatch
+from apps.documents.uploads import BulkUploadService
+
+pytestmark = pytest.mark.django_db
+
+
+def stored_files(settings):
+    return [name for _, _, names in os.walk(settings.MEDIA_ROOT) for name in names]
+
+
+def text_file(name):
+    return SimpleUploadedFile(name, b'Some document text.')
+
+
+def test_bulk_upload_deletes_stored_files_when_archive_breaks(user, settings):
+    def files():
+        yield text_file('one.txt')
+        yield text_file('two.txt')
+        raise zipfile.BadZipFile("Bad CRC-32 for file 'three.txt'")
+    
+    with pytest.raises(zipfile.BadZipFile):
+        BulkUploadService.create(user, files())
+    
+    assert stored_files(settings) == []
+    assert not UploadBatch.objects.exists()
+
+
+def test_bulk_upload_deletes_stored_files_when_insert_fails(user, settings, monkeypatch):
+    def fail(*args, **kwargs):
+        raise IntegrityError("insert failed")
+    
+    monkeypatch.setattr(DocumentVersion.objects, 'bulk_create', fail)
+    
+    with pytest.raises(IntegrityError):
+        BulkUploadService.create(user, [text_file('one.txt'), text_file('two.txt')])
+    
+    assert stored_files(settings) == []
+    assert not Document.objects.exists()
+
+
+def test_bulk_upload_lists_first_100_skipped_files(user):
+    files = [text_file('policy.txt')] + [text_file(f'logo{i}.png') for i in range(150)]
+    
+    batch = BulkUploadService.create(user, files)
+    
+    assert batch.total_files == 1
+    assert batch.total_skipped == 150
+    assert len(batch.skipped) == 100
+    assert batch.skipped[0]['name'] == 'logo0.png'
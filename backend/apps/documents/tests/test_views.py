@@ -0,0 +1,224 @@
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+from apps.documents import views
+from apps.documents.models import (
+    Document,
+    DocumentStatus,
+    DocumentTagCount,
+    UploadSession,
+    UploadSessionStatus
+)
+from apps.documents.tests.factories import (
+    DocumentFactory,
+    DocumentVersionFactory,
+    DocumentChunkFactory
+)
+from apps.documents.uploads import ChunkedUploadService
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def no_processing(monkeypatch):
+    monkeypatch.setattr(views.process_document_task, 'delay', lambda version_id: None)
+
+
+@pytest.fixture
+def document(user):
+    # Owned by `user`, with two versions
+    version = DocumentVersionFactory(document__owner=user, document__latest_version_number=2)
+    DocumentVersionFactory(document=version.document, version_number=2)
+    return version.document
+
+
+@pytest.mark.parametrize('num_documents', [1, 5, 20, 45])
+def test_list_queries_do_not_grow_with_page_size(
+    api_client, user, num_documents, django_assert_num_queries
+):
+    DocumentFactory.create_batch(num_documents, owner=user)
+    DocumentFactory(status=DocumentStatus.DRAFT)
+    api_client.force_authenticate(user)
+    
+    # Count, then the page with owner and approver joined
+    with django_assert_num_queries(2):
+        response = api_client.get('/api/documents/')
+    
+    assert response.status_code == 200
+    assert response.data['count'] == num_documents
+    assert len(response.data['results']) == min(num_documents, 20)
+
+
+def test_detail_queries(api_client, user, document, django_assert_num_queries):
+    api_client.force_authenticate(user)
+    
+    # The document with owner and approver, then all its versions
+    with django_assert_num_queries(2):
+        response = api_client.get(f'/api/documents/{document.id}/')
+    
+    assert response.status_code == 200
+    assert len(response.data['versions']) == 2
+
+
+def test_processing_status_queries(api_client, user, document, django_assert_num_queries):
+    version = document.versions.get(version_number=2)
+    api_client.force_authenticate(user)
+    
+    with django_assert_num_queries(1):
+        response = api_client.get(f'/api/documents/versions/{version.id}/status/')
+    
+    assert response.status_code == 200
+    assert response.data['document_title'] == document.title
+
+
+def test_new_version_queries(api_client, user, document, no_processing, django_assert_num_queries):
+    api_client.force_authenticate(user)
+    file = SimpleUploadedFile('policy-v3.txt', b'Updated policy text.')
+    
+    # Document, version number bump and read-back, insert (in a savepoint),
+    # audit log. No lookup of the existing versions.
+    with django_assert_num_queries(7):
+        response = api_client.post(f'/api/documents/{document.id}/new-version/', {'file': file})
+    
+    assert response.status_code == 201
+    assert response.data['version']['version_number'] == 3
+
+
+def test_approve_queries(api_client, admin, document, django_assert_num_queries):
+    document.status = DocumentStatus.DRAFT
+    document.save()
+    for version in document.versions.all():
+        DocumentChunkFactory.create_batch(3, version=version)
+    api_client.force_authenticate(admin)
+    
+    # Document, latest version check, save, latest READY version, chunk
+    # search fields and is_current flips (one UPDATE each), audit log
+    with django_assert_num_queries(8):
+        response = api_client.post(f'/api/documents/{document.id}/approve/', {'action': 'approve'}, format='json')
+    
+    assert response.status_code == 200
+    assert response.data['document']['status'] == DocumentStatus.APPROVED
+
+
+def tag_counts():
+    return {
+        (tag, status): count
+        for tag, status, count in DocumentTagCount.objects.filter(count__gt=0).values_list('tag', 'status', 'count')
+    }
+
+
+def test_tag_counts_follow_every_document_write(user):
+    document = DocumentFactory(tags=['HR', 'Policy', 'HR'])
+    Document.objects.bulk_create([
+        Document(title='Imported', owner=user, tags=['HR'], status=DocumentStatus.DRAFT)
+    ])
+    
+    assert tag_counts() == {
+        ('HR', DocumentStatus.APPROVED): 1,
+        ('Policy', DocumentStatus.APPROVED): 1,
+        ('HR', DocumentStatus.DRAFT): 1,
+    }
+    
+    document.tags = ['Policy']
+    document.status = DocumentStatus.ARCHIVED
+    document.save()
+    Document.objects.filter(title='Imported').update(status=DocumentStatus.APPROVED)
+    
+    assert tag_counts() == {
+        ('Policy', DocumentStatus.ARCHIVED): 1,
+        ('HR', DocumentStatus.APPROVED): 1,
+    }
+    
+    Document.objects.all().delete()
+    assert tag_counts() == {}
+
+
+@pytest.mark.parametrize('params, num_queries', [
+    # Maintained counts, then the user's own drafts
+    ('', 2),
+    # Narrowed by the tags index and unnested
+    ('?tags=HR', 1),
+])
+def test_tag_facets_count_approved_and_own_documents(
+    api_client, user, params, num_queries, django_assert_num_queries
+):
+    DocumentFactory.create_batch(2, tags=['HR', 'Policy'])
+    DocumentFactory(tags=['HR'], status=DocumentStatus.DRAFT)
+    DocumentFactory(owner=user, tags=['Finance', 'HR'], status=DocumentStatus.DRAFT)
+    api_client.force_authenticate(user)
+    
+    with django_assert_num_queries(num_queries):
+        response = api_client.get(f'/api/documents/tags/{params}')
+    
+    assert response.json()['tags'] == [
+        {'tag': 'HR', 'count': 3},
+        {'tag': 'Policy', 'count': 2},
+        {'tag': 'Finance', 'count': 1},
+    ]
+
+
+@pytest.fixture
+def upload_session(user):
+    # Two parts: 'Some docum' and 'ent text.'
+    return UploadSession.objects.create(owner=user, filename='policy.txt', file_size=19, part_size=10)
+
+
+def put_part(client, session, part_number, data):
+    return client.put(
+        f'/api/documents/uploads/{session.id}/parts/{part_number}/',
+        data,
+        content_type='application/octet-stream'
+    )
+
+
+def test_complete_upload_session(api_client, user, upload_session):
+    api_client.force_authenticate(user)
+    put_part(api_client, upload_session, 2, b'ent text.')
+    put_part(api_client, upload_session, 1, b'Some docum')
+    
+    response = api_client.post(f'/api/documents/uploads/{upload_session.id}/complete/')
+    
+    assert response.status_code == 201
+    upload_session.refresh_from_db()
+    assert upload_session.status == UploadSessionStatus.COMPLETED
+    with upload_session.version.file.open('rb') as file:
+        assert file.read() == b'Some document text.'
+
+
+def test_upload_session_is_completing_while_parts_are_assembled(
+    api_client, user, upload_session, monkeypatch
+):
+    api_client.force_authenticate(user)
+    put_part(api_client, upload_session, 1, b'Some docum')
+    put_part(api_client, upload_session, 2, b'ent text.')
+    complete = ChunkedUploadService.complete
+    responses = []
+    
+    def assemble(session):
+        # A late part and a second complete arrive meanwhile
+        responses.append(put_part(api_client, session, 1, b'Late part!'))
+        responses.append(api_client.post(f'/api/documents/uploads/{session.id}/complete/'))
+        return complete(session)
+    
+    monkeypatch.setattr(ChunkedUploadService, 'complete', staticmethod(assemble))
+    response = api_client.post(f'/api/documents/uploads/{upload_session.id}/complete/')
+    
+    assert response.status_code == 201
+    assert [refused.status_code for refused in responses] == [409, 409]
+    assert responses[0].data['error'] == 'Upload session is being completed'
+
+
+def test_upload_session_reopens_when_assembly_fails(api_client, user, upload_session, monkeypatch):
+    api_client.force_authenticate(user)
+    put_part(api_client, upload_session, 1, b'Some docum')
+    put_part(api_client, upload_session, 2, b'ent text.')
+    
+    def fail(session):
+        raise OSError("No space left on device")
+    
+    monkeypatch.setattr(ChunkedUploadService, 'complete', staticmethod(fail))
+    with pytest.raises(OSError):
+        api_client.post(f'/api/documents/uploads/{upload_session.id}/complete/')
+    
+    upload_session.refresh_from_db()
+    assert upload_session.status == UploadSessionStatus.ACTIVE
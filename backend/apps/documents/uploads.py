@@ -0,0 +1,288 @@
+"""
+Upload helpers shared by the document upload views.
+
+Files are written to storage as they are read (uploads are spooled to
+temporary files, ZIP members are decompressed chunk by chunk), so no
+upload is ever held in memory whole.
+"""
+
+import os
+import hashlib
+import zipfile
+import logging
+from celery import group
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from django.db.models.fields.files import FieldFile
+
+from .models import (
+    Document,
+    DocumentVersion,
+    UploadBatch,
+    UploadSession,
+    UploadSessionStatus
+)
+from .tasks import process_document_task
+
+logger = logging.getLogger(__name__)
+
+
+def upload_error(name: str, size: int, max_size_mb: int = None):
+    """
+    Why a file can't be uploaded (size and type limits), or None.
+    max_size_mb defaults to MAX_FILE_SIZE_MB.
+    """
+    config = settings.DOCUMENT_CONFIG
+    max_size_mb = max_size_mb or config['MAX_FILE_SIZE_MB']
+    
+    if size > max_size_mb * 1024 * 1024:
+        return f"File size exceeds {max_size_mb}MB limit."
+    
+    file_ext = name.split('.')[-1].lower()
+    allowed_types = config['ALLOWED_FILE_TYPES']
+    if file_ext not in allowed_types:
+        return f"File type .{file_ext} not allowed. Allowed types: {', '.join(allowed_types)}"
+    
+    return None
+
+
+def file_sha256(file) -> str:
+    """Hex SHA-256 of an uploaded file, read chunk by chunk"""
+    digest = hashlib.sha256()
+    for chunk in file.chunks():
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def archive_members(archive):
+    """
+    Yield each regular file in a ZIP upload as a File that decompresses
+    on read. Valid until the next item is requested.
+    
+    Raises zipfile.BadZipFile if `archive` is not a ZIP.
+    """
+    with zipfile.ZipFile(archive) as zf:
+        for info in zf.infolist():
+            name = os.path.basename(info.filename)
+            # Folders, and metadata that macOS and editors add to archives
+            if info.is_dir() or not name or name.startswith('.') or info.filename.startswith('__MACOSX/'):
+                continue
+            
+            with zf.open(info) as member:
+                file = File(member, name=name)
+                file.size = info.file_size
+                yield file
+
+
+class BulkUploadService:
+
+    @staticmethod
+    def create(user, files, department: str = '', tags: list = None) -> UploadBatch:
+        """
+        Store each acceptable file and create its Document and version 1
+        with bulk_create, then queue processing as one Celery group once
+        the rows are committed. Rejected files are recorded on the batch
+        (the first 100 by name, all of them in the count). If anything
+        fails before the rows are committed, the stored files are deleted.
+        """
+        max_files = settings.DOCUMENT_CONFIG['BULK_UPLOAD_MAX_FILES']
+        documents = []
+        versions = []
+        skipped = []
+        total_skipped = 0
+        
+        try:
+            for file in files:
+                error = upload_error(file.name, file.size)
+                if error is None and len(versions) >= max_files:
+                    error = f"Batch limit of {max_files} files reached."
+                if error:
+                    total_skipped += 1
+                    if len(skipped) < 100:
+                        skipped.append({'name': file.name, 'error': error})
+                    continue
+                
+                version = DocumentVersion(
+                    version_number=1,
+                    file_size=file.size,
+                    file_type=file.name.split('.')[-1].lower(),
+                    content_hash=file_sha256(file)
+                )
+                # Streams to storage now; rows are inserted together below
+                version.file.save(file.name, file, save=False)
+                versions.append(version)
+                
+                documents.append(Document(
+                    title=os.path.splitext(file.name)[0][:255],
+                    owner=user,
+                    tags=tags or [],
+                    department=department or '',
+                    latest_version_number=1
+                ))
+            
+            with transaction.atomic():
+                batch = UploadBatch.objects.create(
+                    owner=user,
+                    total_files=len(versions),
+                    skipped=skipped,
+                    total_skipped=total_skipped
+                )
+                
+                Document.objects.bulk_create(documents, batch_size=500)
+                for document, version in zip(documents, versions):
+                    version.document = document
+                    version.batch = batch
+                DocumentVersion.objects.bulk_create(versions, batch_size=500)
+        except Exception:
+            # e.g. a corrupt ZIP member part way through, or a failed insert:
+            # no row points at the files stored so far
+            for version in versions:
+                version.file.delete(save=False)
+            raise
+        
+        transaction.on_commit(lambda: BulkUploadService._enqueue(batch, versions))
+        
+        logger.info(
+            f"Bulk upload {batch.id}: {len(versions)} files accepted, {total_skipped} skipped"
+        )
+        return batch
+    
+    @staticmethod
+    def _enqueue(batch: UploadBatch, versions: list):
+        if not versions:
+            return
+        
+        result = group(
+            process_document_task.s(version.id) for version in versions
+        ).apply_async()
+        
+        batch.task_group_id = result.id
+        UploadBatch.objects.filter(pk=batch.pk).update(task_group_id=result.id)
+
+
+class PartsReader:
+    """
+    File-like reader over stored parts, in order, that hashes what it
+    returns. Assembly is a single streaming pass in constant memory.
+    """
+    
+    def __init__(self, names):
+        self._names = iter(names)
+        self._current = None
+        self._digest = hashlib.sha256()
+    
+    def read(self, size: int = -1) -> bytes:
+        while True:
+            if self._current is None:
+                name = next(self._names, None)
+                if name is None:
+                    return b''
+                self._current = default_storage.open(name, 'rb')
+            
+            data = self._current.read(size)
+            if data:
+                self._digest.update(data)
+                return data
+            
+            self._current.close()
+            self._current = None
+    
+    def hexdigest(self) -> str:
+        return self._digest.hexdigest()
+
+
+class ChunkedUploadService:
+
+    @staticmethod
+    def received_parts(session: UploadSession) -> list:
+        """Part numbers stored with their full expected size"""
+        if not default_storage.exists(session.parts_dir):
+            return []
+        
+        _, names = default_storage.listdir(session.parts_dir)
+        parts = []
+        for name in names:
+            if not name.isdigit():
+                continue
+            part_number = int(name)
+            if 1 <= part_number <= session.total_parts and default_storage.size(
+                session.part_name(part_number)
+            ) == session.expected_part_size(part_number):
+                parts.append(part_number)
+        
+        return sorted(parts)
+    
+    @staticmethod
+    def save_part(session: UploadSession, part_number: int, stream):
+        """
+        Write one part from `stream` straight to storage, replacing any
+        earlier attempt. Returns an error message if it came out the wrong
+        size (the part is then discarded), else None.
+        """
+        name = session.part_name(part_number)
+        default_storage.delete(name)
+        # Storage reads the request body in chunks
+        saved = default_storage.save(name, File(stream, name=name))
+        
+        expected = session.expected_part_size(part_number)
+        if saved != name or default_storage.size(saved) != expected:
+            default_storage.delete(saved)
+            return f"Part {part_number} must be {expected} bytes."
+        
+        UploadSession.objects.filter(pk=session.pk).update(updated_at=timezone.now())
+        return None
+    
+    @staticmethod
+    def complete(session: UploadSession) -> DocumentVersion:
+        """
+        Assemble the parts into the document file while hashing it, create
+        the Document (or next version) and queue processing on commit.
+        All parts must have been received, and the session marked
+        COMPLETING so no part changes underneath.
+        """
+        field = DocumentVersion._meta.get_field('file')
+        reader = PartsReader(
+            session.part_name(part_number)
+            for part_number in range(1, session.total_parts + 1)
+        )
+        name = default_storage.save(
+            field.generate_filename(None, session.filename),
+            File(reader, name=session.filename)
+        )
+        stored = FieldFile(None, field, name)
+        
+        with transaction.atomic():
+            document = session.document
+            if document is None:
+                document = Document.objects.create(
+                    title=session.title or os.path.splitext(session.filename)[0][:255],
+                    description=session.description,
+                    owner=session.owner,
+                    tags=session.tags,
+                    department=session.department
+                )
+            
+            version = document.create_version(stored, content_hash=reader.hexdigest())
+            
+            session.status = UploadSessionStatus.COMPLETED
+            session.version = version
+            session.save(update_fields=['status', 'version', 'updated_at'])
+            
+            transaction.on_commit(lambda: process_document_task.delay(version.id))
+        
+        ChunkedUploadService.delete_parts(session)
+        return version
+    
+    @staticmethod
+    def delete_parts(session: UploadSession):
+        if not default_storage.exists(session.parts_dir):
+            return
+        
+        _, names = default_storage.listdir(session.parts_dir)
+        for name in names:
+            default_storage.delete(f"{session.parts_dir}/{name}")
+        default_storage.delete(session.parts_dir)
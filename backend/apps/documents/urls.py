@@ -1,7 +1,14 @@
 from django.urls import path
 from .views import (
     DocumentUploadView,
+    DocumentBulkUploadView,
+    UploadBatchStatusView,
+    UploadSessionCreateView,
+    UploadSessionDetailView,
+    UploadSessionPartView,
+    UploadSessionCompleteView,
     DocumentListView,
+    DocumentTagFacetsView,
     DocumentDetailView,
     DocumentApprovalView,
     DocumentNewVersionView,
@@ -12,7 +19,14 @@ app_name = 'documents'
 
 urlpatterns = [
     path('upload/', DocumentUploadView.as_view(), name='upload'),
+    path('bulk-upload/', DocumentBulkUploadView.as_view(), name='bulk-upload'),
+    path('bulk-upload/<int:pk>/', UploadBatchStatusView.as_view(), name='bulk-upload-status'),
+    path('uploads/', UploadSessionCreateView.as_view(), name='upload-session-create'),
+    path('uploads/<int:pk>/', UploadSessionDetailView.as_view(), name='upload-session'),
+    path('uploads/<int:pk>/parts/<int:part_number>/', UploadSessionPartView.as_view(), name='upload-session-part'),
+    path('uploads/<int:pk>/complete/', UploadSessionCompleteView.as_view(), name='upload-session-complete'),
     path('', DocumentListView.as_view(), name='list'),
+    path('tags/', DocumentTagFacetsView.as_view(), name='tag-facets'),
     path('<int:pk>/', DocumentDetailView.as_view(), name='detail'),
     path('<int:pk>/approve/', DocumentApprovalView.as_view(), name='approve'),
     path('<int:pk>/new-version/', DocumentNewVersionView.as_view(), name='new-version'),
@@ -1,22 +1,55 @@
 from rest_framework import status, generics, views
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from django.conf import settings
+from django.core.cache import cache
 from django.utils import timezone
-from django.db.models import Q
+from django.db import connection, transaction
+from django.db.models import Q, Sum
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from collections import Counter
+from hashlib import md5
+from urllib.parse import urlencode
+import zipfile
 
-from .models import Document, DocumentVersion, DocumentStatus
+from .models import (
+    Document,
+    DocumentVersion,
+    DocumentTagCount,
+    DocumentStatus,
+    ProcessingStatus,
+    UploadBatch,
+    UploadSession,
+    UploadSessionStatus
+)
 from .serializers import (
     DocumentSerializer,
     DocumentDetailSerializer,
     DocumentUploadSerializer,
     DocumentApprovalSerializer,
-    DocumentVersionSerializer
+    DocumentVersionSerializer,
+    DocumentBulkUploadSerializer,
+    UploadBatchSerializer,
+    UploadSessionCreateSerializer,
+    UploadSessionSerializer
 )
 from .tasks import process_document_task
+from .uploads import BulkUploadService, ChunkedUploadService, archive_members, file_sha256
 from apps.core.permissions import IsContentOwner, IsOwnerOrReadOnly
+from apps.core.search import trigram_search
 from apps.audit.services import AuditService
 
 
+# Same counting as document_tag_counts: each document once per distinct tag
+TAG_FACETS_SQL = """
+SELECT t.tag, COUNT(*)
+FROM ({documents}) AS d, LATERAL (SELECT DISTINCT jsonb_array_elements_text(d.tags) AS tag) AS t
+GROUP BY t.tag
+ORDER BY COUNT(*) DESC, t.tag
+LIMIT %s
+"""
+
+
 class DocumentUploadView(views.APIView):
     permission_classes = [IsAuthenticated]
     
@@ -64,61 +97,457 @@ class DocumentUploadView(views.APIView):
         )
 
 
+class DocumentBulkUploadView(views.APIView):
+    """
+    Upload many files at once: repeated `files` parts, a ZIP `archive`, or
+    both. Every file becomes a new Document; `tags` and `department`
+    apply to all of them.
+    """
+    
+    permission_classes = [IsAuthenticated]
+    
+    def post(self, request):
+        # Spool every part to disk, however small, so a large batch never
+        # sits in worker memory. Must be set before the body is parsed.
+        request._request.upload_handlers = [TemporaryFileUploadHandler(request._request)]
+        
+        files = request.FILES.getlist('files')
+        archive = request.FILES.get('archive')
+        if not files and not archive:
+            return Response(
+                {'error': 'Provide one or more files, or a ZIP archive'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        serializer = DocumentBulkUploadSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        max_archive_mb = settings.DOCUMENT_CONFIG['BULK_UPLOAD_MAX_ARCHIVE_MB']
+        if archive and archive.size > max_archive_mb * 1024 * 1024:
+            return Response(
+                {'error': f'Archive exceeds {max_archive_mb}MB limit.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # Checked before anything is written to storage
+        if archive and not zipfile.is_zipfile(archive):
+            return Response(
+                {'error': 'Archive is not a valid ZIP file'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        def all_files():
+            yield from files
+            if archive:
+                yield from archive_members(archive)
+        
+        try:
+            batch = BulkUploadService.create(
+                request.user,
+                all_files(),
+                department=serializer.validated_data.get('department', ''),
+                tags=serializer.validated_data.get('tags', [])
+            )
+        except zipfile.BadZipFile:
+            # Corrupt member found part way through
+            return Response(
+                {'error': 'Archive is not a valid ZIP file'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        AuditService.log_action(
+            user=request.user,
+            action='DOCUMENT_BULK_UPLOAD',
+            resource_type='UploadBatch',
+            resource_id=batch.id,
+            details={
+                'files': batch.total_files,
+                'skipped': batch.total_skipped
+            },
+            request=request
+        )
+        
+        return Response({
+            'message': f'{batch.total_files} documents uploaded. Processing started.',
+            'batch': UploadBatchSerializer(batch).data
+        }, status=status.HTTP_202_ACCEPTED)
+
+
+class UploadBatchStatusView(views.APIView):
+
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request, pk):
+        batches = UploadBatch.objects.all()
+        if not request.user.is_admin():
+            batches = batches.filter(owner=request.user)
+        
+        try:
+            batch = batches.get(pk=pk)
+        except UploadBatch.DoesNotExist:
+            return Response(
+                {'error': 'Upload batch not found'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
+        failed = batch.versions.filter(
+            processing_status=ProcessingStatus.FAILED
+        ).values('id', 'document_id', 'document__title', 'error_message')[:100]
+        
+        return Response({
+            **UploadBatchSerializer(batch).data,
+            'failed': list(failed)
+        })
+
+
+class UploadSessionCreateView(views.APIView):
+    """
+    Start a resumable upload. The response gives the part size and count;
+    parts are then PUT to uploads/<id>/parts/<n>/ in any order and the
+    session completed with POST uploads/<id>/complete/.
+    """
+    
+    permission_classes = [IsAuthenticated]
+    
+    def post(self, request):
+        serializer = UploadSessionCreateSerializer(
+            data=request.data,
+            context={'request': request}
+        )
+        
+        if serializer.is_valid():
+            session = serializer.save()
+            return Response(
+                UploadSessionSerializer(session).data,
+                status=status.HTTP_201_CREATED
+            )
+        
+        return Response(
+            serializer.errors,
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+
+class UploadSessionMixin:
+
+    def get_session(self, request, pk):
+        try:
+            return UploadSession.objects.select_related('document').get(
+                pk=pk,
+                owner=request.user
+            )
+        except UploadSession.DoesNotExist:
+            return None
+    
+    def not_found(self):
+        return Response(
+            {'error': 'Upload session not found'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    
+    def not_active(self, session):
+        if session.status == UploadSessionStatus.COMPLETING:
+            message = 'Upload session is being completed'
+        else:
+            message = 'Upload session is already completed'
+        return Response({'error': message}, status=status.HTTP_409_CONFLICT)
+
+
+class UploadSessionDetailView(UploadSessionMixin, views.APIView):
+    """Session state, including the parts received so far (to resume)"""
+    
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request, pk):
+        session = self.get_session(request, pk)
+        if session is None:
+            return self.not_found()
+        
+        return Response(UploadSessionSerializer(session).data)
+    
+    def delete(self, request, pk):
+        session = self.get_session(request, pk)
+        if session is None:
+            return self.not_found()
+        if session.status != UploadSessionStatus.ACTIVE:
+            return self.not_active(session)
+        
+        ChunkedUploadService.delete_parts(session)
+        session.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class UploadSessionPartView(UploadSessionMixin, views.APIView):
+    """
+    PUT the raw bytes of one part (Content-Type: application/octet-stream).
+    Re-sending a part replaces it.
+    """
+    
+    permission_classes = [IsAuthenticated]
+    
+    def put(self, request, pk, part_number):
+        session = self.get_session(request, pk)
+        if session is None:
+            return self.not_found()
+        if session.status != UploadSessionStatus.ACTIVE:
+            return self.not_active(session)
+        
+        if not 1 <= part_number <= session.total_parts:
+            return Response(
+                {'error': f'Part number must be between 1 and {session.total_parts}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # Refuse before writing anything if the declared size is wrong
+        expected = session.expected_part_size(part_number)
+        if request.headers.get('Content-Length') != str(expected):
+            return Response(
+                {'error': f'Part {part_number} must be {expected} bytes.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # Read the body as a stream, never through request.data
+        error = ChunkedUploadService.save_part(session, part_number, request._request)
+        if error:
+            return Response({'error': error}, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Completion may have started while this part was being written
+        session.refresh_from_db(fields=['status'])
+        if session.status != UploadSessionStatus.ACTIVE:
+            return self.not_active(session)
+        
+        return Response({'part_number': part_number, 'size': expected})
+
+
+class UploadSessionCompleteView(UploadSessionMixin, views.APIView):
+    """
+    Assemble the parts into a new document or version. The session is
+    marked COMPLETING in a short locked transaction first, so a second
+    complete or a late part is refused (409) while the file is assembled
+    without holding the lock. If assembly fails the session is reopened
+    and the complete can be retried.
+    """
+    
+    permission_classes = [IsAuthenticated]
+    
+    def post(self, request, pk):
+        with transaction.atomic():
+            session = UploadSession.objects.select_for_update().filter(
+                pk=pk,
+                owner=request.user
+            ).first()
+            if session is None:
+                return self.not_found()
+            if session.status != UploadSessionStatus.ACTIVE:
+                return self.not_active(session)
+            
+            received = ChunkedUploadService.received_parts(session)
+            missing = sorted(set(range(1, session.total_parts + 1)) - set(received))
+            if missing:
+                return Response(
+                    {'error': 'Upload is missing parts', 'missing_parts': missing[:100]},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            
+            session.status = UploadSessionStatus.COMPLETING
+            session.save(update_fields=['status', 'updated_at'])
+        
+        try:
+            version = ChunkedUploadService.complete(session)
+        except Exception:
+            UploadSession.objects.filter(
+                pk=session.pk,
+                status=UploadSessionStatus.COMPLETING
+            ).update(status=UploadSessionStatus.ACTIVE)
+            raise
+        
+        AuditService.log_action(
+            user=request.user,
+            action='DOCUMENT_UPLOAD' if version.version_number == 1 else 'DOCUMENT_VERSION_UPLOAD',
+            resource_type='DocumentVersion',
+            resource_id=version.id,
+            details={
+                'document_title': version.document.title,
+                'version': version.version_number,
+                'file_type': version.file_type,
+                'file_size': version.file_size,
+                'resumable': True
+            },
+            request=request
+        )
+        
+        return Response({
+            'message': f'Version {version.version_number} uploaded successfully. Processing started.',
+            'version': DocumentVersionSerializer(
+                version,
+                context={'request': request}
+            ).data
+        }, status=status.HTTP_201_CREATED)
+
+
+def parse_tags(value: str) -> list:
+    """Comma-separated tags from a query param, blanks dropped"""
+    return [tag.strip() for tag in (value or '').split(',') if tag.strip()]
+
+
+def filter_documents(request, queryset):
+    """
+    Documents visible to request.user, narrowed by the list query params.
+    Returned unordered; with `search` it carries `search_rank`.
+    """
+    user = request.user
+    params = request.query_params
+    
+    # Permission filtering
+    if not user.is_admin():
+        
+        queryset = queryset.filter(
+            Q(owner=user) | Q(status=DocumentStatus.APPROVED)
+        )
+    
+    status_filter = params.get('status')
+    if status_filter:
+        queryset = queryset.filter(status=status_filter)
+    
+    owner = params.get('owner')
+    if owner:
+        queryset = queryset.filter(owner__username=owner)
+    
+    department = params.get('department')
+    if department:
+        queryset = queryset.filter(department__iexact=department)
+    
+    # All of: one containment test (tags @> '["a", "b"]')
+    tags = parse_tags(params.get('tags'))
+    if tags:
+        queryset = queryset.filter(tags__contains=tags)
+    
+    # Any of: ORed containment tests, combined as a BitmapOr on the same index
+    tags_any = parse_tags(params.get('tags_any'))
+    if tags_any:
+        any_of = Q()
+        for tag in tags_any:
+            any_of |= Q(tags__contains=[tag])
+        queryset = queryset.filter(any_of)
+    
+    search = params.get('search')
+    if search:
+        queryset = trigram_search(queryset, search, ['title', 'description'])
+    
+    return queryset
+
+
 class DocumentListView(generics.ListAPIView):
 
     serializer_class = DocumentSerializer
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        user = self.request.user
-        queryset = Document.objects.select_related('owner', 'approved_by')
+        queryset = filter_documents(
+            self.request,
+            Document.objects.select_related('owner', 'approved_by')
+        )
         
-        # Permission filtering
-        if not user.is_admin():
+        # Search, best matches first
+        if self.request.query_params.get('search'):
+            return queryset.order_by('-search_rank', '-created_at')
+        
+        return queryset.order_by('-created_at')
 
-            queryset = queryset.filter(
-                Q(owner=user) | Q(status=DocumentStatus.APPROVED)
-            )
+
+class DocumentTagFacetsView(views.APIView):
+    """
+    Tag counts over the documents the list would return for the same
+    query params, most common first.
+    
+    Without filters beyond status, counts come from DocumentTagCount:
+    approved documents (and, for admins, every status) from the maintained
+    table, plus the user's own other documents through the owner index.
+    Other filters narrow the set through their indexes (tags GIN, trigram,
+    department) and only the matching rows are unnested; those results
+    are cached per scope for TAG_FACETS_CACHE_SECONDS.
+    """
+    
+    permission_classes = [IsAuthenticated]
+    
+    # Params that narrow the documents beyond visibility and status
+    NARROWING_PARAMS = ('owner', 'department', 'tags', 'tags_any', 'search')
+    
+    def get(self, request):
+        limit = settings.DOCUMENT_CONFIG['TAG_FACETS_LIMIT']
+        
+        if not any(request.query_params.get(name) for name in self.NARROWING_PARAMS):
+            return Response({'tags': self._maintained_counts(request, limit)})
+        
+        cache_seconds = settings.DOCUMENT_CONFIG['TAG_FACETS_CACHE_SECONDS']
+        
+        # Visibility differs per user unless they can see everything
+        scope = 'all' if request.user.is_admin() else request.user.id
+        params = urlencode(sorted(request.query_params.items()))
+        cache_key = f"documents:tag_facets:{scope}:{md5(params.encode()).hexdigest()}"
+        
+        facets = cache.get(cache_key) if cache_seconds else None
+        if facets is None:
+            documents = filter_documents(request, Document.objects.all())
+            sql, sql_params = documents.order_by().values('tags').query.sql_with_params()
+            
+            with connection.cursor() as cursor:
+                cursor.execute(TAG_FACETS_SQL.format(documents=sql), [*sql_params, limit])
+                facets = [
+                    {'tag': tag, 'count': count}
+                    for tag, count in cursor.fetchall()
+                ]
+            
+            if cache_seconds:
+                cache.set(cache_key, facets, cache_seconds)
+        
+        return Response({'tags': facets})
+    
+    def _maintained_counts(self, request, limit):
+        user = request.user
+        status_filter = request.query_params.get('status')
+        
+        counts = DocumentTagCount.objects.filter(count__gt=0)
+        own = Document.objects.none()
+        if not user.is_admin():
+            # Everyone sees approved documents; a user's other ones are
+            # theirs alone, so they are counted from their own rows
+            counts = counts.filter(status=DocumentStatus.APPROVED)
+            own = Document.objects.filter(owner=user).exclude(status=DocumentStatus.APPROVED)
         
-        status_filter = self.request.query_params.get('status')
         if status_filter:
-            queryset = queryset.filter(status=status_filter)
-        
-        owner = self.request.query_params.get('owner')
-        if owner:
-            queryset = queryset.filter(owner__username=owner)
-        
-        department = self.request.query_params.get('department')
-        if department:
-            queryset = queryset.filter(department__iexact=department)
-        
-        tags = self.request.query_params.get('tags')
-        if tags:
-            tag_list = [t.strip() for t in tags.split(',')]
-            for tag in tag_list:
-                queryset = queryset.filter(tags__contains=[tag])
-        
-        # Search
-        search = self.request.query_params.get('search')
-        if search:
-            queryset = queryset.filter(
-                Q(title__icontains=search) |
-                Q(description__icontains=search)
-            )
+            counts = counts.filter(status=status_filter)
+            own = own.filter(status=status_filter)
         
-        return queryset.order_by('-created_at')
+        totals = Counter(dict(
+            counts.values('tag').annotate(total=Sum('count')).values_list('tag', 'total')
+        ))
+        for tags in own.values_list('tags', flat=True):
+            if isinstance(tags, list):
+                totals.update(set(tags))
+        
+        ranked = sorted(totals.items(), key=lambda item: (-item[1], item[0]))[:limit]
+        return [{'tag': tag, 'count': count} for tag, count in ranked]
 
 
 class DocumentDetailView(generics.RetrieveUpdateDestroyAPIView):
 
-    queryset = Document.objects.all()
+    queryset = Document.objects.select_related(
+        'owner', 'approved_by'
+    ).prefetch_related('versions')
     serializer_class = DocumentDetailSerializer
     permission_classes = [IsAuthenticated, IsOwnerOrReadOnly]
     
+    def perform_update(self, serializer):
+        document = serializer.save()
+        document.sync_chunk_search_fields()
+    
     def perform_destroy(self, instance):
-
+        
         instance.status = DocumentStatus.ARCHIVED
         instance.save()
+        instance.sync_chunk_search_fields()
         
         # Log 
         AuditService.log_action(
@@ -136,7 +565,9 @@ class DocumentApprovalView(views.APIView):
     
     def post(self, request, pk):
         try:
-            document = Document.objects.get(pk=pk)
+            document = Document.objects.select_related(
+                'owner', 'approved_by'
+            ).get(pk=pk)
         except Document.DoesNotExist:
             return Response(
                 {'error': 'Document not found'},
@@ -163,6 +594,7 @@ class DocumentApprovalView(views.APIView):
                 audit_action = 'DOCUMENT_ARCHIVE'
             
             document.save()
+            document.sync_chunk_search_fields()
             
             AuditService.log_action(
                 user=request.user,
@@ -197,7 +629,7 @@ class DocumentNewVersionView(views.APIView):
             )
         
         # Check permissions
-        if document.owner != request.user and not request.user.is_admin():
+        if document.owner_id != request.user.id and not request.user.is_admin():
             return Response(
                 {'error': 'Permission denied'},
                 status=status.HTTP_403_FORBIDDEN
@@ -211,15 +643,7 @@ class DocumentNewVersionView(views.APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        next_version = document.current_version + 1
-        
-        version = DocumentVersion.objects.create(
-            document=document,
-            version_number=next_version,
-            file=file,
-            file_size=file.size,
-            file_type=file.name.split('.')[-1].lower()
-        )
+        version = document.create_version(file, content_hash=file_sha256(file))
         
         # processing
         process_document_task.delay(version.id)
@@ -237,7 +661,7 @@ class DocumentNewVersionView(views.APIView):
         )
         
         return Response({
-            'message': f'Version {next_version} uploaded successfully. Processing started.',
+            'message': f'Version {version.version_number} uploaded successfully. Processing started.',
             'version': DocumentVersionSerializer(
                 version,
                 context={'request': request}
@@ -251,7 +675,7 @@ class DocumentProcessingStatusView(views.APIView):
     
     def get(self, request, pk):
         try:
-            version = DocumentVersion.objects.get(pk=pk)
+            version = DocumentVersion.objects.select_related('document').get(pk=pk)
         except DocumentVersion.DoesNotExist:
             return Response(
                 {'error': 'Document version not found'},
@@ -0,0 +1,179 @@
+import time
+import logging
+from typing import Callable
+import redis
+import requests
+from django.conf import settings
+
+from apps.core.redis_client import get_redis
+from apps.core.exceptions import CircuitOpenError
+
+logger = logging.getLogger(__name__)
+
+# Count a failure; open the circuit once the threshold is reached, or
+# straight away if the half-open probe failed. Returns the new state.
+RECORD_FAILURE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local failures = redis.call('HINCRBY', KEYS[1], 'failures', 1)
+local state = redis.call('HGET', KEYS[1], 'state') or 'closed'
+
+redis.call('HSET', KEYS[1], 'last_error', ARGV[4], 'last_failure_at', tostring(now))
+
+if state == 'half_open' or (state == 'closed' and failures >= tonumber(ARGV[2])) then
+    redis.call('HSET', KEYS[1], 'state', 'open', 'open_until', tostring(now + tonumber(ARGV[3])))
+    redis.call('HINCRBY', KEYS[1], 'trips', 1)
+    redis.call('DEL', KEYS[2])
+    return 'open'
+end
+return state
+"""
+
+# Let a call through unless the circuit is open. Once the open period is
+# over, exactly one caller (holder of the probe lock) tries half-open.
+ALLOW_SCRIPT = """
+local now = tonumber(ARGV[1])
+local state = redis.call('HGET', KEYS[1], 'state') or 'closed'
+
+if state == 'closed' then
+    return {1, '0'}
+end
+
+local open_until = tonumber(redis.call('HGET', KEYS[1], 'open_until')) or 0
+if state == 'open' and now < open_until then
+    return {0, tostring(open_until - now)}
+end
+
+if redis.call('SET', KEYS[2], '1', 'NX', 'EX', tonumber(ARGV[2])) then
+    redis.call('HSET', KEYS[1], 'state', 'half_open')
+    return {1, '0'}
+end
+return {0, '1'}
+"""
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker for one upstream endpoint, shared by all processes
+    through a Redis hash (state, consecutive failures, trip count).
+    
+    closed -> open after BREAKER_FAILURE_THRESHOLD consecutive failures
+    (timeouts, connection errors, 5xx). While open, calls raise
+    CircuitOpenError immediately instead of tying up a worker for the
+    request timeout. After BREAKER_RESET_SECONDS one probe call is let
+    through (half-open): success closes the circuit, failure re-opens it.
+    
+    If Redis is unreachable the breaker stays out of the way.
+    """
+    
+    def __init__(self, name: str):
+        self.name = name
+        self.failure_threshold = settings.HF_API_CONFIG['BREAKER_FAILURE_THRESHOLD']
+        self.reset_seconds = settings.HF_API_CONFIG['BREAKER_RESET_SECONDS']
+        self.key = f"circuit:{name}"
+        self.probe_key = f"circuit:{name}:probe"
+    
+    def check(self):
+        """Raise CircuitOpenError if calls are currently being rejected."""
+        try:
+            allowed, retry_after = get_redis().eval(
+                ALLOW_SCRIPT, 2, self.key, self.probe_key,
+                time.time(), self.reset_seconds
+            )
+        except redis.RedisError as e:
+            logger.warning(f"Circuit breaker unavailable for {self.name}: {str(e)}")
+            return
+        
+        if not allowed:
+            raise CircuitOpenError(
+                f"Hugging Face {self.name} service is temporarily unavailable.",
+                retry_after=float(retry_after)
+            )
+    
+    def raise_if_open(self):
+        """
+        Cheap read-only check for callers that want to fail fast before
+        doing other work. Doesn't claim the half-open probe.
+        """
+        try:
+            state, open_until = get_redis().hmget(self.key, 'state', 'open_until')
+        except redis.RedisError:
+            return
+        
+        if state == b'open':
+            remaining = float(open_until or 0) - time.time()
+            if remaining > 0:
+                raise CircuitOpenError(
+                    f"Hugging Face {self.name} service is temporarily unavailable.",
+                    retry_after=remaining
+                )
+    
+    def call(self, request: Callable[[], requests.Response]) -> requests.Response:
+        """
+        Run request() through the breaker. Timeouts, connection errors and
+        5xx responses count as failures; anything else as success.
+        """
+        self.check()
+        
+        try:
+            response = request()
+        except requests.exceptions.RequestException as e:
+            self.record_failure(f"{e.__class__.__name__}: {str(e)[:200]}")
+            raise
+        
+        if response.status_code >= 500:
+            self.record_failure(f"HTTP {response.status_code}")
+        else:
+            self.record_success()
+        return response
+    
+    def record_failure(self, error: str):
+        try:
+            state = get_redis().eval(
+                RECORD_FAILURE_SCRIPT, 2, self.key, self.probe_key,
+                time.time(), self.failure_threshold, self.reset_seconds, error
+            )
+        except redis.RedisError:
+            return
+        
+        if state == b'open':
+            logger.error(f"Circuit breaker for HF {self.name} is open: {error}")
+    
+    def record_success(self):
+        try:
+            client = get_redis()
+            state, failures = client.hmget(self.key, 'state', 'failures')
+            # Skip the write in the common all-healthy case
+            if state not in (None, b'closed') or failures not in (None, b'0'):
+                client.hset(self.key, mapping={'state': 'closed', 'failures': 0})
+                client.delete(self.probe_key)
+        except redis.RedisError:
+            pass
+    
+    def state(self) -> dict:
+        data = {k.decode(): v.decode() for k, v in get_redis().hgetall(self.key).items()}
+        open_until = float(data.get('open_until', 0))
+        
+        return {
+            'name': self.name,
+            'state': data.get('state', 'closed'),
+            'consecutive_failures': int(data.get('failures', 0)),
+            'trips': int(data.get('trips', 0)),
+            'open_for_seconds': max(round(open_until - time.time(), 1), 0),
+            'last_error': data.get('last_error', ''),
+            'last_failure_at': float(data['last_failure_at']) if 'last_failure_at' in data else None,
+        }
+    
+    def reset(self):
+        client = get_redis()
+        client.hset(self.key, mapping={'state': 'closed', 'failures': 0})
+        client.delete(self.probe_key)
+
+
+_breakers = {}
+
+
+def get_circuit_breaker(name: str) -> CircuitBreaker:
+    """Per-process breaker for 'embedding' or 'generation'."""
+    if name not in _breakers:
+        _breakers[name] = CircuitBreaker(name)
+    return _breakers[name]
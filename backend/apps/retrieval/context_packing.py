@@ -0,0 +1,221 @@
+import math
+import logging
+from dataclasses import dataclass, field
+from typing import List, Dict
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Rough chars-per-token for English text with Mistral/Llama tokenizers.
+# Slightly low on purpose so estimates err on the large side.
+CHARS_PER_TOKEN = 3.5
+
+# Shorter suffix/prefix matches are likely coincidence, not chunk overlap
+MIN_OVERLAP_CHARS = 8
+
+
+def estimate_tokens(text: str) -> int:
+    if not text:
+        return 0
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+@dataclass
+class Passage:
+    document_title: str
+    version_number: int
+    text: str
+    score: float
+    chunk_indexes: List[int] = field(default_factory=list)
+    # Ranks (1-based, see PackedContext.included) of the hits it holds
+    sources: List[int] = field(default_factory=list)
+    
+    @property
+    def label(self) -> str:
+        ranks = ', '.join(str(rank) for rank in self.sources)
+        return f"[Source {ranks}: {self.document_title}]"
+
+
+@dataclass
+class PackedContext:
+    passages: List[Passage]
+    text: str
+    tokens: int
+    budget: int
+    # The chunk dicts that made it into the prompt (hits, then neighbours)
+    chunks: List[Dict] = field(default_factory=list)
+    
+    def included(self, search_results: List[Dict]) -> List[Dict]:
+        """
+        The search results that made it into the prompt, in their order.
+        Numbered from 1, these are the source numbers the prompt cites.
+        """
+        packed = {id(chunk) for chunk in self.chunks}
+        return [result for result in search_results if id(result) in packed]
+
+
+class ContextPacker:
+    """
+    Fits retrieved chunks into a fixed token budget.
+    
+    The budget is the model context window minus the tokens reserved for
+    the answer (MAX_TOKENS_PER_QUERY) and the prompt scaffolding, capped at
+    LLM_CONFIG['MAX_CONTEXT_TOKENS'] so prompt size stays predictable.
+    
+    Chunks are taken greedily by similarity score; anything that doesn't
+    fit is skipped in favour of smaller, lower-scoring chunks. Neighbour
+    chunks attached by VectorSearchService.expand_neighbors() are added
+    afterwards, closest first, while budget remains. Chunks with
+    consecutive chunk_index in the same version are merged into one
+    passage and the overlap between them (CHUNK_OVERLAP) is cut out.
+    
+    Passages are labelled with the rank of the hits they hold, i.e. the
+    position of the hit in the input list among those that fit, so a
+    "Source 2" citation matches the second returned source.
+    """
+    
+    def __init__(self, max_answer_tokens: int = None):
+        if max_answer_tokens is None:
+            max_answer_tokens = settings.RATE_LIMIT_CONFIG['MAX_TOKENS_PER_QUERY']
+        
+        self.context_window = settings.LLM_CONFIG['CONTEXT_WINDOW']
+        self.max_context_tokens = settings.LLM_CONFIG['MAX_CONTEXT_TOKENS']
+        self.max_answer_tokens = max_answer_tokens
+        self.chunk_overlap = settings.DOCUMENT_CONFIG['CHUNK_OVERLAP']
+    
+    def budget(self, prompt_overhead: str = "") -> int:
+        available = (
+            self.context_window
+            - self.max_answer_tokens
+            - estimate_tokens(prompt_overhead)
+        )
+        return max(0, min(available, self.max_context_tokens))
+    
+    def pack(self, context_chunks: List[Dict], prompt_overhead: str = "") -> PackedContext:
+        budget = self.budget(prompt_overhead)
+        ranked = sorted(
+            context_chunks,
+            key=lambda c: c.get('similarity_score', 0),
+            reverse=True
+        )
+        
+        selected = []
+        seen = set()
+        used = 0
+        
+        # Neighbours are cited as the hit they were attached to
+        owners = {}
+        
+        def take(chunk, owner):
+            nonlocal used
+            key = (self._version_key(chunk), chunk.get('chunk_index'))
+            if key in seen:
+                return
+            cost = estimate_tokens(chunk.get('text', '')) + estimate_tokens(self._header(chunk))
+            if used + cost > budget:
+                return
+            seen.add(key)
+            selected.append(chunk)
+            owners[id(chunk)] = owner
+            used += cost
+        
+        for chunk in ranked:
+            take(chunk, chunk)
+        
+        # Neighbour chunks only extend hits that made it in, with whatever
+        # budget the hits left over
+        hits_taken = len(selected)
+        for chunk in selected[:hits_taken]:
+            for neighbor in chunk.get('neighbors', []):
+                take(neighbor, chunk)
+        
+        hit_ids = {id(chunk) for chunk in selected[:hits_taken]}
+        ranks = {
+            id(chunk): rank
+            for rank, chunk in enumerate(
+                (chunk for chunk in context_chunks if id(chunk) in hit_ids), 1
+            )
+        }
+        source_ranks = {id(chunk): ranks[id(owners[id(chunk)])] for chunk in selected}
+        
+        passages = self._merge_adjacent(selected, source_ranks)
+        text = "\n".join(
+            f"\n{passage.label}\n{passage.text}"
+            for passage in passages
+        )
+        tokens = estimate_tokens(text)
+        
+        if hits_taken < len(ranked):
+            logger.info(
+                f"Context packing dropped {len(ranked) - hits_taken} of "
+                f"{len(ranked)} chunks to fit {budget} tokens"
+            )
+        
+        return PackedContext(
+            passages=passages,
+            text=text,
+            tokens=tokens,
+            budget=budget,
+            chunks=selected
+        )
+    
+    def _merge_adjacent(self, chunks: List[Dict], source_ranks: Dict[int, int]) -> List[Passage]:
+        # Group by version, then walk each group in chunk_index order
+        groups = {}
+        for chunk in chunks:
+            groups.setdefault(self._version_key(chunk), []).append(chunk)
+        
+        passages = []
+        for group in groups.values():
+            group.sort(key=lambda c: c.get('chunk_index', 0))
+            
+            current = None
+            previous_index = None
+            for chunk in group:
+                index = chunk.get('chunk_index', 0)
+                text = chunk.get('text', '')
+                score = chunk.get('similarity_score', 0)
+                
+                if current is not None and index == previous_index + 1:
+                    current.text = self._join(current.text, text)
+                    current.score = max(current.score, score)
+                    current.chunk_indexes.append(index)
+                else:
+                    current = Passage(
+                        document_title=chunk.get('document_title', 'Unknown'),
+                        version_number=chunk.get('version_number'),
+                        text=text,
+                        score=score,
+                        chunk_indexes=[index]
+                    )
+                    passages.append(current)
+                
+                rank = source_ranks[id(chunk)]
+                if rank not in current.sources:
+                    current.sources.append(rank)
+                previous_index = index
+        
+        for passage in passages:
+            passage.sources.sort()
+        
+        # Best passages first, as the model weighs early context more
+        passages.sort(key=lambda p: p.score, reverse=True)
+        return passages
+    
+    def _join(self, left: str, right: str) -> str:
+        # Chunks overlap by up to CHUNK_OVERLAP chars (less after strip()),
+        # so drop the longest prefix of right that left already ends with
+        limit = min(len(left), len(right), self.chunk_overlap * 2)
+        for size in range(limit, MIN_OVERLAP_CHARS - 1, -1):
+            if left.endswith(right[:size]):
+                return left + right[size:]
+        return f"{left} {right}"
+    
+    def _version_key(self, chunk: Dict):
+        chunk_obj = chunk.get('chunk')
+        if chunk_obj is not None:
+            return chunk_obj.version_id
+        return (chunk.get('document_title'), chunk.get('version_number'))
+    
+    def _header(self, chunk: Dict) -> str:
+        return f"\n[Source 0: {chunk.get('document_title', 'Unknown')}]\n"
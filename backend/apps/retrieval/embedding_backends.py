@@ -0,0 +1,197 @@
+"""
+Embedding backends.
+
+An embedding backend turns text into fixed-size vectors for chunks and
+queries. Ingestion (generate_embeddings_task) and VectorSearchService only
+use the small interface below, so the model can run remotely or in-process:
+
+- generate_embeddings(texts): one vector per text, in input order
+- model / dimension: which model produced the vectors, and their size
+
+Backends are selected with LLM_CONFIG['EMBEDDING_BACKEND']: 'huggingface'
+(default, HF router API), 'onnx' (bge-base on the local CPU through ONNX
+Runtime), or a dotted path to a BaseEmbeddingBackend subclass.
+
+Vectors from different backends are only comparable if they run the same
+model with the same pooling. Run `manage.py benchmark_embeddings` to compare
+throughput and check agreement before switching, and re-embed documents if
+the model changes.
+"""
+
+import time
+import logging
+import threading
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import List
+import numpy as np
+from django.conf import settings
+
+from apps.core.exceptions import EmbeddingGenerationError
+
+logger = logging.getLogger(__name__)
+
+
+class BaseEmbeddingBackend(ABC):
+
+    provider = 'base'
+    model = ''
+    dimension = settings.LLM_CONFIG['EMBEDDING_DIMENSION']
+    
+    @abstractmethod
+    def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
+        ...
+
+
+# One (session, tokenizer) per model file and thread count per process.
+# Loading bge-base takes seconds and ~400MB, so it's never done per request.
+_loaded_models = {}
+_load_lock = threading.Lock()
+
+
+def _load_onnx_model(model_dir: Path, model_file: str, threads: int, max_length: int):
+    key = (str(model_dir), model_file, threads, max_length)
+    if key in _loaded_models:
+        return _loaded_models[key]
+    
+    with _load_lock:
+        if key in _loaded_models:
+            return _loaded_models[key]
+        
+        try:
+            import onnxruntime
+            from tokenizers import Tokenizer
+        except ImportError as e:
+            raise EmbeddingGenerationError(
+                f"The onnx embedding backend needs onnxruntime and tokenizers installed: {str(e)}"
+            )
+        
+        model_path = model_dir / model_file
+        tokenizer_path = model_dir / 'tokenizer.json'
+        for path in (model_path, tokenizer_path):
+            if not path.exists():
+                raise EmbeddingGenerationError(f"ONNX embedding model file not found: {path}")
+        
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        # Parallelism comes from intra-op threads; one request at a time per
+        # session keeps web/Celery workers from oversubscribing the CPU
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        options.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+        
+        started = time.perf_counter()
+        session = onnxruntime.InferenceSession(
+            str(model_path),
+            sess_options=options,
+            providers=['CPUExecutionProvider']
+        )
+        
+        tokenizer = Tokenizer.from_file(str(tokenizer_path))
+        tokenizer.enable_truncation(max_length=max_length)
+        tokenizer.no_padding()
+        
+        logger.info(
+            f"Loaded ONNX embedding model {model_path} "
+            f"({threads or 'default'} threads) in {time.perf_counter() - started:.1f}s"
+        )
+        
+        _loaded_models[key] = (session, tokenizer)
+        return _loaded_models[key]
+
+
+class OnnxEmbeddingBackend(BaseEmbeddingBackend):
+    """
+    Runs LLM_CONFIG['EMBEDDING_MODEL'] (bge-base-en-v1.5) exported to ONNX
+    on the local CPU. Same pooling as the HF feature-extraction pipeline
+    for bge (CLS token, L2-normalized), so vectors match the stored ones.
+    
+    ONNX_MODEL_DIR must hold tokenizer.json and ONNX_MODEL_FILE, e.g.
+    model.onnx (fp32) or model_quantized.onnx (int8, ~4x smaller and faster,
+    slightly lower agreement).
+    
+    Texts are sorted by token length and packed into batches of at most
+    ONNX_BATCH_SIZE texts and ONNX_MAX_BATCH_TOKENS padded tokens, so short
+    queries never pay for padding up to a long chunk.
+    """
+    
+    provider = 'onnx'
+    
+    def __init__(self, threads: int = None, batch_size: int = None):
+        config = settings.LLM_CONFIG
+        self.model = config['EMBEDDING_MODEL']
+        self.model_dir = Path(config['ONNX_MODEL_DIR'])
+        self.model_file = config['ONNX_MODEL_FILE']
+        self.threads = config['ONNX_THREADS'] if threads is None else threads
+        self.batch_size = batch_size or config['ONNX_BATCH_SIZE']
+        self.max_batch_tokens = config['ONNX_MAX_BATCH_TOKENS']
+        self.max_length = config['EMBEDDING_MAX_LENGTH']
+        
+        self.session, self.tokenizer = _load_onnx_model(
+            self.model_dir, self.model_file, self.threads, self.max_length
+        )
+        self.input_names = {node.name for node in self.session.get_inputs()}
+    
+    def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        
+        try:
+            encodings = self.tokenizer.encode_batch(texts)
+            embeddings = np.empty((len(texts), self.dimension), dtype=np.float32)
+            
+            for batch in self._batches([len(encoding.ids) for encoding in encodings]):
+                embeddings[batch] = self._run([encodings[i] for i in batch])
+            
+            return embeddings.tolist()
+        
+        except EmbeddingGenerationError:
+            raise
+        
+        except Exception as e:
+            logger.error(f"ONNX embedding generation failed: {str(e)}")
+            raise EmbeddingGenerationError(f"Failed to generate embeddings: {str(e)}")
+    
+    def _batches(self, lengths: List[int]) -> List[List[int]]:
+        """Group text positions by similar length under both batch limits."""
+        batches = []
+        batch = []
+        
+        for i in np.argsort(lengths, kind='stable'):
+            # Sorted ascending, so the newest text is the longest in the batch
+            padded = (len(batch) + 1) * lengths[i]
+            if batch and (len(batch) >= self.batch_size or padded > self.max_batch_tokens):
+                batches.append(batch)
+                batch = []
+            batch.append(int(i))
+        
+        if batch:
+            batches.append(batch)
+        return batches
+    
+    def _run(self, encodings) -> np.ndarray:
+        width = max(len(encoding.ids) for encoding in encodings)
+        input_ids = np.zeros((len(encodings), width), dtype=np.int64)
+        attention_mask = np.zeros((len(encodings), width), dtype=np.int64)
+        
+        for row, encoding in enumerate(encodings):
+            input_ids[row, :len(encoding.ids)] = encoding.ids
+            attention_mask[row, :len(encoding.ids)] = 1
+        
+        inputs = {'input_ids': input_ids, 'attention_mask': attention_mask}
+        if 'token_type_ids' in self.input_names:
+            inputs['token_type_ids'] = np.zeros_like(input_ids)
+        
+        output = self.session.run(None, inputs)[0]
+        
+        # last_hidden_state -> CLS token; pooled exports are used as-is
+        if output.ndim == 3:
+            output = output[:, 0]
+        
+        if output.shape[1] != self.dimension:
+            raise EmbeddingGenerationError(
+                f"ONNX model returned {output.shape[1]}-dim embeddings, expected {self.dimension}"
+            )
+        
+        norms = np.linalg.norm(output, axis=1, keepdims=True)
+        return output / np.maximum(norms, 1e-12)
@@ -0,0 +1,64 @@
+import time
+import tracemalloc
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.documents.models import DocumentChunk
+from apps.documents.serializers import DocumentChunkSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure load + serialization time and peak Python memory for pages "
+        "of DocumentChunkSerializer output, loading chunks with embeddings, "
+        "with the default deferred embedding, and with for_display()."
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--page-size', type=int, default=100,
+                            help="Chunks per serialized page")
+        parser.add_argument('--pages', type=int, default=20,
+                            help="Pages measured per strategy")
+    
+    def handle(self, *args, **options):
+        page_size = options['page_size']
+        ids = list(
+            DocumentChunk.objects.order_by('id')
+            .values_list('id', flat=True)[:page_size * options['pages']]
+        )
+        if not ids:
+            raise CommandError("No chunks to serialize; upload and process a document first")
+        
+        pages = [ids[i:i + page_size] for i in range(0, len(ids), page_size)]
+        self.stdout.write(f"{len(ids)} chunks in {len(pages)} pages of up to {page_size}")
+        
+        strategies = [
+            ('with embeddings', lambda: DocumentChunk.objects.with_embeddings()),
+            ('deferred (default)', lambda: DocumentChunk.objects.all()),
+            ('for_display()', lambda: DocumentChunk.objects.for_display()),
+        ]
+        
+        for label, queryset in strategies:
+            # Warm-up, so connection setup and serializer field binding
+            # aren't measured
+            self._serialize(queryset(), pages[0])
+            
+            timings = []
+            peaks = []
+            for page in pages:
+                tracemalloc.start()
+                started = time.perf_counter()
+                self._serialize(queryset(), page)
+                timings.append(time.perf_counter() - started)
+                peaks.append(tracemalloc.get_traced_memory()[1])
+                tracemalloc.stop()
+            
+            self.stdout.write(
+                f"  {label:<20} p50={np.percentile(timings, 50) * 1000:.1f}ms "
+                f"p99={np.percentile(timings, 99) * 1000:.1f}ms "
+                f"peak memory={np.mean(peaks) / 1024:,.0f} KiB/page"
+            )
+    
+    def _serialize(self, queryset, page):
+        chunks = list(queryset.filter(id__in=page).order_by('id'))
+        return DocumentChunkSerializer(chunks, many=True).data
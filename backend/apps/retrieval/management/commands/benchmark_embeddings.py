@@ -0,0 +1,171 @@
+import time
+import random
+import threading
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core.exceptions import EmbeddingGenerationError
+from apps.retrieval.embedding_backends import OnnxEmbeddingBackend
+from apps.retrieval.micro_batching import MicroBatcher
+from apps.retrieval.services import get_embedding_service
+
+WORDS = (
+    "policy employee leave request approval manager department budget report "
+    "quarterly review security access password incident customer contract "
+    "payment invoice travel expense reimbursement training onboarding system "
+    "process deadline compliance audit retention data privacy office remote"
+).split()
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure embedding throughput (chunk ingestion) and single-query "
+        "latency for one or more embedding backends, and how closely their "
+        "vectors agree with the first backend. With --concurrency, also "
+        "compare query QPS and p99 under load with and without micro-batching."
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--backend', action='append', dest='backends',
+                            help="huggingface, onnx or a dotted path (repeatable)")
+        parser.add_argument('--texts', type=int, default=256,
+                            help="Chunk-sized texts embedded for the throughput run")
+        parser.add_argument('--queries', type=int, default=50,
+                            help="Single short texts embedded one at a time for latency")
+        parser.add_argument('--threads', type=int, action='append',
+                            help="ONNX intra-op thread counts to compare (repeatable)")
+        parser.add_argument('--batch-size', type=int)
+        parser.add_argument('--concurrency', type=int, default=0,
+                            help="Also load-test single-query embedding from this many threads, "
+                                 "with and without micro-batching")
+        parser.add_argument('--duration', type=float, default=10,
+                            help="Seconds per load-test run")
+        parser.add_argument('--seed', type=int, default=42)
+    
+    def handle(self, *args, **options):
+        backends = options['backends'] or [settings.LLM_CONFIG['EMBEDDING_BACKEND']]
+        rng = random.Random(options['seed'])
+        chunk_words = settings.DOCUMENT_CONFIG['CHUNK_SIZE'] // 6
+        
+        self.texts = [
+            " ".join(rng.choice(WORDS) for _ in range(rng.randint(chunk_words // 4, chunk_words)))
+            for _ in range(options['texts'])
+        ]
+        self.queries = [
+            " ".join(rng.choice(WORDS) for _ in range(rng.randint(4, 16)))
+            for _ in range(options['queries'])
+        ]
+        
+        reference = None
+        for backend in backends:
+            for label, service in self._services(backend, options):
+                self.stdout.write(self.style.MIGRATE_HEADING(f"\n== {label} =="))
+                try:
+                    vectors = self._benchmark(service)
+                except EmbeddingGenerationError as e:
+                    self.stdout.write(self.style.ERROR(f"  failed: {str(e)}"))
+                    continue
+                
+                if options['concurrency']:
+                    for batched in (False, True):
+                        self._load_test(service, batched, options['concurrency'], options['duration'])
+                
+                if reference is None:
+                    reference = vectors
+                else:
+                    # Stored vectors are only comparable if this is ~1.0
+                    agreement = np.sum(reference * vectors, axis=1)
+                    self.stdout.write(
+                        f"  cosine vs first backend: mean={agreement.mean():.4f} "
+                        f"min={agreement.min():.4f}"
+                    )
+    
+    def _services(self, backend, options):
+        if backend != 'onnx':
+            yield backend, get_embedding_service(backend)
+            return
+        
+        for threads in options['threads'] or [None]:
+            try:
+                service = OnnxEmbeddingBackend(threads=threads, batch_size=options['batch_size'])
+            except EmbeddingGenerationError as e:
+                raise CommandError(str(e))
+            yield f"onnx ({service.model_file}, {service.threads or 'all'} threads)", service
+    
+    def _benchmark(self, service) -> np.ndarray:
+        # Warm-up, so one-off model loading isn't measured
+        service.generate_embeddings(self.queries[:1])
+        
+        started = time.perf_counter()
+        vectors = np.asarray(service.generate_embeddings(self.texts), dtype=np.float32)
+        elapsed = time.perf_counter() - started
+        
+        latencies = []
+        for query in self.queries:
+            started = time.perf_counter()
+            service.generate_embeddings([query])
+            latencies.append(time.perf_counter() - started)
+        
+        self.stdout.write(
+            f"  ingest: {len(self.texts) / elapsed:,.1f} texts/s "
+            f"({len(self.texts)} texts in {elapsed:.2f}s)"
+        )
+        if latencies:
+            self.stdout.write(
+                f"  query: p50={np.percentile(latencies, 50) * 1000:.1f}ms "
+                f"p99={np.percentile(latencies, 99) * 1000:.1f}ms"
+            )
+        
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+    
+    def _load_test(self, service, batched: bool, concurrency: int, duration: float):
+        """Closed loop: each thread embeds one query at a time, back to back."""
+        config = settings.LLM_CONFIG
+        batcher = MicroBatcher(
+            service.generate_embeddings,
+            max_batch_size=config['QUERY_BATCH_MAX_SIZE'],
+            max_wait_ms=config['QUERY_BATCH_MAX_WAIT_MS'],
+            timeout=config['QUERY_BATCH_TIMEOUT'],
+            name='benchmark'
+        )
+        embed = batcher.embed if batched else lambda text: service.generate_embeddings([text])[0]
+        
+        latencies = [[] for _ in range(concurrency)]
+        errors = []
+        stop_at = time.perf_counter() + duration
+        
+        def worker(index):
+            rng = random.Random(index)
+            while time.perf_counter() < stop_at:
+                started = time.perf_counter()
+                try:
+                    embed(rng.choice(self.queries))
+                except EmbeddingGenerationError as e:
+                    errors.append(e)
+                    continue
+                latencies[index].append(time.perf_counter() - started)
+        
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        
+        done = [latency for per_thread in latencies for latency in per_thread]
+        if not done:
+            self.stdout.write(self.style.ERROR(f"  load: no query completed ({len(errors)} errors)"))
+            return
+        
+        calls = batcher.stats()['batches'] if batched else len(done)
+        self.stdout.write(
+            f"  load x{concurrency} {'batched' if batched else 'unbatched':<9} "
+            f"QPS={len(done) / elapsed:,.1f} "
+            f"p50={np.percentile(done, 50) * 1000:.1f}ms "
+            f"p99={np.percentile(done, 99) * 1000:.1f}ms "
+            f"upstream calls={calls:,} "
+            f"({len(done) / max(calls, 1):.1f} queries/call) errors={len(errors)}"
+        )
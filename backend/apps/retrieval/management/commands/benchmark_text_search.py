@@ -0,0 +1,114 @@
+import time
+import random
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from apps.core.models import User
+from apps.core.search import trigram_search
+from apps.retrieval.models import Query
+
+WORDS = (
+    "policy employee leave request approval manager department budget report "
+    "quarterly review security access password incident customer contract "
+    "payment invoice travel expense reimbursement training onboarding system "
+    "process deadline compliance audit retention data privacy office remote"
+).split()
+
+# Appears in roughly one row in a thousand, for a selective search
+RARE_WORD = 'sabbatical'
+
+GENERATE_QUERIES_SQL = """
+INSERT INTO queries (
+    user_id, question, answer, context_used, context_tokens, tokens_used,
+    response_time_ms, was_successful, num_chunks_retrieved,
+    avg_similarity_score, created_at
+)
+SELECT
+    users.ids[1 + (n %% array_length(users.ids, 1))],
+    (SELECT string_agg((%(words)s::text[])[1 + floor(random() * %(num_words)s)::int], ' ')
+     FROM generate_series(1, 6 + (n %% 10)))
+        || CASE WHEN random() < 0.001 THEN ' ' || %(rare)s ELSE '' END,
+    (SELECT string_agg((%(words)s::text[])[1 + floor(random() * %(num_words)s)::int], ' ')
+     FROM generate_series(1, 30 + (n %% 40))),
+    '', 0, 0, 0, true, 0, 0, now() - n * interval '1 second'
+FROM generate_series(1, %(rows)s) AS n,
+     (SELECT %(user_ids)s::int[] AS ids) AS users
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare query history search (trigram_search) with and without the "
+        "trigram indexes on a synthetic queries table. All rows are rolled back."
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000,
+                            help="Synthetic Query rows to insert")
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--searches', type=int, default=20,
+                            help="Timed searches per term and mode")
+        parser.add_argument('--seed', type=int, default=42)
+    
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        
+        with transaction.atomic():
+            users = User.objects.bulk_create([
+                User(username=f'text-search-benchmark-{i}')
+                for i in range(options['users'])
+            ])
+            
+            started = time.perf_counter()
+            with connection.cursor() as cursor:
+                cursor.execute(GENERATE_QUERIES_SQL, {
+                    'words': WORDS,
+                    'num_words': len(WORDS),
+                    'rare': RARE_WORD,
+                    'rows': options['rows'],
+                    'user_ids': [user.id for user in users],
+                })
+                cursor.execute("ANALYZE queries")
+            self.stdout.write(
+                f"inserted {options['rows']:,} queries in {time.perf_counter() - started:.1f}s"
+            )
+            
+            terms = [RARE_WORD, f'{rng.choice(WORDS)} {rng.choice(WORDS)}', rng.choice(WORDS)]
+            scopes = [
+                ('one user', Query.objects.filter(user=users[0])),
+                ('all users', Query.objects.all()),
+            ]
+            
+            for scope, queryset in scopes:
+                self.stdout.write(self.style.MIGRATE_HEADING(f"\n== {scope} =="))
+                for term in terms:
+                    for indexed in (True, False):
+                        self._benchmark(queryset, term, indexed, options['searches'])
+            
+            transaction.set_rollback(True)
+    
+    def _benchmark(self, queryset, term: str, indexed: bool, searches: int):
+        # Same queries as QueryHistoryView: a count and the first page
+        results = trigram_search(queryset, term, ['question', 'answer'])
+        page = results.order_by('-search_rank', '-created_at')[:20]
+        
+        # GIN indexes are only used through bitmap scans. SET LOCAL lasts
+        # until the outer (rolled back) transaction ends
+        with connection.cursor() as cursor:
+            cursor.execute(f"SET LOCAL enable_bitmapscan = {'on' if indexed else 'off'}")
+        
+        plan = page.explain()
+        timings = []
+        for _ in range(searches):
+            started = time.perf_counter()
+            count = results.count()
+            list(page)
+            timings.append(time.perf_counter() - started)
+        
+        self.stdout.write(
+            f"  {term!r:<28} {'trigram index' if indexed else 'scan':<13} "
+            f"matches={count:,} p50={np.percentile(timings, 50) * 1000:.1f}ms "
+            f"p99={np.percentile(timings, 99) * 1000:.1f}ms "
+            f"index used={'_trgm_idx' in plan}"
+        )
@@ -0,0 +1,249 @@
+import time
+import resource
+import tempfile
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.core.models import User
+from apps.documents.models import (
+    Document,
+    DocumentVersion,
+    DocumentChunk,
+    DocumentStatus,
+    ProcessingStatus
+)
+from apps.retrieval.numpy_index import NumpyVectorIndex
+from apps.retrieval.vector_stores import (
+    InMemoryVectorStore,
+    NumpyVectorStore,
+    get_vector_store
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the vector store conformance checks and report recall@k, QPS "
+        "and memory on a synthetic corpus. All rows are rolled back."
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--backend', action='append', dest='backends',
+                            help="pgvector, numpy, memory or a dotted path (repeatable)")
+        parser.add_argument('--chunks', type=int, default=20000)
+        parser.add_argument('--documents', type=int, default=200)
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--top-k', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=42)
+    
+    def handle(self, *args, **options):
+        backends = options['backends'] or ['pgvector', 'numpy', 'memory']
+        self.dimension = settings.LLM_CONFIG['EMBEDDING_DIMENSION']
+        self.top_k = options['top_k']
+        rng = np.random.default_rng(options['seed'])
+        
+        # Clustered vectors, closer to real embeddings than uniform noise
+        num_clusters = max(options['chunks'] // 200, 1)
+        centers = rng.standard_normal((num_clusters, self.dimension)).astype(np.float32)
+        assignment = rng.integers(0, num_clusters, options['chunks'])
+        self.vectors = centers[assignment] + 0.3 * rng.standard_normal(
+            (options['chunks'], self.dimension)
+        ).astype(np.float32)
+        
+        picked = rng.integers(0, options['chunks'], options['queries'])
+        self.queries = self.vectors[picked] + 0.2 * rng.standard_normal(
+            (options['queries'], self.dimension)
+        ).astype(np.float32)
+        
+        # Skewed departments so selective filters get exercised
+        self.departments = rng.choice(
+            ['large', 'medium', 'small'],
+            size=options['documents'],
+            p=[0.89, 0.10, 0.01]
+        )
+        self.departments[0] = 'small'
+        self.num_documents = options['documents']
+        
+        for backend in backends:
+            with transaction.atomic():
+                self._run_backend(backend)
+                transaction.set_rollback(True)
+    
+    def _run_backend(self, backend: str):
+        self.stdout.write(self.style.MIGRATE_HEADING(f"\n== {backend} =="))
+        
+        index_dir = None
+        if backend == 'numpy':
+            # Throwaway index directory, refreshed synchronously
+            index_dir = tempfile.TemporaryDirectory()
+            store = NumpyVectorStore(index=NumpyVectorIndex(index_dir.name), refresh_async=False)
+        elif backend == 'memory':
+            # Reference implementation, only ever built here
+            store = InMemoryVectorStore()
+        else:
+            store = get_vector_store(backend)
+        
+        if hasattr(store, 'count_cache_seconds'):
+            # Keep synthetic counts out of the shared cache
+            store.count_cache_seconds = 0
+        
+        try:
+            versions = self._create_versions()
+            rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            
+            started = time.perf_counter()
+            chunks = self._ingest(store, versions)
+            ingest_seconds = time.perf_counter() - started
+            
+            keys = {chunk.id: row for row, chunk in enumerate(chunks)}
+            self._check_conformance(store, versions, chunks, keys)
+            
+            for department in [None, 'large', 'small']:
+                self._benchmark(store, keys, department)
+            
+            self.stdout.write(f"ingest: {len(chunks) / ingest_seconds:,.0f} chunks/s")
+            rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            self.stdout.write(f"peak RSS growth: {(rss_after - rss_before) / 1024:,.1f} MB")
+            self.stdout.write(f"stats: {store.stats()}")
+        finally:
+            if index_dir:
+                index_dir.cleanup()
+    
+    def _create_versions(self):
+        owner = User.objects.create(username='vector-benchmark')
+        documents = Document.objects.bulk_create([
+            Document(
+                title=f"Benchmark document {i}",
+                owner=owner,
+                status=DocumentStatus.APPROVED,
+                department=self.departments[i],
+                latest_version_number=1
+            )
+            for i in range(self.num_documents)
+        ])
+        return DocumentVersion.objects.bulk_create([
+            DocumentVersion(
+                document=document,
+                version_number=1,
+                file='benchmark.txt',
+                file_size=0,
+                file_type='txt',
+                processing_status=ProcessingStatus.READY
+            )
+            for document in documents
+        ])
+    
+    def _ingest(self, store, versions):
+        # Same path as save_chunks_to_db: upsert per version, then publish
+        per_version = np.array_split(np.arange(len(self.vectors)), len(versions))
+        self.row_departments = np.empty(len(self.vectors), dtype=object)
+        chunks = []
+        
+        for version, rows in zip(versions, per_version):
+            document = version.document
+            version_chunks = [
+                DocumentChunk(
+                    version=version,
+                    chunk_index=i,
+                    text=f"chunk {row}",
+                    embedding=self.vectors[row],
+                    metadata={},
+                    document_status=document.status,
+                    document_title=document.title,
+                    department=document.department,
+                    version_number=1,
+                    is_current=False
+                )
+                for i, row in enumerate(rows)
+            ]
+            self.row_departments[rows] = document.department
+            chunks.extend(store.upsert(version_chunks))
+            
+            store.update_document(
+                document.id,
+                status=document.status,
+                title=document.title,
+                department=document.department,
+                current_version_id=version.id
+            )
+        
+        return chunks
+    
+    def _check_conformance(self, store, versions, chunks, keys):
+        checks = []
+        
+        results = store.search(self.queries[0], self.top_k)
+        scores = [score for _, score in results]
+        checks.append(("returns top_k results", len(results) == self.top_k))
+        checks.append(("results sorted by similarity", scores == sorted(scores, reverse=True)))
+        checks.append(("ids map to upserted chunks", all(chunk_id in keys for chunk_id, _ in results)))
+        
+        row = 0
+        top = store.search(self.vectors[row], 1)
+        checks.append(("stored vector is its own nearest neighbour", bool(top) and keys.get(top[0][0]) == row))
+        
+        small = store.search(self.queries[0], self.top_k, department='small')
+        checks.append(("department filter respected", all(
+            self.row_departments[keys[chunk_id]] == 'small' for chunk_id, _ in small
+        ) and len(small) > 0))
+        checks.append(("unknown department returns nothing", store.search(self.queries[0], 5, department='nope') == []))
+        
+        version = versions[0]
+        document = version.document
+        store.update_document(document.id, DocumentStatus.ARCHIVED, document.title, document.department, version.id)
+        hidden = store.search(self.vectors[row], self.top_k, department=document.department)
+        checks.append(("archived documents are hidden", all(
+            keys[chunk_id] != row for chunk_id, _ in hidden
+        )))
+        store.update_document(document.id, DocumentStatus.APPROVED, document.title, document.department, version.id)
+        top = store.search(self.vectors[row], 1)
+        checks.append(("re-approved documents come back", bool(top) and keys.get(top[0][0]) == row))
+        
+        last = versions[-1]
+        store.delete_version(last.id)
+        last_row = len(self.vectors) - 1
+        store.update_document(last.document.id, DocumentStatus.APPROVED, last.document.title, last.document.department, None)
+        gone = store.search(self.vectors[last_row], self.top_k)
+        checks.append(("deleted versions are not returned", all(
+            keys.get(chunk_id) != last_row for chunk_id, _ in gone
+        )))
+        self.deleted_rows = {keys[chunk.id] for chunk in chunks if chunk.version_id == last.id}
+        
+        for name, passed in checks:
+            style = self.style.SUCCESS if passed else self.style.ERROR
+            self.stdout.write(style(f"  [{'PASS' if passed else 'FAIL'}] {name}"))
+    
+    def _benchmark(self, store, keys, department):
+        # Exact ground truth over the live rows
+        live = np.ones(len(self.vectors), dtype=bool)
+        live[list(self.deleted_rows)] = False
+        if department:
+            live &= self.row_departments == department
+        
+        normalized = self.vectors / np.linalg.norm(self.vectors, axis=1, keepdims=True)
+        candidates = np.flatnonzero(live)
+        
+        query_norms = self.queries / np.linalg.norm(self.queries, axis=1, keepdims=True)
+        scores = query_norms @ normalized[candidates].T
+        expected = [set(candidates[np.argsort(-row)[:self.top_k]]) for row in scores]
+        
+        all_results = []
+        latencies = []
+        for query in self.queries:
+            started = time.perf_counter()
+            all_results.append(store.search(query, self.top_k, department=department))
+            latencies.append(time.perf_counter() - started)
+        
+        recalls = [
+            len({keys[chunk_id] for chunk_id, _ in results} & truth) / max(len(truth), 1)
+            for results, truth in zip(all_results, expected)
+        ]
+        
+        self.stdout.write(
+            f"  filter={department or '-':<7} rows={len(candidates):>7,} "
+            f"recall@{self.top_k}={np.mean(recalls):.3f} "
+            f"QPS={len(latencies) / sum(latencies):,.1f} "
+            f"p50={np.percentile(latencies, 50) * 1000:.2f}ms "
+            f"p99={np.percentile(latencies, 99) * 1000:.2f}ms"
+        )
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from apps.retrieval.numpy_index import NumpyVectorIndex
+
+
+class Command(BaseCommand):
+    help = "Rebuild the in-process numpy vector index from DocumentChunk"
+    
+    def handle(self, *args, **options):
+        index = NumpyVectorIndex()
+        count = index.rebuild()
+        
+        stats = index.stats()
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {count} chunks into {index.index_dir} "
+            f"({stats['bytes'] / 1024 / 1024:.1f} MB)"
+        ))
@@ -0,0 +1,164 @@
+import os
+import time
+import queue
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from typing import Callable, List
+from django.conf import settings
+
+from apps.core.exceptions import EmbeddingGenerationError
+from .services import get_embedding_service
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """
+    Collects single-text embedding requests from concurrent threads (or
+    asyncio tasks) in one process and sends them upstream as one batch.
+    
+    A dispatcher thread takes the first waiting request, keeps collecting
+    for up to max_wait_ms or until max_batch_size texts, then makes one
+    embed_fn() call and hands each caller its vector. While a batch is in
+    flight new requests queue up, so under load batches fill without
+    waiting the full window; a lone request waits at most max_wait_ms.
+    
+    Errors from embed_fn() (or a wrong number of vectors back) are raised
+    in every caller of that batch, and embed() gives up after `timeout`
+    seconds, so a caller never waits on a future nobody will resolve.
+    """
+    
+    def __init__(
+        self,
+        embed_fn: Callable[[List[str]], List[List[float]]],
+        max_batch_size: int,
+        max_wait_ms: float,
+        timeout: float = 60,
+        name: str = 'query-embedding'
+    ):
+        self.embed_fn = embed_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.timeout = timeout
+        self.name = name
+        
+        self.batches = 0
+        self.items = 0
+        
+        self._lock = threading.Lock()
+        self._queue = None
+        self._thread = None
+        self._pid = None
+    
+    def submit(self, text: str) -> Future:
+        future = Future()
+        self._ensure_dispatcher().put((text, future))
+        return future
+    
+    def embed(self, text: str) -> List[float]:
+        """Blocking: the embedding for one text."""
+        future = self.submit(text)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            future.cancel()
+            raise EmbeddingGenerationError(f"Query embedding timed out after {self.timeout}s")
+    
+    async def aembed(self, text: str) -> List[float]:
+        return await asyncio.wrap_future(self.submit(text))
+    
+    def stats(self) -> dict:
+        return {
+            'batches': self.batches,
+            'items': self.items,
+            'mean_batch_size': round(self.items / self.batches, 2) if self.batches else 0,
+        }
+    
+    def _ensure_dispatcher(self) -> queue.Queue:
+        # Threads don't survive a fork (gunicorn preload, Celery prefork),
+        # so each process starts its own dispatcher on first use
+        pid = os.getpid()
+        if self._pid == pid and self._thread.is_alive():
+            return self._queue
+        
+        with self._lock:
+            if self._pid != pid or not self._thread.is_alive():
+                self._queue = queue.Queue()
+                self._thread = threading.Thread(
+                    target=self._dispatch_forever,
+                    args=(self._queue,),
+                    name=f"{self.name}-batcher",
+                    daemon=True
+                )
+                self._thread.start()
+                self._pid = pid
+            return self._queue
+    
+    def _dispatch_forever(self, pending: queue.Queue):
+        while True:
+            batch = [pending.get()]
+            deadline = time.monotonic() + self.max_wait
+            
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    if remaining > 0:
+                        batch.append(pending.get(timeout=remaining))
+                    else:
+                        # Past the window, still take whatever is queued
+                        batch.append(pending.get_nowait())
+                except queue.Empty:
+                    break
+            
+            self._dispatch(batch)
+    
+    def _dispatch(self, batch):
+        batch = [(text, future) for text, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        
+        try:
+            # The same question asked concurrently is embedded once
+            texts = list(dict.fromkeys(text for text, _ in batch))
+            vectors = self.embed_fn(texts)
+            if len(vectors) != len(texts):
+                raise EmbeddingGenerationError(
+                    f"Embedding backend returned {len(vectors)} vectors for {len(texts)} texts"
+                )
+            vectors = dict(zip(texts, vectors))
+            
+            self.batches += 1
+            self.items += len(batch)
+            
+            for text, future in batch:
+                future.set_result(vectors[text])
+        
+        except Exception as e:
+            # Anything that escapes here would kill the dispatcher thread
+            logger.warning(f"Batched embedding of {len(batch)} texts failed: {str(e)}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+
+_query_batcher = None
+_query_batcher_lock = threading.Lock()
+
+
+def get_query_batcher() -> MicroBatcher:
+    """Per-process batcher for query embeddings on the configured backend."""
+    global _query_batcher
+    
+    if _query_batcher is None:
+        with _query_batcher_lock:
+            if _query_batcher is None:
+                config = settings.LLM_CONFIG
+                _query_batcher = MicroBatcher(
+                    get_embedding_service().generate_embeddings,
+                    max_batch_size=config['QUERY_BATCH_MAX_SIZE'],
+                    max_wait_ms=config['QUERY_BATCH_MAX_WAIT_MS'],
+                    timeout=config['QUERY_BATCH_TIMEOUT']
+                )
+    return _query_batcher
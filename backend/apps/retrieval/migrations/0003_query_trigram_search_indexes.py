@@ -0,0 +1,26 @@
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('retrieval', '0002_query_context_tokens'),
+        # pg_trgm is created there
+        ('documents', '0008_trigram_search_indexes'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='query',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('question'), name='gin_trgm_ops'), name='queries_question_trgm_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='query',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('answer'), name='gin_trgm_ops'), name='queries_answer_trgm_idx'),
+        ),
+    ]
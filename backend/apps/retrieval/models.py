@@ -1,6 +1,7 @@
 from django.db import models
 from django.conf import settings
 from django.core.validators import MinValueValidator, MaxValueValidator
+from apps.core.search import trigram_index
 
 
 class Query(models.Model):
@@ -20,6 +21,12 @@ class Query(models.Model):
     # Raw context sent to LLM
     context_used = models.TextField()
     
+    # Estimated size of the packed context
+    context_tokens = models.IntegerField(
+        default=0,
+        validators=[MinValueValidator(0)],
+    )
+    
     # Token usage
     tokens_used = models.IntegerField(
         default=0,
@@ -54,6 +61,9 @@ class Query(models.Model):
             models.Index(fields=['user', '-created_at']),
             models.Index(fields=['-created_at']),
             models.Index(fields=['was_successful']),
+            # History search
+            trigram_index('question', 'queries_question_trgm_idx'),
+            trigram_index('answer', 'queries_answer_trgm_idx'),
         ]
     
     def __str__(self):
@@ -0,0 +1,316 @@
+import os
+import json
+import fcntl
+import shutil
+import logging
+from contextlib import contextmanager
+from typing import List, Tuple
+import numpy as np
+from django.conf import settings
+
+from apps.documents.models import DocumentChunk, DocumentVersion, DocumentStatus
+
+logger = logging.getLogger(__name__)
+
+
+class NumpyVectorIndex:
+    """
+    In-process brute-force vector index for small and medium corpora.
+    
+    Layout on disk (VECTOR_SEARCH_CONFIG['NUMPY_INDEX_DIR']):
+    - manifest.json: segment list, department names, removed versions
+    - seg-NNNNNN/: embeddings.npy (L2-normalized float32), chunk_ids.npy,
+      version_ids.npy, departments.npy (codes into the manifest list)
+    
+    Segments are memory-mapped read-only, so gunicorn workers share pages
+    through the OS cache. Refreshes append a new segment and mark the old
+    rows of that document as removed; rebuild() compacts everything into
+    a single segment.
+    
+    Only searchable chunks (approved document, current version) are indexed,
+    so search needs no status filter, only the department mask.
+    """
+    
+    MANIFEST = 'manifest.json'
+    
+    def __init__(self, index_dir=None):
+        self.index_dir = str(index_dir or settings.VECTOR_SEARCH_CONFIG['NUMPY_INDEX_DIR'])
+        self.max_segments = settings.VECTOR_SEARCH_CONFIG['NUMPY_INDEX_MAX_SEGMENTS']
+        self.dimension = settings.LLM_CONFIG['EMBEDDING_DIMENSION']
+        self._manifest_mtime = None
+        self._manifest = None
+        self._segments = []
+    
+    def search(
+        self,
+        query_embedding,
+        top_k: int,
+        department: str = None
+    ) -> List[Tuple[int, float]]:
+        """
+        Return up to top_k (chunk_id, cosine_similarity) pairs, best first.
+        """
+        self._load()
+        
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return []
+        query = query / norm
+        
+        department_code = None
+        if department:
+            try:
+                department_code = self._manifest['departments'].index(department)
+            except ValueError:
+                return []
+        
+        candidate_ids = []
+        candidate_scores = []
+        
+        for segment in self._segments:
+            mask = segment['alive']
+            if department_code is not None:
+                mask = mask & (segment['departments'] == department_code)
+            
+            alive_count = int(mask.sum())
+            if alive_count == 0:
+                continue
+            
+            scores = segment['embeddings'] @ query
+            scores[~mask] = -np.inf
+            
+            k = min(top_k, alive_count)
+            top = np.argpartition(-scores, k - 1)[:k]
+            
+            candidate_ids.append(segment['chunk_ids'][top])
+            candidate_scores.append(scores[top])
+        
+        if not candidate_ids:
+            return []
+        
+        ids = np.concatenate(candidate_ids)
+        scores = np.concatenate(candidate_scores)
+        order = np.argsort(-scores)[:top_k]
+        
+        return [(int(ids[i]), float(scores[i])) for i in order]
+    
+    def stats(self) -> dict:
+        self._load()
+        total = sum(len(s['chunk_ids']) for s in self._segments)
+        alive = sum(int(s['alive'].sum()) for s in self._segments)
+        
+        return {
+            'segments': len(self._segments),
+            'total_rows': total,
+            'live_rows': alive,
+            'bytes': sum(s['embeddings'].nbytes for s in self._segments),
+        }
+    
+    def _load(self):
+        # Reload only when another process has written a new manifest
+        manifest_path = os.path.join(self.index_dir, self.MANIFEST)
+        
+        for attempt in range(2):
+            try:
+                mtime = os.stat(manifest_path).st_mtime_ns
+            except FileNotFoundError:
+                self._manifest = self._empty_manifest()
+                self._segments = []
+                return
+            
+            if mtime == self._manifest_mtime:
+                return
+            
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+            
+            try:
+                segments = self._load_segments(manifest)
+            except FileNotFoundError:
+                # A rebuild swapped the manifest and removed the segments
+                # it replaced after we read it; the new one is complete
+                if attempt:
+                    raise
+                logger.info(f"Vector index in {self.index_dir} was rebuilt while loading, reloading")
+                continue
+            
+            self._manifest = manifest
+            self._segments = segments
+            self._manifest_mtime = mtime
+            logger.info(f"Loaded vector index with {len(segments)} segments from {self.index_dir}")
+            return
+    
+    def _load_segments(self, manifest: dict) -> list:
+        removed = manifest['removed_versions']
+        segments = []
+        for seq, name in manifest['segments']:
+            path = os.path.join(self.index_dir, name)
+            version_ids = np.load(os.path.join(path, 'version_ids.npy'))
+            
+            # A row is dead if its version was removed at or after this segment
+            dead_versions = [int(v) for v, removed_at in removed.items() if removed_at >= seq]
+            alive = ~np.isin(version_ids, dead_versions)
+            
+            segments.append({
+                'embeddings': np.load(os.path.join(path, 'embeddings.npy'), mmap_mode='r'),
+                'chunk_ids': np.load(os.path.join(path, 'chunk_ids.npy')),
+                'departments': np.load(os.path.join(path, 'departments.npy')),
+                'version_ids': version_ids,
+                'alive': alive,
+            })
+        return segments
+    
+    def rebuild(self) -> int:
+        """Rebuild the whole index from DocumentChunk as a single segment."""
+        with self._write_lock():
+            manifest = self._empty_manifest()
+            manifest['next_seq'] = self._read_manifest()['next_seq']
+            
+            chunks = self._searchable_chunks()
+            count = self._write_segment(manifest, chunks, chunks.count())
+            
+            old_segments = set(os.listdir(self.index_dir))
+            self._write_manifest(manifest)
+            self._remove_unreferenced_segments(manifest, old_segments)
+        
+        logger.info(f"Rebuilt vector index with {count} chunks")
+        return count
+    
+    def refresh_document(self, document_id: int):
+        """
+        Re-index one document: drop its rows and append its current chunks
+        if it is searchable. Called when a version becomes READY or the
+        document is approved, archived or edited.
+        """
+        with self._write_lock():
+            manifest = self._read_manifest()
+            
+            version_ids = DocumentVersion.objects.filter(
+                document_id=document_id
+            ).values_list('id', flat=True)
+            
+            # Mark before writing so the new segment's rows stay alive
+            seq = manifest['next_seq']
+            for version_id in version_ids:
+                manifest['removed_versions'][str(version_id)] = seq - 1
+            
+            chunks = self._searchable_chunks().filter(version__document_id=document_id)
+            self._write_segment(manifest, chunks, chunks.count())
+            self._write_manifest(manifest)
+        
+        if len(manifest['segments']) > self.max_segments:
+            self.rebuild()
+    
+    def _searchable_chunks(self):
+        return DocumentChunk.objects.filter(
+            document_status=DocumentStatus.APPROVED,
+            is_current=True
+        ).order_by('id')
+    
+    def _write_segment(self, manifest, chunks, count: int) -> int:
+        if count == 0:
+            return 0
+        
+        seq = manifest['next_seq']
+        manifest['next_seq'] += 1
+        name = f"seg-{seq:06d}"
+        path = os.path.join(self.index_dir, name)
+        os.makedirs(path, exist_ok=True)
+        
+        embeddings = np.lib.format.open_memmap(
+            os.path.join(path, 'embeddings.npy'),
+            mode='w+',
+            dtype=np.float32,
+            shape=(count, self.dimension)
+        )
+        chunk_ids = np.empty(count, dtype=np.int64)
+        version_ids = np.empty(count, dtype=np.int64)
+        departments = np.empty(count, dtype=np.int32)
+        
+        department_codes = {name: i for i, name in enumerate(manifest['departments'])}
+        
+        rows = chunks.values_list('id', 'version_id', 'department', 'embedding')
+        written = 0
+        for chunk_id, version_id, department, embedding in rows.iterator(chunk_size=2000):
+            if written == count:
+                break  # rows added since count(); picked up by the next refresh
+            
+            vector = np.asarray(embedding, dtype=np.float32)
+            norm = np.linalg.norm(vector)
+            embeddings[written] = vector / norm if norm else vector
+            
+            if department not in department_codes:
+                department_codes[department] = len(manifest['departments'])
+                manifest['departments'].append(department)
+            
+            chunk_ids[written] = chunk_id
+            version_ids[written] = version_id
+            departments[written] = department_codes[department]
+            written += 1
+        
+        embeddings.flush()
+        del embeddings
+        
+        np.save(os.path.join(path, 'chunk_ids.npy'), chunk_ids[:written])
+        np.save(os.path.join(path, 'version_ids.npy'), version_ids[:written])
+        np.save(os.path.join(path, 'departments.npy'), departments[:written])
+        
+        if written < count:
+            # Rows deleted while we were reading; shrink the matrix to match
+            trimmed = np.load(os.path.join(path, 'embeddings.npy'))[:written]
+            np.save(os.path.join(path, 'embeddings.npy'), trimmed)
+        
+        manifest['segments'].append([seq, name])
+        return written
+    
+    def _empty_manifest(self) -> dict:
+        return {
+            'segments': [],
+            'departments': [],
+            'removed_versions': {},
+            'next_seq': 1,
+        }
+    
+    def _read_manifest(self) -> dict:
+        try:
+            with open(os.path.join(self.index_dir, self.MANIFEST)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return self._empty_manifest()
+    
+    def _write_manifest(self, manifest: dict):
+        # Atomic replace so readers never see a half-written manifest
+        path = os.path.join(self.index_dir, self.MANIFEST)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, path)
+    
+    def _remove_unreferenced_segments(self, manifest: dict, names):
+        referenced = {name for _, name in manifest['segments']}
+        for name in names:
+            if name.startswith('seg-') and name not in referenced:
+                shutil.rmtree(os.path.join(self.index_dir, name), ignore_errors=True)
+    
+    @contextmanager
+    def _write_lock(self):
+        # Serialize writers across web and Celery processes
+        os.makedirs(self.index_dir, exist_ok=True)
+        with open(os.path.join(self.index_dir, '.lock'), 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+_index = None
+
+
+def get_numpy_index() -> NumpyVectorIndex:
+    """Per-process index instance, so segments are mapped once per worker."""
+    global _index
+    if _index is None:
+        _index = NumpyVectorIndex()
+    return _index
@@ -0,0 +1,316 @@
+import time
+import uuid
+import random
+import logging
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Callable
+import redis
+import requests
+from django.conf import settings
+
+from apps.core.redis_client import get_redis
+from apps.core.exceptions import UpstreamRateLimited
+
+logger = logging.getLogger(__name__)
+
+# Refill and take from a shared bucket. Returns seconds to wait (0 = taken).
+# A Retry-After cooldown on the endpoint blocks the bucket until it expires.
+TOKEN_BUCKET_SCRIPT = """
+local cooldown = redis.call('PTTL', KEYS[2])
+if cooldown > 0 then
+    return tostring(cooldown / 1000)
+end
+
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 60)
+return tostring(wait)
+"""
+
+# Take a concurrency slot if fewer than floor(limit) are in flight. Slots
+# are scored by expiry so ones leaked by a crashed process age out.
+ACQUIRE_SLOT_SCRIPT = """
+local now = tonumber(ARGV[1])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+
+local limit = tonumber(redis.call('HGET', KEYS[2], 'limit')) or tonumber(ARGV[4])
+if redis.call('ZCARD', KEYS[1]) < math.max(1, math.floor(limit)) then
+    redis.call('ZADD', KEYS[1], now + tonumber(ARGV[3]), ARGV[2])
+    redis.call('EXPIRE', KEYS[1], math.ceil(tonumber(ARGV[3])) + 60)
+    return 1
+end
+return 0
+"""
+
+# AIMD: +1/limit per success (about +1 per round of calls), multiplicative
+# decrease on 429 or slow responses, at most once per decrease window
+ADJUST_LIMIT_SCRIPT = """
+local now = tonumber(ARGV[2])
+local min_limit = tonumber(ARGV[3])
+local max_limit = tonumber(ARGV[4])
+local limit = tonumber(redis.call('HGET', KEYS[1], 'limit')) or tonumber(ARGV[5])
+
+if ARGV[1] == 'increase' then
+    limit = math.min(max_limit, limit + 1 / limit)
+else
+    local last = tonumber(redis.call('HGET', KEYS[1], 'decreased_at')) or 0
+    if now - last < tonumber(ARGV[7]) then
+        return tostring(limit)
+    end
+    limit = math.max(min_limit, limit * tonumber(ARGV[6]))
+    redis.call('HSET', KEYS[1], 'decreased_at', tostring(now))
+    redis.call('HINCRBY', KEYS[1], 'decreases', 1)
+end
+
+redis.call('HSET', KEYS[1], 'limit', tostring(limit))
+return tostring(limit)
+"""
+
+RETRYABLE_STATUS = {429, 503}
+
+# Minimum gap between two multiplicative decreases, so one burst of 429s
+# from calls already in flight only counts once
+DECREASE_WINDOW_SECONDS = 2
+
+# Set by background_calls(); everything else (query/search requests, the
+# query micro-batcher thread) gets the short interactive budget
+_background = contextvars.ContextVar('hf_background_calls', default=False)
+
+
+@contextmanager
+def background_calls():
+    """
+    Give HF calls made inside the block the long retry budget
+    (HF_MAX_RETRIES, HF_ACQUIRE_TIMEOUT). Only for Celery tasks: a web
+    worker waiting that long is worse than a 503 with Retry-After.
+    """
+    token = _background.set(True)
+    try:
+        yield
+    finally:
+        _background.reset(token)
+
+
+class HFRateLimiter:
+    """
+    Client-side limiter for one Hugging Face endpoint, shared by every web
+    and Celery process through Redis:
+    
+    - a token bucket caps requests per second (RPS / BURST)
+    - an AIMD concurrency limit grows by ~1 per round of successful calls
+      and halves on 429s (x0.9 when latency is over target)
+    - Retry-After from a 429/503 pauses the whole endpoint
+    
+    send() wraps one HTTP call with all of the above and retries 429/503
+    with jittered exponential backoff, so callers retry a single batch
+    rather than a whole Celery task. If Redis is unreachable, limiting is
+    skipped and only the retries apply.
+    
+    Inside background_calls() a call may retry MAX_RETRIES times and wait
+    ACQUIRE_TIMEOUT for a slot. Otherwise (request handlers) it gets
+    SYNC_MAX_RETRIES retries, none longer than SYNC_ACQUIRE_TIMEOUT, and
+    waits at most SYNC_ACQUIRE_TIMEOUT for a slot, so a busy upstream turns
+    into UpstreamRateLimited quickly instead of holding the worker.
+    """
+    
+    def __init__(self, name: str, rate: float, burst: int, latency_target_ms: int):
+        config = settings.HF_API_CONFIG
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.latency_target = latency_target_ms / 1000
+        self.min_concurrency = config['MIN_CONCURRENCY']
+        self.max_concurrency = config['MAX_CONCURRENCY']
+        self.max_retries = config['MAX_RETRIES']
+        self.retry_base_delay = config['RETRY_BASE_DELAY']
+        self.retry_max_delay = config['RETRY_MAX_DELAY']
+        self.acquire_timeout = config['ACQUIRE_TIMEOUT']
+        self.sync_max_retries = config['SYNC_MAX_RETRIES']
+        self.sync_acquire_timeout = config['SYNC_ACQUIRE_TIMEOUT']
+        self.slot_ttl = config['SLOT_TTL']
+        
+        prefix = f"hf_limit:{name}"
+        self.bucket_key = f"{prefix}:bucket"
+        self.cooldown_key = f"{prefix}:cooldown"
+        self.slots_key = f"{prefix}:slots"
+        self.limit_key = f"{prefix}:limit"
+    
+    def send(self, request: Callable[[], requests.Response]) -> requests.Response:
+        """
+        Run request() under the limiter, retrying 429/503 within the
+        caller's budget. Returns the last response; raises
+        UpstreamRateLimited if no slot frees up in time.
+        """
+        if _background.get():
+            max_retries, acquire_timeout, max_delay = (
+                self.max_retries, self.acquire_timeout, self.retry_max_delay
+            )
+        else:
+            max_retries, acquire_timeout, max_delay = (
+                self.sync_max_retries, self.sync_acquire_timeout, self.sync_acquire_timeout
+            )
+        
+        for attempt in range(max_retries + 1):
+            slot = self._acquire(acquire_timeout)
+            started = time.monotonic()
+            try:
+                response = request()
+            finally:
+                self._release(slot)
+            
+            latency = time.monotonic() - started
+            self._record(response.status_code, latency)
+            
+            if response.status_code not in RETRYABLE_STATUS:
+                return response
+            
+            retry_after = self.retry_after_seconds(response)
+            if retry_after is not None:
+                self._cooldown(retry_after)
+            
+            delay = retry_after if retry_after is not None else self._backoff(attempt)
+            # Out of budget: hand the response back so the caller raises
+            # UpstreamRateLimited with its Retry-After
+            if attempt == max_retries or delay > max_delay:
+                return response
+            
+            logger.warning(
+                f"HF {self.name} returned {response.status_code}, "
+                f"retry {attempt + 1}/{max_retries} in {delay:.1f}s"
+            )
+            time.sleep(delay)
+        
+        return response
+    
+    def state(self) -> dict:
+        client = get_redis()
+        limit = client.hgetall(self.limit_key)
+        return {
+            'name': self.name,
+            'concurrency_limit': float(limit.get(b'limit', self.max_concurrency)),
+            'decreases': int(limit.get(b'decreases', 0)),
+            'in_flight': client.zcount(self.slots_key, time.time(), '+inf'),
+            'cooldown_seconds': max(client.pttl(self.cooldown_key), 0) / 1000,
+        }
+    
+    def _acquire(self, timeout: float):
+        deadline = time.monotonic() + timeout
+        slot = uuid.uuid4().hex
+        
+        try:
+            client = get_redis()
+            
+            # Rate first, then concurrency
+            while True:
+                wait = float(client.eval(
+                    TOKEN_BUCKET_SCRIPT, 2, self.bucket_key, self.cooldown_key,
+                    self.rate, self.burst, time.time()
+                ))
+                if wait <= 0:
+                    break
+                self._sleep_until(deadline, wait)
+            
+            while not client.eval(
+                ACQUIRE_SLOT_SCRIPT, 2, self.slots_key, self.limit_key,
+                time.time(), slot, self.slot_ttl, self.max_concurrency
+            ):
+                self._sleep_until(deadline, random.uniform(0.05, 0.2))
+            
+            return slot
+        
+        except redis.RedisError as e:
+            logger.warning(f"HF rate limiter unavailable for {self.name}: {str(e)}")
+            return None
+    
+    def _sleep_until(self, deadline, wait):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise UpstreamRateLimited(
+                f"Hugging Face {self.name} API is busy. Please try again in a few moments.",
+                retry_after=wait
+            )
+        time.sleep(min(wait, remaining))
+    
+    def _release(self, slot):
+        if slot is None:
+            return
+        try:
+            get_redis().zrem(self.slots_key, slot)
+        except redis.RedisError:
+            pass  # ages out after SLOT_TTL
+    
+    def _record(self, status_code: int, latency: float):
+        if status_code == 429:
+            mode, factor = 'decrease', 0.5
+        elif latency > self.latency_target:
+            mode, factor = 'decrease', 0.9
+        elif status_code < 400:
+            mode, factor = 'increase', 1
+        else:
+            return
+        
+        try:
+            get_redis().eval(
+                ADJUST_LIMIT_SCRIPT, 1, self.limit_key,
+                mode, time.time(), self.min_concurrency, self.max_concurrency,
+                self.max_concurrency, factor, DECREASE_WINDOW_SECONDS
+            )
+        except redis.RedisError:
+            pass
+    
+    def _cooldown(self, seconds: float):
+        try:
+            get_redis().set(self.cooldown_key, 1, px=max(int(seconds * 1000), 1))
+        except redis.RedisError:
+            pass
+    
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter
+        return random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * 2 ** attempt))
+    
+    def retry_after_seconds(self, response: requests.Response):
+        value = response.headers.get('Retry-After')
+        if not value:
+            return None
+        try:
+            return min(float(value), self.retry_max_delay)
+        except ValueError:
+            pass
+        try:
+            delta = parsedate_to_datetime(value) - datetime.now(timezone.utc)
+            return min(max(delta.total_seconds(), 0), self.retry_max_delay)
+        except (TypeError, ValueError):
+            return None
+
+
+_limiters = {}
+
+
+def get_rate_limiter(name: str) -> HFRateLimiter:
+    """Per-process limiter for 'embedding' or 'generation'."""
+    if name not in _limiters:
+        config = settings.HF_API_CONFIG
+        _limiters[name] = HFRateLimiter(
+            name,
+            rate=config[f'{name.upper()}_RPS'],
+            burst=config[f'{name.upper()}_BURST'],
+            latency_target_ms=config[f'{name.upper()}_LATENCY_TARGET_MS']
+        )
+    return _limiters[name]
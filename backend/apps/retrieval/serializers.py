@@ -1,3 +1,4 @@
+from django.conf import settings
 from rest_framework import serializers
 from .models import Query, QuerySource, Feedback, FeedbackType
 from apps.documents.serializers import DocumentChunkSerializer
@@ -23,13 +24,13 @@ class QuerySerializer(serializers.ModelSerializer):
         model = Query
         fields = [
             'id', 'user', 'user_username', 'question', 'answer',
-            'sources', 'tokens_used', 'response_time_ms',
+            'sources', 'tokens_used', 'context_tokens', 'response_time_ms',
             'was_successful', 'num_chunks_retrieved',
             'avg_similarity_score', 'created_at'
         ]
 
         read_only_fields = [
-            'user', 'answer', 'tokens_used', 'response_time_ms',
+            'user', 'answer', 'tokens_used', 'context_tokens', 'response_time_ms',
             'was_successful', 'num_chunks_retrieved',
             'avg_similarity_score', 'created_at'
         ]
@@ -57,6 +58,107 @@ class QueryRequestSerializer(serializers.Serializer):
         return value.strip()
 
 
+class QueryBatchRequestSerializer(serializers.Serializer):
+    
+    questions = serializers.ListField(
+        child=serializers.CharField(max_length=1000),
+        min_length=1,
+        max_length=settings.BATCH_QUERY_CONFIG['MAX_QUESTIONS'],
+        help_text="Questions to answer"
+    )
+    
+    department = serializers.CharField(
+        max_length=100,
+        required=False,
+        allow_blank=True,
+        help_text="Department filter applied to every question"
+    )
+    
+    generate = serializers.BooleanField(
+        default=True,
+        help_text="Generate answers; false returns ranked sources only"
+    )
+    
+    def validate_questions(self, value):
+        questions = [question.strip() for question in value]
+        for question in questions:
+            if len(question) < 10:
+                raise serializers.ValidationError(
+                    "Each question must be at least 10 characters long."
+                )
+        return questions
+
+
+class SearchResultSerializer(serializers.Serializer):
+    # Flat row straight from the search result dict, no related lookups
+    
+    FIELDS = (
+        'chunk_id', 'document_title', 'version_number', 'chunk_index',
+        'text', 'similarity_score', 'metadata'
+    )
+    
+    chunk_id = serializers.IntegerField(source='chunk.id')
+    document_title = serializers.CharField()
+    version_number = serializers.IntegerField()
+    chunk_index = serializers.IntegerField()
+    text = serializers.CharField()
+    similarity_score = serializers.FloatField()
+    metadata = serializers.JSONField()
+    
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        
+        # Field projection
+        if fields:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class SearchRequestSerializer(serializers.Serializer):
+    
+    query = serializers.CharField(
+        max_length=1000,
+        help_text="Search text"
+    )
+    
+    department = serializers.CharField(
+        max_length=100,
+        required=False,
+        allow_blank=True,
+        help_text="Department filter"
+    )
+    
+    top_k = serializers.IntegerField(
+        min_value=1,
+        max_value=50,
+        required=False,
+        help_text="Number of chunks to return"
+    )
+    
+    hybrid = serializers.BooleanField(
+        default=False,
+        help_text="Fuse full-text matches with vector similarity"
+    )
+    
+    rerank = serializers.BooleanField(
+        default=True,
+        help_text="Diversify results with MMR"
+    )
+    
+    fields = serializers.ListField(
+        child=serializers.ChoiceField(choices=SearchResultSerializer.FIELDS),
+        required=False,
+        help_text="Result fields to return (default: all)"
+    )
+    
+    def validate_query(self, value):
+        if len(value.strip()) < 3:
+            raise serializers.ValidationError(
+                "Query must be at least 3 characters long."
+            )
+        return value.strip()
+
+
 class FeedbackSerializer(serializers.ModelSerializer):
     
     user_username = serializers.CharField(source='user.username', read_only=True)
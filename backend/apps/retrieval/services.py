@@ -1,14 +1,28 @@
 import time
+import hashlib
 import logging
 import requests
 from typing import List, Dict, Tuple
 from django.conf import settings
-from apps.core.exceptions import LLMServiceError, EmbeddingGenerationError
+from django.utils.module_loading import import_string
+from apps.core.exceptions import (
+    LLMServiceError,
+    EmbeddingGenerationError,
+    UpstreamRateLimited,
+    CircuitOpenError
+)
+from .context_packing import ContextPacker, PackedContext
+from .embedding_backends import BaseEmbeddingBackend, OnnxEmbeddingBackend
+from .single_flight import SingleFlight
+from .rate_limiting import get_rate_limiter
+from .circuit_breaker import get_circuit_breaker
 
 logger = logging.getLogger(__name__)
 
+SYSTEM_PROMPT = "You are a professional assistant that answers questions based on internal company documents. CRITICAL RULES: 1) Answer ONLY using information from the provided context. 2) If the answer is not in the context, say 'I don't have enough information to answer this question.' 3) Never make up information. 4) Cite which source(s) you used. 5) Be concise and direct."
 
-class EmbeddingServiceHF:
+
+class EmbeddingServiceHF(BaseEmbeddingBackend):
     """
     Handles embedding generation using Hugging Face Router API.
     Provider: Hugging Face
@@ -24,6 +38,9 @@ class EmbeddingServiceHF:
         # Updated Router URL for feature extraction
         self.api_url = f"https://router.huggingface.co/hf-inference/models/{self.model}/pipeline/feature-extraction"
         self.dimension = 768  # BGE-base-en output dimension
+        self.batch_size = settings.HF_API_CONFIG['EMBEDDING_BATCH_SIZE']
+        self.limiter = get_rate_limiter('embedding')
+        self.breaker = get_circuit_breaker('embedding')
         
         if not self.api_key:
             raise ValueError("HF_EMBEDDING_API_KEY not found in environment variables")
@@ -40,10 +57,22 @@ class EmbeddingServiceHF:
 
         try:
             logger.info(f"Generating embeddings for {len(texts)} texts using {self.model}")
-            embeddings = self._call_huggingface_embedding_api(texts)
+            
+            # Each batch is retried on its own, so a 429 late in a large
+            # document doesn't re-embed the batches that already succeeded
+            embeddings = []
+            for start in range(0, len(texts), self.batch_size):
+                embeddings.extend(
+                    self._call_huggingface_embedding_api(texts[start:start + self.batch_size])
+                )
+            
             logger.info(f"Successfully generated {len(embeddings)} embeddings (dim={self.dimension})")
             return embeddings
 
+        except (UpstreamRateLimited, CircuitOpenError) as e:
+            logger.error(f"Embedding generation unavailable: {str(e)}")
+            raise
+
         except Exception as e:
             logger.error(f"Embedding generation failed: {str(e)}")
             raise EmbeddingGenerationError(f"Failed to generate embeddings: {str(e)}")
@@ -67,19 +96,19 @@ class EmbeddingServiceHF:
         }
         
         try:
-            response = requests.post(
+            response = self.breaker.call(lambda: self.limiter.send(lambda: requests.post(
                 self.api_url,
                 headers=headers,
                 json=payload,
                 timeout=30
-            )
+            )))
             
-            # Handle rate limiting
+            # Handle rate limiting (still 429 after the limiter's retries)
             if response.status_code == 429:
-                error_data = response.json()
-                logger.error(f"HF API rate limit exceeded: {error_data}")
-                raise EmbeddingGenerationError(
-                    "Hugging Face API rate limit exceeded. Please try again in a few moments."
+                logger.error(f"HF API rate limit exceeded: {response.text[:500]}")
+                raise UpstreamRateLimited(
+                    "Hugging Face API rate limit exceeded. Please try again in a few moments.",
+                    retry_after=self.limiter.retry_after_seconds(response)
                 )
             
             # Handle quota exceeded
@@ -137,6 +166,8 @@ class GenerationServiceHF:
         self.api_key = settings.HF_LLM_API_KEY
         # OpenAI-compatible chat completions endpoint
         self.api_url = "https://router.huggingface.co/v1/chat/completions"
+        self.limiter = get_rate_limiter('generation')
+        self.breaker = get_circuit_breaker('generation')
         
         if not self.api_key:
             raise ValueError("HF_LLM_API_KEY not found in environment variables")
@@ -148,48 +179,85 @@ class GenerationServiceHF:
         question: str,
         context_chunks: List[Dict],
         max_tokens: int = None
-    ) -> Tuple[str, int]:
+    ) -> Tuple[str, int, PackedContext]:
         """
         Generate answer using RAG approach with Mistral-7B-Instruct.
-        Returns: (answer_text, tokens_used)
+        Returns: (answer_text, tokens_used, packed_context)
+        packed_context says which chunks were actually sent in the prompt.
         """
         if not max_tokens:
             max_tokens = settings.RATE_LIMIT_CONFIG.get('MAX_TOKENS_PER_QUERY', 500)
 
-        prompt = self._build_rag_prompt(question, context_chunks)
+        prompt, context = self._build_rag_prompt(question, context_chunks, max_tokens)
 
         try:
             logger.info(f"Generating answer using {self.model}")
-            answer, tokens = self._call_huggingface_generation_api(prompt, max_tokens)
+            answer, tokens = self._generate_coalesced(prompt, max_tokens)
             logger.info(f"Successfully generated answer ({tokens} tokens used)")
-            return answer, tokens
+            return answer, tokens, context
+
+        except (UpstreamRateLimited, CircuitOpenError) as e:
+            logger.error(f"Answer generation unavailable: {str(e)}")
+            raise
 
         except Exception as e:
             logger.error(f"Answer generation failed: {str(e)}")
             raise LLMServiceError(f"Failed to generate answer: {str(e)}")
 
-    def _build_rag_prompt(self, question: str, context_chunks: List[Dict]) -> str:
+    def _generate_coalesced(self, prompt: str, max_tokens: int) -> Tuple[str, int]:
         """
-        Build RAG prompt with context.
-        The system message is passed separately in the API call.
+        Identical prompts in flight at the same time (across all workers)
+        share one upstream call.
         """
-        # Build context from chunks
-        context_text = ""
-        for i, chunk in enumerate(context_chunks, 1):
-            doc_title = chunk.get('document_title', 'Unknown')
-            chunk_text = chunk.get('text', '')
-            context_text += f"\n[Source {i}: {doc_title}]\n{chunk_text}\n"
-
-        # Construct user message with context
-        prompt = f"""CONTEXT:
-{context_text}
+        # Fail fast before joining a single-flight group
+        self.breaker.raise_if_open()
+        
+        if not settings.LLM_CONFIG['SINGLE_FLIGHT_ENABLED']:
+            return self._call_huggingface_generation_api(prompt, max_tokens)
+        
+        key = hashlib.sha256(
+            f"{self.model}\n{max_tokens}\n{SYSTEM_PROMPT}\n{prompt}".encode('utf-8')
+        ).hexdigest()
+        
+        answer, tokens = SingleFlight('generation').do(
+            key,
+            lambda: self._call_huggingface_generation_api(prompt, max_tokens)
+        )
+        return answer, tokens
 
-QUESTION:
-{question}
+    def _build_rag_prompt(
+        self,
+        question: str,
+        context_chunks: List[Dict],
+        max_tokens: int = None
+    ) -> Tuple[str, PackedContext]:
+        """
+        Build RAG prompt with context packed into the token budget.
+        The system message is passed separately in the API call.
+        Returns: (prompt, packed_context)
+        """
+        instructions = (
+            "Please provide a clear, accurate answer based only on the context above. "
+            "Cite which source(s) you used."
+        )
 
-Please provide a clear, accurate answer based only on the context above. Cite which source(s) you used."""
+        packer = ContextPacker(max_answer_tokens=max_tokens)
+        context = packer.pack(
+            context_chunks,
+            prompt_overhead="\n".join([SYSTEM_PROMPT, question, instructions])
+        )
 
-        return prompt
+        # Construct user message with context
+        prompt = "\n".join([
+            "CONTEXT:",
+            context.text,
+            "",
+            "QUESTION:",
+            question,
+            "",
+            instructions,
+        ])
+        return prompt, context
 
     def _call_huggingface_generation_api(
         self,
@@ -210,7 +278,7 @@ Please provide a clear, accurate answer based only on the context above. Cite wh
             "messages": [
                 {
                     "role": "system",
-                    "content": "You are a professional assistant that answers questions based on internal company documents. CRITICAL RULES: 1) Answer ONLY using information from the provided context. 2) If the answer is not in the context, say 'I don't have enough information to answer this question.' 3) Never make up information. 4) Cite which source(s) you used. 5) Be concise and direct."
+                    "content": SYSTEM_PROMPT
                 },
                 {
                     "role": "user",
@@ -222,19 +290,19 @@ Please provide a clear, accurate answer based only on the context above. Cite wh
         }
         
         try:
-            response = requests.post(
+            response = self.breaker.call(lambda: self.limiter.send(lambda: requests.post(
                 self.api_url,
                 headers=headers,
                 json=payload,
                 timeout=60
-            )
+            )))
             
-            # Handle rate limiting
+            # Handle rate limiting (still 429 after the limiter's retries)
             if response.status_code == 429:
-                error_data = response.json()
-                logger.error(f"HF API rate limit exceeded: {error_data}")
-                raise LLMServiceError(
-                    "Hugging Face API rate limit exceeded. Please try again in a few moments."
+                logger.error(f"HF API rate limit exceeded: {response.text[:500]}")
+                raise UpstreamRateLimited(
+                    "Hugging Face API rate limit exceeded. Please try again in a few moments.",
+                    retry_after=self.limiter.retry_after_seconds(response)
                 )
             
             # Handle quota exceeded
@@ -282,6 +350,24 @@ Please provide a clear, accurate answer based only on the context above. Cite wh
             raise LLMServiceError(f"Failed to connect to Hugging Face API: {str(e)}")
 
 
-# Backward compatibility aliases (maintain existing interface)
+EMBEDDING_BACKENDS = {
+    'huggingface': EmbeddingServiceHF,
+    'onnx': OnnxEmbeddingBackend,
+}
+
+
+def get_embedding_service(name: str = None) -> BaseEmbeddingBackend:
+    """Instantiate the configured embedding backend (or the one named)."""
+    name = name or settings.LLM_CONFIG['EMBEDDING_BACKEND']
+    
+    if name in EMBEDDING_BACKENDS:
+        return EMBEDDING_BACKENDS[name]()
+    
+    # Dotted path to a BaseEmbeddingBackend subclass
+    return import_string(name)()
+
+
+# Backward compatibility aliases (maintain existing interface).
+# EmbeddingService is always the HF API; use get_embedding_service().
 EmbeddingService = EmbeddingServiceHF
 LLMService = GenerationServiceHF
\ No newline at end of file
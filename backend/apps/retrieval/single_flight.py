@@ -0,0 +1,168 @@
+import json
+import time
+import uuid
+import logging
+import threading
+from typing import Callable, Any
+import redis
+from django.conf import settings
+
+from apps.core.redis_client import get_redis
+from apps.core.exceptions import LLMServiceError, UpstreamRateLimited, CircuitOpenError
+
+logger = logging.getLogger(__name__)
+
+# Delete the lock only if we still own it
+RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+# Push the lock's expiry out, only if we still own it
+EXTEND_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+# Leader errors that followers re-raise as the same type, so callers can
+# still answer "upstream busy" with a Retry-After instead of a failure
+SHARED_ERRORS = {error.__name__: error for error in (UpstreamRateLimited, CircuitOpenError)}
+
+
+class SingleFlight:
+    """
+    Coalesce identical concurrent calls across processes.
+    
+    The first caller for a key takes a Redis lock and runs the function;
+    everyone else subscribes to the key's channel and gets the leader's
+    result (or error) when it is published. Rate limit and open-circuit
+    errors reach followers with their type and retry_after; any other
+    error becomes an LLMServiceError. The result is also stored for
+    a few seconds so callers that subscribe just after the publish still
+    see it.
+    
+    The leader's lock lives for lock_ttl seconds and is extended every
+    lock_ttl / 3 while fn runs, so it never lapses under a slow leader (and
+    followers don't all call upstream) but a crashed leader's lock is gone
+    within lock_ttl, at which point followers run the function themselves.
+    A follower still waiting after wait_seconds raises UpstreamRateLimited
+    rather than adding another upstream call. If Redis is down, every
+    caller runs the function.
+    
+    Results must be JSON-serialisable.
+    """
+    
+    def __init__(self, namespace: str, wait_seconds: int = None, result_ttl: int = 5, lock_ttl: int = 10):
+        self.namespace = namespace
+        self.wait_seconds = wait_seconds or settings.LLM_CONFIG['SINGLE_FLIGHT_WAIT_SECONDS']
+        self.result_ttl = result_ttl
+        self.lock_ttl = lock_ttl
+    
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        lock_key = f"singleflight:{self.namespace}:{key}:lock"
+        result_key = f"singleflight:{self.namespace}:{key}:result"
+        channel = f"singleflight:{self.namespace}:{key}"
+        
+        try:
+            client = get_redis()
+            token = uuid.uuid4().hex
+            is_leader = client.set(lock_key, token, nx=True, ex=self.lock_ttl)
+        except redis.RedisError as e:
+            logger.warning(f"Single-flight unavailable, calling directly: {str(e)}")
+            return fn()
+        
+        if is_leader:
+            return self._lead(client, lock_key, result_key, channel, token, fn)
+        return self._follow(client, lock_key, result_key, channel, fn)
+    
+    def _lead(self, client, lock_key, result_key, channel, token, fn):
+        done = threading.Event()
+        heartbeat = threading.Thread(
+            target=self._hold_lock, args=(client, lock_key, token, done), daemon=True
+        )
+        heartbeat.start()
+        try:
+            result = fn()
+        except Exception as e:
+            self._publish(client, result_key, channel, {
+                'error': str(e),
+                'type': e.__class__.__name__,
+                'retry_after': getattr(e, 'retry_after', None),
+            })
+            raise
+        else:
+            self._publish(client, result_key, channel, {'result': result})
+            return result
+        finally:
+            done.set()
+            heartbeat.join()
+            try:
+                client.eval(RELEASE_LOCK_SCRIPT, 1, lock_key, token)
+            except redis.RedisError:
+                pass  # expires on its own
+    
+    def _hold_lock(self, client, lock_key, token, done):
+        while not done.wait(self.lock_ttl / 3):
+            try:
+                client.eval(EXTEND_LOCK_SCRIPT, 1, lock_key, token, int(self.lock_ttl * 1000))
+            except redis.RedisError as e:
+                logger.warning(f"Single-flight could not extend {lock_key}: {str(e)}")
+    
+    def _follow(self, client, lock_key, result_key, channel, fn):
+        pubsub = client.pubsub(ignore_subscribe_messages=True)
+        try:
+            pubsub.subscribe(channel)
+            
+            # The leader may have finished before we subscribed
+            payload = client.get(result_key)
+            deadline = time.monotonic() + self.wait_seconds
+            
+            while payload is None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    # The leader is alive but slow; another call would only
+                    # add to whatever is slowing it down
+                    logger.warning(f"Single-flight wait timed out for {channel}")
+                    raise UpstreamRateLimited(
+                        "An identical request is still in progress. Please try again in a few moments.",
+                        retry_after=self.lock_ttl
+                    )
+                
+                message = pubsub.get_message(timeout=min(remaining, 1.0))
+                if message and message['type'] == 'message':
+                    payload = message['data']
+                elif not client.exists(lock_key):
+                    # Leader finished or died; take whatever it left behind
+                    payload = client.get(result_key)
+                    if payload is None:
+                        return fn()
+        except redis.RedisError as e:
+            logger.warning(f"Single-flight wait failed, calling directly: {str(e)}")
+            return fn()
+        finally:
+            try:
+                pubsub.close()
+            except redis.RedisError:
+                pass
+        
+        data = json.loads(payload)
+        if 'error' in data:
+            error = SHARED_ERRORS.get(data.get('type'))
+            if error is not None:
+                raise error(data['error'], retry_after=data.get('retry_after'))
+            raise LLMServiceError(data['error'])
+        
+        logger.info(f"Single-flight: shared upstream result for {channel}")
+        return data['result']
+    
+    def _publish(self, client, result_key, channel, data):
+        try:
+            payload = json.dumps(data)
+            client.set(result_key, payload, ex=self.result_ttl)
+            client.publish(channel, payload)
+        except (redis.RedisError, TypeError, ValueError) as e:
+            logger.warning(f"Single-flight publish failed for {channel}: {str(e)}")
@@ -0,0 +1,16 @@
+from celery import shared_task
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def refresh_vector_index_task(document_id: int):
+    # Keeps the in-process numpy index in step with a document's chunks.
+    # Enqueued by NumpyVectorStore.update_document
+    from .numpy_index import get_numpy_index
+    
+    get_numpy_index().refresh_document(document_id)
+    logger.info(f"Refreshed vector index for document {document_id}")
+    
+    return {'document_id': document_id}
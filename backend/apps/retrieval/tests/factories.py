@@ -0,0 +1,27 @@
+import factory
+
+from apps.core.tests.factories import UserFactory
+from apps.documents.tests.factories import DocumentChunkFactory
+from apps.retrieval.models import Query, QuerySource
+
+
+class QueryFactory(factory.django.DjangoModelFactory):
+
+    class Meta:
+        model = Query
+    
+    user = factory.SubFactory(UserFactory)
+    question = factory.Sequence(lambda n: f'Question {n}?')
+    answer = 'The answer, from Source 1.'
+    context_used = 'Some document text.'
+
+
+class QuerySourceFactory(factory.django.DjangoModelFactory):
+
+    class Meta:
+        model = QuerySource
+    
+    query = factory.SubFactory(QueryFactory)
+    chunk = factory.SubFactory(DocumentChunkFactory)
+    similarity_score = 0.8
+    rank = factory.Sequence(lambda n: n + 1)
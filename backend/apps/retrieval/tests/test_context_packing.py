@@ -0,0 +1,42 @@
+from apps.retrieval.context_packing import ContextPacker
+
+
+def hit(index, score, title="Leave policy", neighbors=()):
+    return {
+        'text': f"Chunk {index} of {title}.",
+        'document_title': title,
+        'version_number': 1,
+        'chunk_index': index,
+        'similarity_score': score,
+        'neighbors': list(neighbors),
+    }
+
+
+def test_passages_are_labelled_with_the_rank_of_their_sources():
+    # Search order (after MMR) differs from score order
+    first = hit(0, 0.9)
+    second = hit(4, 0.7, title="Expenses", neighbors=[hit(5, 0.7, title="Expenses")])
+    third = hit(1, 0.8)
+    search_results = [first, second, third]
+    
+    context = ContextPacker().pack(search_results)
+    
+    assert context.included(search_results) == search_results
+    # Adjacent hits 1 and 3 share a passage; the neighbour is cited as its hit
+    assert [passage.label for passage in context.passages] == [
+        "[Source 1, 3: Leave policy]",
+        "[Source 2: Expenses]",
+    ]
+    assert "[Source 2: Expenses]\nChunk 4 of Expenses. Chunk 5 of Expenses." in context.text
+
+
+def test_neighbours_of_dropped_hits_are_not_packed():
+    packer = ContextPacker()
+    kept = hit(0, 0.9)
+    dropped = hit(8, 0.5, neighbors=[hit(9, 0.5)])
+    dropped['text'] = "x" * 4 * packer.budget()
+    
+    context = packer.pack([kept, dropped])
+    
+    assert [passage.chunk_indexes for passage in context.passages] == [[0]]
+    assert context.included([kept, dropped]) == [kept]
@@ -0,0 +1,11 @@
+import pytest
+
+from apps.retrieval.embedding_backends import BaseEmbeddingBackend
+
+
+def test_incomplete_backend_fails_on_instantiation():
+    class NamedBackend(BaseEmbeddingBackend):
+        model = 'my-model'
+    
+    with pytest.raises(TypeError):
+        NamedBackend()
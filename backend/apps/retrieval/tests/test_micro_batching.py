@@ -0,0 +1,47 @@
+import threading
+import pytest
+
+from apps.core.exceptions import EmbeddingGenerationError
+from apps.retrieval.micro_batching import MicroBatcher
+
+
+def test_concurrent_texts_share_one_call():
+    calls = []
+    
+    def embed_fn(texts):
+        calls.append(texts)
+        return [[float(len(text))] for text in texts]
+    
+    batcher = MicroBatcher(embed_fn, max_batch_size=8, max_wait_ms=200, timeout=5)
+    futures = [batcher.submit(text) for text in ["a", "bb", "a"]]
+    
+    assert [future.result(timeout=5) for future in futures] == [[1.0], [2.0], [1.0]]
+    assert calls == [["a", "bb"]]
+
+
+def test_short_backend_response_fails_the_batch_and_keeps_dispatching():
+    responses = [[[1.0]], [[1.0]]]
+    batcher = MicroBatcher(lambda texts: responses.pop(0), max_batch_size=8, max_wait_ms=200, timeout=5)
+    
+    futures = [batcher.submit(text) for text in ["a", "bb"]]
+    for future in futures:
+        with pytest.raises(EmbeddingGenerationError):
+            future.result(timeout=5)
+    
+    # The dispatcher thread survived
+    assert batcher.embed("a") == [1.0]
+
+
+def test_embed_gives_up_after_the_timeout():
+    release = threading.Event()
+    
+    def embed_fn(texts):
+        release.wait(5)
+        return [[1.0] for _ in texts]
+    
+    batcher = MicroBatcher(embed_fn, max_batch_size=8, max_wait_ms=1, timeout=0.2)
+    try:
+        with pytest.raises(EmbeddingGenerationError):
+            batcher.embed("a")
+    finally:
+        release.set()
@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+
+from apps.documents.tests.factories import DocumentChunkFactory
+from apps.retrieval import numpy_index
+from apps.retrieval.numpy_index import NumpyVectorIndex
+
+pytestmark = pytest.mark.django_db
+
+
+def test_reader_reloads_when_a_rebuild_removes_its_segments(tmp_path, monkeypatch):
+    chunk = DocumentChunkFactory()
+    writer = NumpyVectorIndex(tmp_path)
+    writer.rebuild()
+    reader = NumpyVectorIndex(tmp_path)
+    
+    load = np.load
+    rebuilt = []
+    
+    def load_during_rebuild(path, *args, **kwargs):
+        # Another process rebuilds just after the reader read the manifest
+        if not rebuilt:
+            rebuilt.append(path)
+            writer.rebuild()
+        return load(path, *args, **kwargs)
+    
+    monkeypatch.setattr(numpy_index.np, 'load', load_during_rebuild)
+    hits = reader.search(chunk.embedding, 1)
+    
+    assert rebuilt
+    assert [chunk_id for chunk_id, _ in hits] == [chunk.id]
@@ -0,0 +1,210 @@
+import json
+import time
+import pytest
+from django.core.signals import request_finished
+from django.db import close_old_connections
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from apps.documents.tests.factories import DocumentChunkFactory, DocumentVersionFactory
+from apps.core.quota import QueryQuota
+from apps.retrieval.models import Query, QuerySource
+from apps.retrieval.tests.factories import QueryFactory, QuerySourceFactory
+from apps.retrieval.services import GenerationServiceHF
+from apps.retrieval.vector_search import VectorSearchService
+from apps.retrieval.views import QueryBatchView
+
+pytestmark = pytest.mark.django_db
+
+
+def search_result(chunk, similarity_score):
+    # Same shape as VectorSearchService.search_by_embedding() results
+    return {
+        'chunk': chunk,
+        'similarity_score': similarity_score,
+        'text': chunk.text,
+        'document_title': chunk.document_title,
+        'version_number': chunk.version_number,
+        'chunk_index': chunk.chunk_index,
+        'metadata': chunk.metadata,
+        'neighbors': [],
+    }
+
+
+@pytest.fixture
+def search_results(monkeypatch):
+    # Three ~200 token chunks, far enough apart not to be merged
+    chunks = [
+        DocumentChunkFactory(chunk_index=index, text=f"Passage {index}. " + "policy text " * 58)
+        for index in (0, 5, 10)
+    ]
+    results = [search_result(chunk, score) for chunk, score in zip(chunks, (0.9, 0.8, 0.7))]
+    
+    monkeypatch.setattr(VectorSearchService, 'search', lambda self, query, user, **kwargs: results)
+    return results
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    calls = []
+    
+    def call_api(self, prompt, max_tokens):
+        calls.append(prompt)
+        return "The answer, from Source 1.", 42
+    
+    monkeypatch.setattr(GenerationServiceHF, '_call_huggingface_generation_api', call_api)
+    return calls
+
+
+@pytest.fixture
+def slow_upstream(monkeypatch):
+    # The first answer comes straight back, the rest take a moment
+    calls = []
+    
+    def call_api(self, prompt, max_tokens):
+        calls.append(prompt)
+        if len(calls) > 1:
+            time.sleep(0.2)
+        return "The answer, from Source 1.", 42
+    
+    monkeypatch.setattr(GenerationServiceHF, '_call_huggingface_generation_api', call_api)
+    return calls
+
+
+@pytest.fixture
+def batch_search(settings, search_results, monkeypatch):
+    # Answer one question at a time, so the order of upstream calls is known
+    settings.BATCH_QUERY_CONFIG = {**settings.BATCH_QUERY_CONFIG, 'GENERATION_CONCURRENCY': 1}
+    monkeypatch.setattr(
+        VectorSearchService, 'search_many',
+        lambda self, queries, user, **kwargs: [search_results for _ in queries]
+    )
+
+
+def batch_data(num_questions):
+    return {'questions': [f"Question {i}?" for i in range(num_questions)]}
+
+
+def disconnect(response):
+    # What the WSGI server does when the client goes away mid-stream.
+    # Keep request_finished from closing the test database connection.
+    request_finished.disconnect(close_old_connections)
+    try:
+        response.close()
+    finally:
+        request_finished.connect(close_old_connections)
+
+
+def test_query_only_records_sources_that_were_packed(
+    api_client, user, settings, search_results, upstream
+):
+    # Room for two of the three chunks
+    settings.LLM_CONFIG = {**settings.LLM_CONFIG, 'MAX_CONTEXT_TOKENS': 450}
+    api_client.force_authenticate(user)
+    
+    response = api_client.post('/api/retrieval/query/', {'question': 'What is the policy?'}, format='json')
+    
+    assert response.status_code == 200
+    packed = [result['chunk'].id for result in search_results[:2]]
+    assert [source['chunk_id'] for source in response.data['sources']] == packed
+    
+    query = Query.objects.get(id=response.data['query_id'])
+    assert list(
+        QuerySource.objects.filter(query=query).order_by('rank').values_list('chunk_id', flat=True)
+    ) == packed
+    assert query.num_chunks_retrieved == 3
+    assert "Passage 10." not in upstream[0]
+    # The prompt cites each passage by the rank it is returned with
+    for source in response.data['sources']:
+        assert f"[Source {source['rank']}: {source['document_title']}]\n{source['text']}" in upstream[0]
+
+
+def stream_batch(user, num_questions):
+    # Called directly: the test client closes streamed responses itself
+    request = APIRequestFactory().post('/api/retrieval/query/batch/', batch_data(num_questions), format='json')
+    force_authenticate(request, user)
+    return QueryBatchView.as_view()(request)
+
+
+def test_batch_records_answers_when_client_disconnects(batch_search, user, slow_upstream):
+    response = stream_batch(user, 4)
+    lines = iter(response.streaming_content)
+    
+    first = json.loads(next(lines))
+    assert first['type'] == 'result'
+    
+    disconnect(response)
+    
+    # The answer being generated at the time is finished and kept, the
+    # questions not yet started are dropped
+    assert len(slow_upstream) == 2
+    queries = Query.objects.filter(user=user)
+    assert queries.count() == 2
+    assert all(query.tokens_used == 42 for query in queries)
+    assert QuerySource.objects.filter(query__user=user).exists()
+
+
+def test_batch_records_all_answers(api_client, batch_search, user, upstream):
+    api_client.force_authenticate(user)
+    response = api_client.post('/api/retrieval/query/batch/', batch_data(3), format='json')
+    lines = [json.loads(line) for line in response.streaming_content]
+    
+    assert [line['type'] for line in lines] == ['result', 'result', 'result', 'summary']
+    assert lines[-1]['num_answered'] == 3
+    assert Query.objects.filter(user=user).count() == 3
+
+
+def test_batch_quota_only_charges_answers_when_client_disconnects(batch_search, user, slow_upstream):
+    response = stream_batch(user, 4)
+    next(iter(response.streaming_content))
+    
+    disconnect(response)
+    
+    assert QueryQuota(user).used_today() == 2
+
+
+def test_batch_quota_is_released_when_recording_fails(batch_search, user, slow_upstream, monkeypatch):
+    def fail(*args, **kwargs):
+        raise RuntimeError("database went away")
+    
+    monkeypatch.setattr(QueryBatchView, '_record_batch', fail)
+    response = stream_batch(user, 4)
+    next(iter(response.streaming_content))
+    
+    disconnect(response)
+    
+    assert QueryQuota(user).used_today() == 2
+
+
+@pytest.fixture
+def history(user):
+    # A full page of queries with five sources each
+    chunks = DocumentChunkFactory.create_batch(5, version=DocumentVersionFactory())
+    queries = QueryFactory.create_batch(20, user=user)
+    for query in queries:
+        for rank, chunk in enumerate(chunks, 1):
+            QuerySourceFactory(query=query, chunk=chunk, rank=rank)
+    return queries
+
+
+def test_history_queries(api_client, user, history, django_assert_num_queries):
+    api_client.force_authenticate(user)
+    
+    # Count, page, and every source with its chunk, version and document
+    with django_assert_num_queries(3) as captured:
+        response = api_client.get('/api/retrieval/queries/')
+    
+    assert response.status_code == 200
+    assert len(response.data['results']) == 20
+    assert all(len(query['sources']) == 5 for query in response.data['results'])
+    assert not any('"embedding"' in query['sql'] for query in captured.captured_queries)
+
+
+def test_query_detail_queries(api_client, user, history, django_assert_num_queries):
+    api_client.force_authenticate(user)
+    
+    with django_assert_num_queries(2) as captured:
+        response = api_client.get(f'/api/retrieval/queries/{history[0].id}/')
+    
+    assert response.status_code == 200
+    assert len(response.data['sources']) == 5
+    assert not any('"embedding"' in query['sql'] for query in captured.captured_queries)
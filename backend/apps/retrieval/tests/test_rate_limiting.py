@@ -0,0 +1,77 @@
+import time
+import uuid
+import pytest
+import requests
+
+from apps.core.exceptions import UpstreamRateLimited
+from apps.retrieval.rate_limiting import HFRateLimiter, background_calls
+
+
+@pytest.fixture
+def limiter(settings):
+    settings.HF_API_CONFIG = {
+        **settings.HF_API_CONFIG,
+        'MAX_RETRIES': 4,
+        'RETRY_BASE_DELAY': 0.01,
+        'SYNC_MAX_RETRIES': 1,
+        'SYNC_ACQUIRE_TIMEOUT': 0.2,
+    }
+    # Fresh Redis keys per test
+    return HFRateLimiter(f"test-{uuid.uuid4().hex}", rate=100, burst=100, latency_target_ms=10000)
+
+
+def upstream(status_code, headers=None):
+    calls = []
+    
+    def request():
+        calls.append(status_code)
+        response = requests.Response()
+        response.status_code = status_code
+        response.headers.update(headers or {})
+        return response
+    
+    return request, calls
+
+
+def test_request_calls_retry_once_then_return_the_busy_response(limiter):
+    request, calls = upstream(503)
+    
+    response = limiter.send(request)
+    
+    assert response.status_code == 503
+    assert len(calls) == 2
+
+
+def test_request_calls_do_not_wait_out_a_long_retry_after(limiter):
+    request, calls = upstream(429, {'Retry-After': '20'})
+    
+    started = time.monotonic()
+    response = limiter.send(request)
+    
+    assert response.status_code == 429
+    assert len(calls) == 1
+    assert time.monotonic() - started < 1
+    assert limiter.retry_after_seconds(response) == 20
+
+
+def test_request_calls_give_up_on_a_slot_after_the_sync_acquire_timeout(limiter):
+    limiter._cooldown(20)
+    request, calls = upstream(200)
+    
+    started = time.monotonic()
+    with pytest.raises(UpstreamRateLimited) as excinfo:
+        limiter.send(request)
+    
+    assert calls == []
+    assert time.monotonic() - started < 1
+    assert excinfo.value.retry_after > 0
+
+
+def test_background_calls_keep_the_full_retry_budget(limiter):
+    request, calls = upstream(503)
+    
+    with background_calls():
+        response = limiter.send(request)
+    
+    assert response.status_code == 503
+    assert len(calls) == 5
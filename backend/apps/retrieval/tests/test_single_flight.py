@@ -0,0 +1,194 @@
+import json
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+
+from apps.core.exceptions import LLMServiceError, UpstreamRateLimited, CircuitOpenError
+from apps.core.redis_client import get_redis
+from apps.retrieval.services import GenerationServiceHF
+from apps.retrieval.single_flight import SingleFlight
+
+CALLERS = 4
+
+
+def wait_for_followers(channels, count, timeout=5):
+    # Hold the leader until everyone else is waiting on its result
+    client = get_redis()
+    deadline = time.monotonic() + timeout
+    while sum(
+        subscribers for _, subscribers in client.pubsub_numsub(*client.pubsub_channels(channels))
+    ) < count:
+        assert time.monotonic() < deadline, "followers never subscribed"
+        time.sleep(0.01)
+
+
+def call_concurrently(fn, callers=CALLERS, **options):
+    """
+    Run the same single-flight call from `callers` threads. Returns each
+    caller's result or exception, and how many times fn actually ran.
+    """
+    key = uuid.uuid4().hex
+    channel = f"singleflight:test:{key}"
+    calls = []
+    
+    def leader_fn():
+        calls.append(key)
+        wait_for_followers(channel, callers - 1)
+        return fn()
+    
+    def call():
+        try:
+            return SingleFlight('test', **options).do(key, leader_fn)
+        except Exception as e:
+            return e
+    
+    with ThreadPoolExecutor(max_workers=callers) as executor:
+        outcomes = list(executor.map(lambda _: call(), range(callers)))
+    return outcomes, len(calls)
+
+
+def test_followers_share_the_leader_result():
+    outcomes, num_calls = call_concurrently(lambda: ["The answer.", 42])
+    
+    assert num_calls == 1
+    assert outcomes == [["The answer.", 42]] * CALLERS
+
+
+@pytest.mark.parametrize('error', [UpstreamRateLimited, CircuitOpenError])
+def test_followers_reraise_upstream_busy_errors_with_retry_after(error):
+    def fn():
+        raise error("Upstream busy", retry_after=30)
+    
+    outcomes, num_calls = call_concurrently(fn)
+    
+    assert num_calls == 1
+    for outcome in outcomes:
+        assert type(outcome) is error
+        assert outcome.retry_after == 30
+
+
+def test_followers_get_other_leader_errors_as_llm_service_error():
+    def fn():
+        raise ValueError("Unexpected response")
+    
+    outcomes, num_calls = call_concurrently(fn)
+    
+    assert num_calls == 1
+    assert sum(isinstance(outcome, ValueError) for outcome in outcomes) == 1
+    followers = [outcome for outcome in outcomes if not isinstance(outcome, ValueError)]
+    assert all(type(outcome) is LLMServiceError for outcome in followers)
+    assert all(str(outcome) == "Unexpected response" for outcome in followers)
+
+
+def test_slow_leader_keeps_its_lock():
+    def fn():
+        # Outlive the lock TTL several times over
+        time.sleep(3.5)
+        return "The answer."
+    
+    outcomes, num_calls = call_concurrently(fn, lock_ttl=1)
+    
+    assert num_calls == 1
+    assert outcomes == ["The answer."] * CALLERS
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    """
+    Local HTTP server standing in for the chat completions API. It holds
+    the first request until the other callers are waiting on it and counts
+    the requests that actually reach it. Set `status`/`headers` to make it
+    fail.
+    """
+    class Upstream:
+        calls = []
+        status = 200
+        headers = {}
+    
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+            Upstream.calls.append(body['messages'][-1]['content'])
+            wait_for_followers('singleflight:generation:*', CALLERS - 1)
+            
+            if Upstream.status == 200:
+                payload = {
+                    'choices': [{'message': {'content': "Parental leave is 16 weeks [Source 1]."}}],
+                    'usage': {'total_tokens': 42},
+                }
+            else:
+                payload = {'error': "Rate limit reached"}
+            data = json.dumps(payload).encode('utf-8')
+            
+            self.send_response(Upstream.status)
+            for name, value in Upstream.headers.items():
+                self.send_header(name, value)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        
+        def log_message(self, *args):
+            pass
+    
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    
+    init = GenerationServiceHF.__init__
+    
+    def init_against_stub(self):
+        init(self)
+        self.api_url = f"http://127.0.0.1:{server.server_port}/v1/chat/completions"
+    
+    monkeypatch.setattr(GenerationServiceHF, '__init__', init_against_stub)
+    monkeypatch.setenv('NO_PROXY', '127.0.0.1')
+    yield Upstream
+    
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+def generate_concurrently(settings):
+    settings.LLM_CONFIG = {**settings.LLM_CONFIG, 'SINGLE_FLIGHT_ENABLED': True}
+    # A question no earlier run can have left a result behind for
+    question = f"How long is parental leave? ({uuid.uuid4().hex})"
+    chunks = [{
+        'text': "Parental leave is 16 weeks at full pay.",
+        'document_title': "Leave policy",
+        'version_number': 1,
+        'chunk_index': 0,
+        'similarity_score': 0.9,
+    }]
+    
+    def generate():
+        try:
+            return GenerationServiceHF().generate_answer(question, chunks)[:2]
+        except Exception as e:
+            return e
+    
+    with ThreadPoolExecutor(max_workers=CALLERS) as executor:
+        return list(executor.map(lambda _: generate(), range(CALLERS)))
+
+
+def test_identical_generate_calls_make_one_upstream_request(settings, upstream):
+    outcomes = generate_concurrently(settings)
+    
+    assert len(upstream.calls) == 1
+    assert outcomes == [("Parental leave is 16 weeks [Source 1].", 42)] * CALLERS
+
+
+def test_identical_generate_calls_share_the_upstream_error(settings, upstream):
+    upstream.status = 429
+    upstream.headers = {'Retry-After': '12'}
+    
+    outcomes = generate_concurrently(settings)
+    
+    assert len(upstream.calls) == 1
+    for outcome in outcomes:
+        assert type(outcome) is UpstreamRateLimited
+        assert outcome.retry_after == 12
@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+
+from apps.documents.tests.factories import DocumentChunkFactory, random_embedding
+from apps.retrieval.vector_search import VectorSearchService
+
+pytestmark = pytest.mark.django_db
+
+
+def near(embedding, rng, noise):
+    vector = np.asarray(embedding) + noise * np.asarray(random_embedding(rng))
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+def test_hybrid_search_applies_similarity_threshold_to_keyword_hits(user, settings):
+    settings.VECTOR_SEARCH_CONFIG = {**settings.VECTOR_SEARCH_CONFIG, 'SIMILARITY_THRESHOLD': 0.7}
+    rng = np.random.default_rng(7)
+    query = random_embedding(rng)
+    
+    similar = DocumentChunkFactory(text="Annual leave carries over.", embedding=near(query, rng, 0.3))
+    similar_match = DocumentChunkFactory(text="Parental leave is 16 weeks.", embedding=near(query, rng, 0.3))
+    # Matches the keywords but is about something else entirely
+    DocumentChunkFactory(text="Parental leave forms are in the portal.", embedding=random_embedding(rng))
+    
+    results = VectorSearchService().search_by_embedding(
+        query, user, neighbor_window=0, keyword_query='parental leave', rerank=False
+    )
+    
+    assert [result['chunk'].id for result in results] == [similar_match.id, similar.id]
+    assert all(result['similarity_score'] >= 0.7 for result in results)
@@ -0,0 +1,160 @@
+import logging
+import numpy as np
+import pytest
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+
+from apps.documents.models import DocumentChunk
+from apps.documents.tests.factories import (
+    DocumentVersionFactory,
+    DocumentChunkFactory,
+    random_embedding
+)
+from apps.retrieval.vector_stores import BaseVectorStore, PgVectorStore, get_vector_store
+
+pytestmark = pytest.mark.django_db
+
+TOP_K = 10
+
+
+@pytest.fixture
+def corpus():
+    """
+    1000 Engineering chunks and 40 HR chunks, so a department='HR' filter
+    keeps about 4% of what the HNSW index returns.
+    """
+    rng = np.random.default_rng(42)
+    chunks = []
+    for department, count in (('Engineering', 1000), ('HR', 40)):
+        version = DocumentVersionFactory(document__department=department)
+        chunks.extend(
+            DocumentChunkFactory.build(
+                version=version,
+                chunk_index=index,
+                embedding=random_embedding(rng)
+            )
+            for index in range(count)
+        )
+    DocumentChunk.objects.bulk_create(chunks, batch_size=500)
+    
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE document_chunks")
+    return rng
+
+
+@pytest.fixture
+def store_settings(settings):
+    settings.VECTOR_SEARCH_CONFIG = {
+        **settings.VECTOR_SEARCH_CONFIG,
+        'CHUNK_COUNT_CACHE_SECONDS': 0,
+        'EXACT_SCAN_THRESHOLD': 20,
+        'HNSW_EF_SEARCH': 40,
+        'HNSW_MAX_EF_SEARCH': 1000,
+        'HNSW_ITERATIVE_SCAN': '',
+        'RESCORE_MULTIPLIER': 4,
+    }
+    return settings
+
+
+def exact_top_k(query, department, k):
+    chunks = list(DocumentChunk.objects.with_embeddings().filter(department=department))
+    scores = np.array([chunk.embedding for chunk in chunks]) @ np.asarray(query)
+    return [chunks[i].id for i in np.argsort(-scores)[:k]]
+
+
+def force_hnsw_scan():
+    # The test table is small enough that the planner would rather sort
+    # the 40 filtered rows; make it walk the HNSW index as on a large table
+    with connection.cursor() as cursor:
+        cursor.execute("SET LOCAL enable_seqscan = off")
+        cursor.execute("SET LOCAL enable_sort = off")
+
+
+@pytest.mark.parametrize('quantization', ['halfvec', 'binary'])
+def test_restrictive_filter_widens_ef_search_to_fill_top_k(
+    corpus, store_settings, quantization, caplog
+):
+    store_settings.VECTOR_SEARCH_CONFIG['INDEX_QUANTIZATION'] = quantization
+    store = PgVectorStore()
+    query = random_embedding(corpus)
+    force_hnsw_scan()
+    
+    with caplog.at_level(logging.DEBUG, logger='apps.retrieval.vector_stores'):
+        hits = store.search(query, TOP_K, department='HR')
+    
+    assert len(hits) == TOP_K
+    assert "ef_search=40)" not in caplog.text, "filter should have forced a wider scan"
+    
+    hr_ids = set(DocumentChunk.objects.filter(department='HR').values_list('id', flat=True))
+    assert {chunk_id for chunk_id, _ in hits} <= hr_ids
+    
+    similarities = [similarity for _, similarity in hits]
+    assert similarities == sorted(similarities, reverse=True)
+
+
+def test_restrictive_filter_recall(corpus, store_settings):
+    # Binary codes of random vectors say little about cosine order, so
+    # recall is only checked for the default halfvec index
+    store_settings.VECTOR_SEARCH_CONFIG['INDEX_QUANTIZATION'] = 'halfvec'
+    store = PgVectorStore()
+    force_hnsw_scan()
+    
+    recalls = []
+    for _ in range(5):
+        query = random_embedding(corpus)
+        hits = {chunk_id for chunk_id, _ in store.search(query, TOP_K, department='HR')}
+        recalls.append(len(hits & set(exact_top_k(query, 'HR', TOP_K))) / TOP_K)
+    
+    assert np.mean(recalls) >= 0.9
+
+
+def test_small_filtered_set_uses_exact_scan(corpus, store_settings):
+    store_settings.VECTOR_SEARCH_CONFIG['EXACT_SCAN_THRESHOLD'] = 100
+    store = PgVectorStore()
+    query = random_embedding(corpus)
+    
+    hits = store.search(query, TOP_K, department='HR')
+    
+    assert [chunk_id for chunk_id, _ in hits] == exact_top_k(query, 'HR', TOP_K)
+
+
+def test_unknown_quantization_is_rejected(store_settings):
+    # There is no full-precision HNSW index to fall back on
+    store_settings.VECTOR_SEARCH_CONFIG['INDEX_QUANTIZATION'] = 'none'
+    
+    with pytest.raises(ImproperlyConfigured):
+        PgVectorStore()
+
+
+def test_incomplete_backend_fails_on_instantiation():
+    class SearchOnlyStore(BaseVectorStore):
+        def search(self, query_embedding, top_k, department=None):
+            return []
+    
+    with pytest.raises(TypeError):
+        SearchOnlyStore()
+
+
+def test_in_memory_store_is_not_a_configurable_backend():
+    # It persists nothing, so ingestion through it would lose every chunk
+    with pytest.raises(ImportError):
+        get_vector_store('memory')
+
+
+def current_setting(name):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT current_setting(%s, true)", [name])
+        return cursor.fetchone()[0]
+
+
+@pytest.mark.parametrize('name', ['hnsw.ef_search', 'retrieval_tests.never_set'])
+def test_planner_settings_do_not_outlive_the_search(store_settings, name):
+    # Runs inside the test transaction, like a search in a request's
+    # write block: nothing may leak into the rest of it
+    before = current_setting(name)
+    
+    with PgVectorStore()._pg_settings(**{name: 123}):
+        assert current_setting(name) == '123'
+    
+    # A placeholder reset to its default reads as '' rather than NULL
+    assert (current_setting(name) or None) == before
@@ -1,6 +1,9 @@
 from django.urls import path
 from .views import (
     QueryView,
+    QueryBatchView,
+    SearchView,
+    UpstreamStatusView,
     QueryHistoryView,
     QueryDetailView,
     FeedbackCreateView,
@@ -12,6 +15,9 @@ app_name = 'retrieval'
 
 urlpatterns = [
     path('query/', QueryView.as_view(), name='query'),
+    path('query/batch/', QueryBatchView.as_view(), name='query-batch'),
+    path('search/', SearchView.as_view(), name='search'),
+    path('upstream/status/', UpstreamStatusView.as_view(), name='upstream-status'),
     path('queries/', QueryHistoryView.as_view(), name='query-history'),
     path('queries/<int:pk>/', QueryDetailView.as_view(), name='query-detail'),
     
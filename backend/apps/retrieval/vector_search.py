@@ -1,62 +1,171 @@
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Tuple
+import numpy as np
 from django.conf import settings
-from django.db.models import F
+from django.db import connection
+from django.db.models import Q
+from django.contrib.postgres.search import SearchQuery, SearchRank
 from pgvector.django import CosineDistance
 
-from apps.documents.models import DocumentChunk, DocumentStatus
-from .services import EmbeddingService
+from apps.documents.models import DocumentChunk, DocumentStatus, chunk_search_vector
+from .services import get_embedding_service
+from .micro_batching import get_query_batcher
+from .vector_stores import get_vector_store
 
 logger = logging.getLogger(__name__)
 
+# Reciprocal Rank Fusion constant, as in the original RRF paper
+RRF_K = 60
+
 
 class VectorSearchService:
  
     def __init__(self):
-        self.embedding_service = EmbeddingService()
+        self.embedding_service = get_embedding_service()
         self.top_k = settings.VECTOR_SEARCH_CONFIG['TOP_K_RESULTS']
         self.similarity_threshold = settings.VECTOR_SEARCH_CONFIG['SIMILARITY_THRESHOLD']
+        self.mmr_lambda = settings.VECTOR_SEARCH_CONFIG['MMR_LAMBDA']
+        self.mmr_candidates = settings.VECTOR_SEARCH_CONFIG['MMR_CANDIDATES']
+        self.neighbor_window = settings.VECTOR_SEARCH_CONFIG['NEIGHBOR_WINDOW']
+        self.store = get_vector_store()
     
     def search(
         self,
         query: str,
         user,
         top_k: int = None,
-        department: str = None
+        department: str = None,
+        neighbor_window: int = None,
+        hybrid: bool = False,
+        rerank: bool = True
+    ) -> List[Dict]:
+        
+        #embedding for query
+        logger.info(f"Generating embedding for query: {query[:100]}")
+        query_embedding = self.embed_query(query)
+        
+        return self.search_by_embedding(
+            query_embedding, user, top_k, department, neighbor_window,
+            keyword_query=query if hybrid else None,
+            rerank=rerank
+        )
+    
+    def embed_query(self, query: str) -> List[float]:
+        """
+        Embed one query. Concurrent queries in this process are batched
+        into a single embedding call when QUERY_BATCHING is on.
+        """
+        if settings.LLM_CONFIG['QUERY_BATCHING']:
+            return get_query_batcher().embed(query)
+        return self.embedding_service.generate_embeddings([query])[0]
+    
+    def search_many(
+        self,
+        queries: List[str],
+        user,
+        top_k: int = None,
+        department: str = None,
+        max_workers: int = 4
+    ) -> List[List[Dict]]:
+        """
+        Search several queries with one embedding request. Searches run
+        on up to max_workers threads; results come back in query order.
+        """
+        if not queries:
+            return []
+        
+        logger.info(f"Generating embeddings for {len(queries)} queries")
+        embeddings = self.embedding_service.generate_embeddings(queries)
+        
+        # One slice per thread so each opens and closes a single connection
+        workers = max(1, min(max_workers, len(queries)))
+        slices = [list(range(len(queries)))[i::workers] for i in range(workers)]
+        
+        def run(indexes):
+            try:
+                return [
+                    (i, self.search_by_embedding(embeddings[i], user, top_k, department))
+                    for i in indexes
+                ]
+            finally:
+                connection.close()
+        
+        results = [None] * len(queries)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for batch in executor.map(run, slices):
+                for i, search_results in batch:
+                    results[i] = search_results
+        
+        return results
+    
+    def search_by_embedding(
+        self,
+        query_embedding,
+        user,
+        top_k: int = None,
+        department: str = None,
+        neighbor_window: int = None,
+        keyword_query: str = None,
+        rerank: bool = True
     ) -> List[Dict]:
+        """
+        keyword_query turns on hybrid search: full-text matches are fused
+        with the vector hits by Reciprocal Rank Fusion. rerank=False skips
+        MMR and returns plain similarity order.
+        """
         
         if top_k is None:
             top_k = self.top_k
+        if neighbor_window is None:
+            neighbor_window = self.neighbor_window
         
-        #embedding for query
-        logger.info(f"Generating embedding for query: {query[:100]}")
-        query_embedding = self.embedding_service.generate_embeddings([query])[0]
+        # Vector similarity, get extra to filter by threshold and diversify
+        pool_size = max(top_k * 2, self.mmr_candidates)
+        hits = self.store.search(query_embedding, pool_size, department)
+        
+        # Load the rows through the permission queryset, which also drops
+        # anything an out-of-process index hasn't caught up with yet
+        chunks_by_id = self._get_accessible_chunks(user, department).with_embeddings().in_bulk(
+            [chunk_id for chunk_id, _ in hits]
+        )
         
-        #base queryset with permission
-        chunks = self._get_accessible_chunks(user, department)
+        results = []
+        for chunk_id, similarity in hits:
+            chunk = chunks_by_id.get(chunk_id)
+            if chunk is not None:
+                chunk.distance = 1 - similarity
+                results.append(chunk)
         
-        if not chunks.exists():
+        results = [
+            chunk for chunk in results
+            if 1 - chunk.distance >= self.similarity_threshold
+        ]
+        
+        relevance = None
+        if keyword_query:
+            keyword_hits = self._keyword_search(
+                keyword_query, query_embedding, user, department, pool_size
+            )
+            results, relevance = self._fuse(results, keyword_hits)
+        
+        if not results:
             logger.warning(f"No accessible chunks found for user {user.username}")
             return []
         
-        # Vector similarity
-        results = chunks.annotate(
-            distance=CosineDistance('embedding', query_embedding)
-        ).order_by('distance')[:top_k * 2]  # Get extra to filter by threshold
+        if rerank and len(results) > top_k and self.mmr_lambda < 1:
+            results = self._mmr_select(results, top_k, relevance)
         
         search_results = []
         for chunk in results:
             similarity_score = 1 - chunk.distance
             
-            if similarity_score < self.similarity_threshold:
-                continue
-            
             search_results.append({
                 'chunk': chunk,
                 'similarity_score': round(similarity_score, 4),
                 'text': chunk.text,
-                'document_title': chunk.document.title,
-                'version_number': chunk.version.version_number,
+                'document_title': chunk.document_title,
+                'version_number': chunk.version_number,
                 'chunk_index': chunk.chunk_index,
                 'metadata': chunk.metadata
             })
@@ -69,20 +178,138 @@ class VectorSearchService:
             f"({self.similarity_threshold}) for query"
         )
         
+        if neighbor_window > 0:
+            self.expand_neighbors(search_results, neighbor_window)
+        
         return search_results
     
+    def expand_neighbors(self, search_results: List[Dict], window: int) -> List[Dict]:
+        """
+        Attach the chunks up to `window` positions before and after each hit
+        (same version) as result['neighbors'], closest first. All hits are
+        resolved in one query on the (version, chunk_index) index. The
+        context packer merges them into contiguous passages as budget allows.
+        """
+        if not search_results:
+            return search_results
+        
+        ranges = Q()
+        for result in search_results:
+            chunk = result['chunk']
+            ranges |= Q(
+                version_id=chunk.version_id,
+                chunk_index__range=(chunk.chunk_index - window, chunk.chunk_index + window)
+            )
+        
+        hit_ids = {result['chunk'].id for result in search_results}
+        neighbors = {
+            (chunk.version_id, chunk.chunk_index): chunk
+            for chunk in DocumentChunk.objects.filter(ranges).exclude(id__in=hit_ids)
+        }
+        
+        for result in search_results:
+            hit = result['chunk']
+            result['neighbors'] = []
+            for offset in sorted(range(-window, window + 1), key=abs):
+                chunk = neighbors.get((hit.version_id, hit.chunk_index + offset))
+                if offset == 0 or chunk is None:
+                    continue
+                result['neighbors'].append({
+                    'chunk': chunk,
+                    'similarity_score': result['similarity_score'],
+                    'text': chunk.text,
+                    'document_title': chunk.document_title,
+                    'version_number': chunk.version_number,
+                    'chunk_index': chunk.chunk_index,
+                    'metadata': chunk.metadata
+                })
+        
+        return search_results
+    
+    def _keyword_search(self, keyword_query, query_embedding, user, department, limit):
+        # Full-text side of hybrid search, served by chunk_text_search_idx.
+        # Distance is annotated so keyword-only hits still get a similarity,
+        # and are held to the same similarity threshold as vector hits.
+        search_query = SearchQuery(keyword_query, config='english', search_type='websearch')
+        
+        return list(
+            self._get_accessible_chunks(user, department)
+            .with_embeddings()
+            .annotate(search=chunk_search_vector())
+            .filter(search=search_query)
+            .annotate(
+                keyword_rank=SearchRank(chunk_search_vector(), search_query),
+                distance=CosineDistance('embedding', query_embedding)
+            )
+            .filter(distance__lte=1 - self.similarity_threshold)
+            .order_by('-keyword_rank')[:limit]
+        )
+    
+    def _fuse(self, vector_hits, keyword_hits):
+        """
+        Reciprocal Rank Fusion of two best-first chunk lists. Returns the
+        fused list and its scores scaled to [0, 1] for MMR.
+        """
+        scores = {}
+        chunks = {}
+        for ranking in (vector_hits, keyword_hits):
+            for rank, chunk in enumerate(ranking, 1):
+                scores[chunk.id] = scores.get(chunk.id, 0.0) + 1.0 / (RRF_K + rank)
+                chunks.setdefault(chunk.id, chunk)
+        
+        if not scores:
+            return [], None
+        
+        order = sorted(scores, key=scores.get, reverse=True)
+        fused = np.array([scores[chunk_id] for chunk_id in order], dtype=np.float32)
+        return [chunks[chunk_id] for chunk_id in order], fused / fused[0]
+    
+    def _mmr_select(
+        self,
+        chunks: List[DocumentChunk],
+        top_k: int,
+        relevance: np.ndarray = None
+    ) -> List[DocumentChunk]:
+        """
+        Maximal Marginal Relevance: greedily pick the chunk that maximises
+        lambda * relevance - (1 - lambda) * max similarity to what is already
+        picked, so overlapping or boilerplate chunks don't crowd out the rest.
+        Chunks must be sorted best first and carry their embeddings.
+        Relevance defaults to cosine similarity to the query.
+        """
+        embeddings = np.array([chunk.embedding for chunk in chunks], dtype=np.float32)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        embeddings /= np.where(norms == 0, 1, norms)
+        
+        if relevance is None:
+            relevance = np.array([1 - chunk.distance for chunk in chunks], dtype=np.float32)
+        pairwise = embeddings @ embeddings.T
+        
+        selected = [0]
+        max_similarity = pairwise[0].copy()
+        available = np.ones(len(chunks), dtype=bool)
+        available[0] = False
+        
+        while len(selected) < top_k:
+            scores = self.mmr_lambda * relevance - (1 - self.mmr_lambda) * max_similarity
+            scores[~available] = -np.inf
+            best = int(np.argmax(scores))
+            
+            selected.append(best)
+            available[best] = False
+            np.maximum(max_similarity, pairwise[best], out=max_similarity)
+        
+        return [chunks[i] for i in selected]
+    
     def _get_accessible_chunks(self, user, department=None): 
-        chunks = DocumentChunk.objects.select_related(
-            'version',
-            'version__document',
-            'version__document__owner'
-        ).filter(
-            version__document__status=DocumentStatus.APPROVED,
-            version__processing_status='READY'
+        # Filters use the denormalized chunk columns, no joins needed
+        chunks = DocumentChunk.objects.filter(
+            document_status=DocumentStatus.APPROVED,
+            is_current=True
         )
         
         if department:
-            chunks = chunks.filter(version__document__department=department)
+            chunks = chunks.filter(department=department)
         
         return chunks
     
@@ -0,0 +1,415 @@
+"""
+Vector store backends.
+
+A vector store owns chunk embeddings and answers filtered top-k queries.
+Every backend implements the same small interface so ingestion
+(save_chunks_to_db) and VectorSearchService never talk to an index engine
+directly:
+
+- upsert(chunks): persist new DocumentChunk objects and make them indexable
+- delete_version(version_id): drop every chunk of a version
+- update_document(...): apply status/title/department/current-version changes
+- search(embedding, top_k, department): (chunk_id, similarity) pairs, best first
+- stats(): size and memory figures for benchmarking
+
+Only chunks of approved documents' current versions are searchable.
+
+Backends are selected with VECTOR_SEARCH_CONFIG['BACKEND']: 'pgvector'
+(default), 'numpy', or a dotted path to a BaseVectorStore subclass.
+Run `manage.py benchmark_vector_store` to check a backend for conformance and
+measure recall@k, QPS and memory; it also runs InMemoryVectorStore, the
+reference implementation, which is not selectable as a backend.
+"""
+
+import logging
+import itertools
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import List, Dict, Tuple
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, transaction
+from django.utils.module_loading import import_string
+from pgvector import HalfVector
+from pgvector.django import CosineDistance, HammingDistance
+
+from apps.documents.models import (
+    DocumentChunk,
+    DocumentStatus,
+    embedding_as_halfvec,
+    embedding_as_bits
+)
+
+logger = logging.getLogger(__name__)
+
+
+class BaseVectorStore(ABC):
+
+    name = 'base'
+    
+    @abstractmethod
+    def upsert(self, chunks: List[DocumentChunk]) -> List[DocumentChunk]:
+        ...
+    
+    @abstractmethod
+    def delete_version(self, version_id: int) -> int:
+        ...
+    
+    @abstractmethod
+    def update_document(
+        self,
+        document_id: int,
+        status: str,
+        title: str,
+        department: str,
+        current_version_id: int = None
+    ):
+        ...
+    
+    @abstractmethod
+    def search(
+        self,
+        query_embedding,
+        top_k: int,
+        department: str = None
+    ) -> List[Tuple[int, float]]:
+        ...
+    
+    @abstractmethod
+    def stats(self) -> Dict:
+        ...
+
+
+class PgVectorStore(BaseVectorStore):
+    """
+    Default backend: embeddings live on document_chunks and are searched
+    through the pgvector HNSW indexes.
+    """
+    
+    name = 'pgvector'
+    
+    # Compact indexes the migrations create (there is no full-precision one)
+    QUANTIZATIONS = ('halfvec', 'binary')
+    
+    def __init__(self):
+        self.exact_scan_threshold = settings.VECTOR_SEARCH_CONFIG['EXACT_SCAN_THRESHOLD']
+        self.count_cache_seconds = settings.VECTOR_SEARCH_CONFIG['CHUNK_COUNT_CACHE_SECONDS']
+        self.ef_search = settings.VECTOR_SEARCH_CONFIG['HNSW_EF_SEARCH']
+        self.max_ef_search = settings.VECTOR_SEARCH_CONFIG['HNSW_MAX_EF_SEARCH']
+        self.iterative_scan = settings.VECTOR_SEARCH_CONFIG['HNSW_ITERATIVE_SCAN']
+        self.quantization = settings.VECTOR_SEARCH_CONFIG['INDEX_QUANTIZATION']
+        self.rescore_multiplier = settings.VECTOR_SEARCH_CONFIG['RESCORE_MULTIPLIER']
+        
+        if self.quantization not in self.QUANTIZATIONS:
+            raise ImproperlyConfigured(
+                f"INDEX_QUANTIZATION must be one of {', '.join(self.QUANTIZATIONS)}, "
+                f"got {self.quantization!r}"
+            )
+    
+    def upsert(self, chunks: List[DocumentChunk]) -> List[DocumentChunk]:
+        return DocumentChunk.objects.bulk_create(chunks)
+    
+    def delete_version(self, version_id: int) -> int:
+        deleted, _ = DocumentChunk.objects.filter(version_id=version_id).delete()
+        return deleted
+    
+    def update_document(
+        self,
+        document_id: int,
+        status: str,
+        title: str,
+        department: str,
+        current_version_id: int = None
+    ):
+        chunks = DocumentChunk.objects.filter(version__document_id=document_id)
+        
+        chunks.update(
+            document_status=status,
+            document_title=title,
+            department=department
+        )
+        
+        chunks.exclude(version_id=current_version_id).filter(is_current=True).update(is_current=False)
+        if current_version_id:
+            chunks.filter(version_id=current_version_id, is_current=False).update(is_current=True)
+    
+    def search(
+        self,
+        query_embedding,
+        top_k: int,
+        department: str = None
+    ) -> List[Tuple[int, float]]:
+        chunks = DocumentChunk.objects.filter(
+            document_status=DocumentStatus.APPROVED,
+            is_current=True
+        )
+        if department:
+            chunks = chunks.filter(department=department)
+        
+        rows = self._filtered_search(chunks, query_embedding, top_k, department)
+        return [(chunk_id, 1 - distance) for chunk_id, distance in rows]
+    
+    def stats(self) -> Dict:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT pg_table_size('document_chunks'), pg_indexes_size('document_chunks')"
+            )
+            table_bytes, index_bytes = cursor.fetchone()
+        
+        return {
+            'backend': self.name,
+            'vectors': DocumentChunk.objects.count(),
+            'table_bytes': table_bytes,
+            'index_bytes': index_bytes,
+            'bytes': index_bytes,
+        }
+    
+    def _filtered_search(self, chunks, query_embedding, limit: int, department: str = None) -> list:
+        """
+        Pick a scan strategy based on how many chunks pass the filter.
+        
+        - Small filtered sets: exact scan over the filtered rows. An HNSW scan
+          would visit mostly non-matching neighbours and return too few rows.
+        - Large filtered sets: HNSW index scan, widening ef_search until
+          enough rows survive the filter.
+        """
+        filtered_count = self._get_filtered_chunk_count(chunks, department)
+        
+        if filtered_count <= self.exact_scan_threshold:
+            logger.debug(f"Exact scan over {filtered_count} chunks")
+            ordered = chunks.annotate(
+                distance=CosineDistance('embedding', query_embedding)
+            ).order_by('distance').values_list('id', 'distance')
+            with self._pg_settings(enable_indexscan='off'):
+                return list(ordered[:limit])
+        
+        ef_search = max(self.ef_search, limit * self.rescore_multiplier)
+        while True:
+            params = {'hnsw.ef_search': ef_search}
+            if self.iterative_scan:
+                params['hnsw.iterative_scan'] = self.iterative_scan
+            
+            with self._pg_settings(**params):
+                results = list(self._index_scan(chunks, query_embedding, limit))
+            
+            if len(results) >= min(limit, filtered_count) or ef_search >= self.max_ef_search:
+                logger.debug(f"HNSW scan returned {len(results)} rows (ef_search={ef_search})")
+                return results
+            
+            ef_search = min(ef_search * 2, self.max_ef_search)
+    
+    def _index_scan(self, chunks, query_embedding, limit: int):
+        """
+        Scan the compact (halfvec or binary) index for a candidate pool, then
+        rescore the candidates against the full-precision embeddings.
+        """
+        if self.quantization == 'halfvec':
+            index_distance = CosineDistance(
+                embedding_as_halfvec(),
+                HalfVector(query_embedding)
+            )
+        else:
+            index_distance = HammingDistance(
+                embedding_as_bits(),
+                ''.join('1' if value > 0 else '0' for value in query_embedding)
+            )
+        
+        candidates = chunks.annotate(
+            index_distance=index_distance
+        ).order_by('index_distance').values('id')[:limit * self.rescore_multiplier]
+        
+        return DocumentChunk.objects.filter(
+            id__in=candidates
+        ).annotate(
+            distance=CosineDistance('embedding', query_embedding)
+        ).order_by('distance').values_list('id', 'distance')[:limit]
+    
+    def _get_filtered_chunk_count(self, chunks, department: str = None) -> int:
+        # Cached per department; only used to choose a scan strategy so a
+        # slightly stale count is fine
+        if not self.count_cache_seconds:
+            return chunks.count()
+        
+        cache_key = f"vector_search:chunk_count:{department or '*'}"
+        count = cache.get(cache_key)
+        
+        if count is None:
+            count = chunks.count()
+            cache.set(cache_key, count, self.count_cache_seconds)
+        
+        return count
+    
+    @contextmanager
+    def _pg_settings(self, **params):
+        # Transaction-local planner settings, restored afterwards in case
+        # we're nested inside a longer request transaction. Settings that
+        # had no value yet (extension GUCs before first use) go back to
+        # their default rather than keeping ours until that commits.
+        with transaction.atomic():
+            previous = {}
+            with connection.cursor() as cursor:
+                for name, value in params.items():
+                    cursor.execute(
+                        "SELECT current_setting(%s, true), set_config(%s, %s, true)",
+                        [name, name, str(value)]
+                    )
+                    previous[name] = cursor.fetchone()[0]
+            try:
+                yield
+            finally:
+                with connection.cursor() as cursor:
+                    for name, value in previous.items():
+                        if value is None:
+                            # Names come from this module, never from input
+                            cursor.execute(f"SET LOCAL {name} TO DEFAULT")
+                        else:
+                            cursor.execute("SELECT set_config(%s, %s, true)", [name, value])
+
+
+class NumpyVectorStore(PgVectorStore):
+    """
+    Rows are persisted like the pgvector backend, but queries are scored
+    in-process against the memory-mapped NumpyVectorIndex.
+    """
+    
+    name = 'numpy'
+    
+    def __init__(self, index=None, refresh_async: bool = True):
+        super().__init__()
+        from .numpy_index import get_numpy_index
+        self.index = index or get_numpy_index()
+        self.refresh_async = refresh_async
+    
+    def update_document(
+        self,
+        document_id: int,
+        status: str,
+        title: str,
+        department: str,
+        current_version_id: int = None
+    ):
+        super().update_document(document_id, status, title, department, current_version_id)
+        
+        if self.refresh_async:
+            from .tasks import refresh_vector_index_task
+            transaction.on_commit(lambda: refresh_vector_index_task.delay(document_id))
+        else:
+            self.index.refresh_document(document_id)
+    
+    def search(
+        self,
+        query_embedding,
+        top_k: int,
+        department: str = None
+    ) -> List[Tuple[int, float]]:
+        return self.index.search(query_embedding, top_k, department)
+    
+    def stats(self) -> Dict:
+        return {**super().stats(), **self.index.stats(), 'backend': self.name}
+
+
+class InMemoryVectorStore(BaseVectorStore):
+    """
+    Reference implementation: exact search over a dict of normalized
+    vectors. Nothing is written to the database and every instance starts
+    empty, so it is only built by the conformance benchmark and is not in
+    VECTOR_STORES.
+    """
+    
+    name = 'memory'
+    
+    def __init__(self):
+        self._records = {}
+        self._ids = itertools.count(1)
+    
+    def upsert(self, chunks: List[DocumentChunk]) -> List[DocumentChunk]:
+        for chunk in chunks:
+            if chunk.id is None:
+                chunk.id = next(self._ids)
+            
+            vector = np.asarray(chunk.embedding, dtype=np.float32)
+            norm = np.linalg.norm(vector)
+            
+            self._records[chunk.id] = {
+                'embedding': vector / norm if norm else vector,
+                'version_id': chunk.version_id,
+                'document_id': chunk.version.document_id,
+                'department': chunk.department,
+                'searchable': chunk.document_status == DocumentStatus.APPROVED and chunk.is_current,
+            }
+        
+        return chunks
+    
+    def delete_version(self, version_id: int) -> int:
+        doomed = [
+            chunk_id for chunk_id, record in self._records.items()
+            if record['version_id'] == version_id
+        ]
+        for chunk_id in doomed:
+            del self._records[chunk_id]
+        return len(doomed)
+    
+    def update_document(
+        self,
+        document_id: int,
+        status: str,
+        title: str,
+        department: str,
+        current_version_id: int = None
+    ):
+        for record in self._records.values():
+            if record['document_id'] == document_id:
+                record['department'] = department
+                record['searchable'] = (
+                    status == DocumentStatus.APPROVED and
+                    record['version_id'] == current_version_id
+                )
+    
+    def search(
+        self,
+        query_embedding,
+        top_k: int,
+        department: str = None
+    ) -> List[Tuple[int, float]]:
+        candidates = [
+            (chunk_id, record['embedding'])
+            for chunk_id, record in self._records.items()
+            if record['searchable'] and (not department or record['department'] == department)
+        ]
+        if not candidates:
+            return []
+        
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        
+        ids = np.array([chunk_id for chunk_id, _ in candidates])
+        scores = np.stack([embedding for _, embedding in candidates]) @ query
+        order = np.argsort(-scores)[:top_k]
+        
+        return [(int(ids[i]), float(scores[i])) for i in order]
+    
+    def stats(self) -> Dict:
+        return {
+            'backend': self.name,
+            'vectors': len(self._records),
+            'bytes': sum(r['embedding'].nbytes for r in self._records.values()),
+        }
+
+
+VECTOR_STORES = {
+    'pgvector': PgVectorStore,
+    'numpy': NumpyVectorStore,
+}
+
+
+def get_vector_store(name: str = None) -> BaseVectorStore:
+    """Instantiate the configured backend (or the one named)."""
+    name = name or settings.VECTOR_SEARCH_CONFIG['BACKEND']
+    
+    if name in VECTOR_STORES:
+        return VECTOR_STORES[name]()
+    
+    # Dotted path, for experimenting with other engines
+    return import_string(name)()
@@ -1,31 +1,74 @@
 import time
+import math
+import json
 import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from rest_framework import status, generics, views
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from django.conf import settings
+from django.http import StreamingHttpResponse
 from django.utils import timezone
 from django.db import transaction
+from django.db.models import Prefetch
 
 from .models import Query, QuerySource, Feedback
 from .serializers import (
     QuerySerializer,
     QueryRequestSerializer,
+    QueryBatchRequestSerializer,
+    SearchRequestSerializer,
+    SearchResultSerializer,
     FeedbackSerializer,
     FeedbackCreateSerializer
 )
 from .vector_search import VectorSearchService
 from .services import LLMService
-from apps.core.permissions import CanQuery, IsReviewer
-from apps.core.exceptions import RateLimitExceeded
+from .circuit_breaker import get_circuit_breaker
+from .rate_limiting import get_rate_limiter
+from apps.core.permissions import CanQuery, IsReviewer, IsAdmin
+from apps.core.exceptions import RateLimitExceeded, UpstreamRateLimited, CircuitOpenError
+from apps.core.quota import QueryQuota
+from apps.core.search import trigram_search
 from apps.audit.services import AuditService
+from apps.documents.models import DocumentChunkQuerySet
+from apps.analytics.models import TokenUsage
+from apps.analytics.services import TokenUsageService
 
 logger = logging.getLogger(__name__)
 
 
+def upstream_busy_response(exc) -> Response:
+    # HF is rate limiting or its circuit breaker is open; tell the client
+    # when to come back
+    response = Response(
+        {'error': str(exc)},
+        status=status.HTTP_503_SERVICE_UNAVAILABLE
+    )
+    response['Retry-After'] = str(math.ceil(exc.retry_after or 30))
+    return response
+
+
+def quota_exceeded_response(exc) -> Response:
+    response = Response(
+        {'error': str(exc)},
+        status=status.HTTP_429_TOO_MANY_REQUESTS
+    )
+    if exc.retry_after:
+        response['Retry-After'] = str(math.ceil(exc.retry_after))
+    return response
+
+
 class QueryView(views.APIView):
     permission_classes = [IsAuthenticated, CanQuery]
     
-    @transaction.atomic
+    DEGRADED_ANSWER = (
+        "The answer service is temporarily unavailable. "
+        "These are the most relevant passages from the available documents."
+    )
+    
+    # No request-wide transaction: the HF calls can take a minute and must
+    # not hold a connection in a transaction. Only the writes are atomic.
     def post(self, request):
         # Validate request
         serializer = QueryRequestSerializer(data=request.data)
@@ -41,8 +84,13 @@ class QueryView(views.APIView):
         logger.info(f"Processing query from user {request.user.username}: {question[:100]}")
         
         start_time = time.time()
+        quota = QueryQuota(request.user)
         
         try:
+            # Charged up front so concurrent requests can't overshoot;
+            # handed back below if the question goes unanswered
+            quota.reserve()
+            
             # Vector search for chunks
             vector_search = VectorSearchService()
             search_results = vector_search.search(
@@ -53,98 +101,162 @@ class QueryView(views.APIView):
             
             if not search_results:
                 # No documents found
+                quota.release()
                 return self._handle_no_results(request.user, question)
             
             #generate answer using LLM
             llm_service = LLMService()
-            answer, tokens_used = llm_service.generate_answer(
-                question=question,
-                context_chunks=search_results
-            )
+            try:
+                answer, tokens_used, context = llm_service.generate_answer(
+                    question=question,
+                    context_chunks=search_results
+                )
+            except CircuitOpenError as e:
+                if settings.LLM_CONFIG['DEGRADED_MODE'] != 'retrieval':
+                    raise
+                quota.release()
+                return self._degraded_response(request, question, search_results, vector_search, start_time, e)
             
             #calculate stats
             response_time_ms = int((time.time() - start_time) * 1000)
             similarity_stats = vector_search.get_similarity_stats(search_results)
+            # Hits the packer dropped for budget weren't sources of the answer
+            sources_used = context.included(search_results)
             
-            #save query 
-            query = Query.objects.create(
-                user=request.user,
-                question=question,
-                answer=answer,
-                context_used=self._format_context(search_results),
-                tokens_used=tokens_used,
-                response_time_ms=response_time_ms,
-                was_successful=True,
-                num_chunks_retrieved=len(search_results),
-                avg_similarity_score=similarity_stats['avg_score']
-            )
-            
-            # save source 
-            sources = []
-            for rank, result in enumerate(search_results, 1):
-                source = QuerySource.objects.create(
+            with transaction.atomic():
+                #save query 
+                query = Query.objects.create(
+                    user=request.user,
+                    question=question,
+                    answer=answer,
+                    context_used=context.text,
+                    context_tokens=context.tokens,
+                    tokens_used=tokens_used,
+                    response_time_ms=response_time_ms,
+                    was_successful=True,
+                    num_chunks_retrieved=len(search_results),
+                    avg_similarity_score=similarity_stats['avg_score']
+                )
+                
+                # save source 
+                sources = []
+                for rank, result in enumerate(sources_used, 1):
+                    source = QuerySource.objects.create(
+                        query=query,
+                        chunk=result['chunk'],
+                        similarity_score=result['similarity_score'],
+                        rank=rank
+                    )
+                    sources.append(source)
+                
+                # Ledger insert; user totals are aggregated asynchronously
+                TokenUsageService.record(
+                    user=request.user,
+                    tokens=tokens_used,
                     query=query,
-                    chunk=result['chunk'],
-                    similarity_score=result['similarity_score'],
-                    rank=rank
+                    department=department or search_results[0]['chunk'].department,
+                    model=llm_service.model
+                )
+                
+                # log audit
+                AuditService.log_action(
+                    user=request.user,
+                    action='QUERY_EXECUTED',
+                    resource_type='Query',
+                    resource_id=query.id,
+                    details={
+                        'question_preview': question[:100],
+                        'num_sources': len(sources),
+                        'tokens_used': tokens_used,
+                        'response_time_ms': response_time_ms
+                    },
+                    request=request
                 )
-                sources.append(source)
-            
-            # update user query
-            request.user.increment_query_count()
-            request.user.add_token_usage(tokens_used)
-            
-            # log audit
-            AuditService.log_action(
-                user=request.user,
-                action='QUERY_EXECUTED',
-                resource_type='Query',
-                resource_id=query.id,
-                details={
-                    'question_preview': question[:100],
-                    'num_sources': len(sources),
-                    'tokens_used': tokens_used,
-                    'response_time_ms': response_time_ms
-                },
-                request=request
-            )
             
             # return response
             return Response({
                 'query_id': query.id,
                 'question': question,
                 'answer': answer,
-                'sources': [
-                    {
-                        'chunk_id': result['chunk'].id,
-                        'document_title': result['document_title'],
-                        'version_number': result['version_number'],
-                        'text': result['text'],
-                        'similarity_score': result['similarity_score'],
-                        'rank': rank,
-                        'metadata': result['metadata']
-                    }
-                    for rank, result in enumerate(search_results, 1)
-                ],
+                'sources': self._format_sources(sources_used),
                 'tokens_used': tokens_used,
+                'context_tokens': context.tokens,
                 'response_time_ms': response_time_ms,
                 'num_chunks_retrieved': len(search_results),
                 'avg_similarity_score': similarity_stats['avg_score']
             }, status=status.HTTP_200_OK)
         
         except RateLimitExceeded as e:
-            return Response(
-                {'error': str(e)},
-                status=status.HTTP_429_TOO_MANY_REQUESTS
-            )
+            return quota_exceeded_response(e)
+        
+        except (UpstreamRateLimited, CircuitOpenError) as e:
+            quota.release()
+            return upstream_busy_response(e)
         
         except Exception as e:
+            quota.release()
             logger.error(f"Query processing error: {str(e)}", exc_info=True)
             return Response(
                 {'error': 'An error occurred processing your query. Please try again.'},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
     
+    def _degraded_response(self, request, question, search_results, vector_search, start_time, exc):
+        # Generation is down: answer with the retrieved passages, no quota charge
+        response_time_ms = int((time.time() - start_time) * 1000)
+        similarity_stats = vector_search.get_similarity_stats(search_results)
+        
+        with transaction.atomic():
+            query = Query.objects.create(
+                user=request.user,
+                question=question,
+                answer=self.DEGRADED_ANSWER,
+                context_used="",
+                tokens_used=0,
+                response_time_ms=response_time_ms,
+                was_successful=False,
+                num_chunks_retrieved=len(search_results),
+                avg_similarity_score=similarity_stats['avg_score']
+            )
+            QuerySource.objects.bulk_create([
+                QuerySource(
+                    query=query,
+                    chunk=result['chunk'],
+                    similarity_score=result['similarity_score'],
+                    rank=rank
+                )
+                for rank, result in enumerate(search_results, 1)
+            ])
+        
+        logger.warning(f"Served degraded answer for query {query.id}: {str(exc)}")
+        
+        return Response({
+            'query_id': query.id,
+            'question': question,
+            'answer': self.DEGRADED_ANSWER,
+            'sources': self._format_sources(search_results),
+            'degraded': True,
+            'retry_after': math.ceil(exc.retry_after or 0),
+            'tokens_used': 0,
+            'response_time_ms': response_time_ms,
+            'num_chunks_retrieved': len(search_results),
+            'avg_similarity_score': similarity_stats['avg_score']
+        }, status=status.HTTP_200_OK)
+    
+    def _format_sources(self, search_results):
+        return [
+            {
+                'chunk_id': result['chunk'].id,
+                'document_title': result['document_title'],
+                'version_number': result['version_number'],
+                'text': result['text'],
+                'similarity_score': result['similarity_score'],
+                'rank': rank,
+                'metadata': result['metadata']
+            }
+            for rank, result in enumerate(search_results, 1)
+        ]
+    
     def _handle_no_results(self, user, question):
         #query for analytics
         query = Query.objects.create(
@@ -168,15 +280,400 @@ class QueryView(views.APIView):
             'response_time_ms': 0,
             'message': 'No relevant documents found. Consider uploading documents related to your question.'
         }, status=status.HTTP_200_OK)
+
+
+class QueryBatchView(views.APIView):
+    """
+    Answer many questions in one request. All questions are embedded in a
+    single call, searched concurrently and answered with bounded
+    concurrency. The response is NDJSON: one line per question as soon as
+    it completes (in completion order, keyed by `index`), then a summary
+    line with the saved query ids. Quota for the whole batch is reserved
+    up front and unanswered questions handed back at the end; Query rows
+    and usage counters are written in bulk at the end, or when the client
+    disconnects.
+    """
+    permission_classes = [IsAuthenticated, CanQuery]
+    
+    NO_RESULTS_ANSWER = "I don't have enough information to answer this question based on the available documents."
+    
+    def post(self, request):
+        serializer = QueryBatchRequestSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(
+                serializer.errors,
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        questions = serializer.validated_data['questions']
+        department = serializer.validated_data.get('department')
+        generate = serializer.validated_data['generate']
+        
+        # Reserve the whole batch up front rather than failing halfway
+        quota = QueryQuota(request.user)
+        try:
+            quota.reserve(len(questions))
+        except RateLimitExceeded as e:
+            return quota_exceeded_response(e)
+        
+        logger.info(f"Processing batch of {len(questions)} queries from user {request.user.username}")
+        
+        response = StreamingHttpResponse(
+            self._stream(request, quota, questions, department, generate),
+            content_type='application/x-ndjson'
+        )
+        response['X-Accel-Buffering'] = 'no'
+        return response
+    
+    def _stream(self, request, quota, questions, department, generate):
+        start_time = time.time()
+        vector_search = VectorSearchService()
+        completed = {}
+        
+        try:
+            try:
+                all_results = vector_search.search_many(
+                    questions,
+                    request.user,
+                    department=department,
+                    max_workers=settings.BATCH_QUERY_CONFIG['SEARCH_CONCURRENCY']
+                )
+            except Exception as e:
+                logger.error(f"Batch search error: {str(e)}", exc_info=True)
+                yield self._line({'type': 'error', 'error': 'An error occurred processing your queries. Please try again.'})
+                return
+            
+            # Record whatever was answered even if the client disconnects
+            # mid-stream: the generator is then closed at a yield, and those
+            # answers have already been paid for in tokens
+            try:
+                yield from self._results(questions, all_results, generate, completed, start_time)
+            finally:
+                query_ids = self._record_batch(request, vector_search, questions, department, all_results, completed)
+        finally:
+            # Only answered questions count against the quota, however the
+            # stream ends (search error, failed write, client disconnect)
+            quota.release(len(questions) - self._num_answered(completed))
+        
+        yield self._line({
+            'type': 'summary',
+            'num_questions': len(questions),
+            'num_answered': self._num_answered(completed),
+            'num_failed': len(questions) - len(completed),
+            'tokens_used': sum(record['tokens_used'] for record in completed.values()),
+            'response_time_ms': self._elapsed_ms(start_time),
+            'query_ids': query_ids,
+        })
+    
+    def _results(self, questions, all_results, generate, completed, start_time):
+        """
+        Yield a result (or error) line per question as it completes,
+        adding each answered question to `completed`.
+        """
+        for index, search_results in enumerate(all_results):
+            if not search_results:
+                completed[index] = {
+                    'answer': self.NO_RESULTS_ANSWER,
+                    'sources': [],
+                    'context_used': '',
+                    'context_tokens': 0,
+                    'tokens_used': 0,
+                    'response_time_ms': 0,
+                    'was_successful': False,
+                }
+            elif not generate:
+                completed[index] = {
+                    'answer': '',
+                    'sources': search_results,
+                    'context_used': '',
+                    'context_tokens': 0,
+                    'tokens_used': 0,
+                    'response_time_ms': self._elapsed_ms(start_time),
+                    'was_successful': True,
+                }
+            else:
+                continue
+            yield self._line(self._result_line(index, questions, completed[index]))
+        
+        if not generate:
+            return
+        
+        def answer(index):
+            llm_service = LLMService()
+            answer_text, tokens_used, context = llm_service.generate_answer(
+                question=questions[index],
+                context_chunks=all_results[index]
+            )
+            return answer_text, tokens_used, context, llm_service.model
+        
+        pending = [i for i, search_results in enumerate(all_results) if search_results]
+        workers = max(1, min(settings.BATCH_QUERY_CONFIG['GENERATION_CONCURRENCY'], len(pending)))
+        executor = ThreadPoolExecutor(max_workers=workers)
+        futures = {executor.submit(answer, index): index for index in pending}
+        
+        try:
+            for future in as_completed(futures):
+                index = futures[future]
+                try:
+                    completed[index] = self._answered(future.result(), all_results[index], start_time)
+                except Exception as e:
+                    logger.error(f"Batch generation error for question {index}: {str(e)}")
+                    yield self._line({
+                        'type': 'error',
+                        'index': index,
+                        'question': questions[index],
+                        'error': 'An error occurred generating this answer.'
+                    })
+                    continue
+                
+                yield self._line(self._result_line(index, questions, completed[index]))
+        finally:
+            # After a disconnect, don't start questions nobody will read.
+            # Those already being generated are waited for and kept.
+            executor.shutdown(wait=True, cancel_futures=True)
+            for future, index in futures.items():
+                if index not in completed and not future.cancelled() and future.exception() is None:
+                    completed[index] = self._answered(future.result(), all_results[index], start_time)
+    
+    def _answered(self, result, search_results, start_time):
+        answer_text, tokens_used, context, model = result
+        return {
+            'answer': answer_text,
+            'sources': context.included(search_results),
+            'context_used': context.text,
+            'context_tokens': context.tokens,
+            'tokens_used': tokens_used,
+            'model': model,
+            'response_time_ms': self._elapsed_ms(start_time),
+            'was_successful': True,
+        }
+    
+    def _num_answered(self, completed):
+        return sum(1 for record in completed.values() if record['was_successful'])
+    
+    def _elapsed_ms(self, start_time):
+        return int((time.time() - start_time) * 1000)
+    
+    def _result_line(self, index, questions, record):
+        return {
+            'type': 'result',
+            'index': index,
+            'question': questions[index],
+            'answer': record['answer'],
+            'sources': [
+                {
+                    'chunk_id': result['chunk'].id,
+                    'document_title': result['document_title'],
+                    'version_number': result['version_number'],
+                    'text': result['text'],
+                    'similarity_score': result['similarity_score'],
+                    'rank': rank,
+                    'metadata': result['metadata']
+                }
+                for rank, result in enumerate(record['sources'], 1)
+            ],
+            'tokens_used': record['tokens_used'],
+            'context_tokens': record['context_tokens'],
+            'response_time_ms': record['response_time_ms'],
+        }
+    
+    @transaction.atomic
+    def _record_batch(self, request, vector_search, questions, department, all_results, completed):
+        """
+        Bulk-insert Query, QuerySource and token ledger rows.
+        Returns {index: query_id}.
+        """
+        user = request.user
+        indexes = sorted(completed)
+        
+        queries = Query.objects.bulk_create([
+            Query(
+                user=user,
+                question=questions[index],
+                answer=completed[index]['answer'],
+                context_used=completed[index]['context_used'],
+                context_tokens=completed[index]['context_tokens'],
+                tokens_used=completed[index]['tokens_used'],
+                response_time_ms=completed[index]['response_time_ms'],
+                was_successful=completed[index]['was_successful'],
+                num_chunks_retrieved=len(all_results[index]),
+                avg_similarity_score=vector_search.get_similarity_stats(all_results[index])['avg_score']
+            )
+            for index in indexes
+        ])
+        
+        QuerySource.objects.bulk_create([
+            QuerySource(
+                query=query,
+                chunk=result['chunk'],
+                similarity_score=result['similarity_score'],
+                rank=rank
+            )
+            for index, query in zip(indexes, queries)
+            for rank, result in enumerate(completed[index]['sources'], 1)
+        ])
+        
+        TokenUsageService.record_many([
+            TokenUsage(
+                user=user,
+                query=query,
+                department=department or all_results[index][0]['chunk'].department,
+                model=completed[index].get('model', ''),
+                tokens=completed[index]['tokens_used']
+            )
+            for index, query in zip(indexes, queries)
+            if completed[index]['tokens_used'] > 0
+        ])
+        
+        answered = sum(1 for index in indexes if completed[index]['was_successful'])
+        tokens_used = sum(completed[index]['tokens_used'] for index in indexes)
+        
+        AuditService.log_action(
+            user=user,
+            action='QUERY_BATCH_EXECUTED',
+            resource_type='Query',
+            details={
+                'num_questions': len(questions),
+                'num_answered': answered,
+                'tokens_used': tokens_used,
+                'query_ids': [query.id for query in queries]
+            },
+            request=request
+        )
+        
+        return {index: query.id for index, query in zip(indexes, queries)}
+    
+    def _line(self, payload):
+        return json.dumps(payload, default=str) + "\n"
+
+
+class SearchView(views.APIView):
+    """
+    Ranked chunks only, no LLM call and no quota charge. Audit goes
+    through the async path since consumers call this at high volume.
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def post(self, request):
+        serializer = SearchRequestSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(
+                serializer.errors,
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        data = serializer.validated_data
+        start_time = time.time()
+        
+        try:
+            vector_search = VectorSearchService()
+            search_results = vector_search.search(
+                query=data['query'],
+                user=request.user,
+                top_k=data.get('top_k'),
+                department=data.get('department'),
+                neighbor_window=0,
+                hybrid=data['hybrid'],
+                rerank=data['rerank']
+            )
+        except (UpstreamRateLimited, CircuitOpenError) as e:
+            return upstream_busy_response(e)
+        
+        except Exception as e:
+            logger.error(f"Search error: {str(e)}", exc_info=True)
+            return Response(
+                {'error': 'An error occurred processing your search. Please try again.'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+        
+        response_time_ms = int((time.time() - start_time) * 1000)
+        
+        AuditService.log_action_async(
+            user=request.user,
+            action='SEARCH_EXECUTED',
+            resource_type='DocumentChunk',
+            details={
+                'query_preview': data['query'][:100],
+                'num_results': len(search_results),
+                'hybrid': data['hybrid'],
+                'response_time_ms': response_time_ms
+            },
+            request=request
+        )
+        
+        return Response({
+            'query': data['query'],
+            'results': SearchResultSerializer(
+                search_results, many=True, fields=data.get('fields')
+            ).data,
+            'num_results': len(search_results),
+            'response_time_ms': response_time_ms
+        }, status=status.HTTP_200_OK)
+
+
+class UpstreamStatusView(views.APIView):
+    """
+    Circuit breaker and rate limiter state for the Hugging Face endpoints.
+    POST {"service": "generation"} closes that breaker by hand.
+    """
+    permission_classes = [IsAuthenticated, IsAdmin]
     
-    def _format_context(self, search_results):
-        context_parts = []
-        for result in search_results:
-            context_parts.append(
-                f"[{result['document_title']} v{result['version_number']}]\n"
-                f"{result['text']}\n"
+    SERVICES = ['embedding', 'generation']
+    
+    def get(self, request):
+        try:
+            return Response({
+                service: {
+                    'circuit_breaker': get_circuit_breaker(service).state(),
+                    'rate_limiter': get_rate_limiter(service).state(),
+                }
+                for service in self.SERVICES
+            }, status=status.HTTP_200_OK)
+        except Exception as e:
+            logger.error(f"Upstream status unavailable: {str(e)}")
+            return Response(
+                {'error': 'Upstream state is unavailable (Redis unreachable).'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+    
+    def post(self, request):
+        service = request.data.get('service')
+        if service not in self.SERVICES:
+            return Response(
+                {'error': f"service must be one of: {', '.join(self.SERVICES)}"},
+                status=status.HTTP_400_BAD_REQUEST
             )
-        return "\n\n".join(context_parts)
+        
+        get_circuit_breaker(service).reset()
+        
+        AuditService.log_action(
+            user=request.user,
+            action='CIRCUIT_BREAKER_RESET',
+            resource_type='Upstream',
+            details={'service': service},
+            request=request
+        )
+        
+        return Response({
+            'message': f"Circuit breaker for {service} closed",
+            'circuit_breaker': get_circuit_breaker(service).state()
+        }, status=status.HTTP_200_OK)
+
+
+def with_serialized_sources(queryset):
+    """
+    Load what QuerySerializer renders in a fixed number of queries.
+    
+    Sources are prefetched together with their chunk in one joined
+    query, reading only the serialized columns (never the embedding).
+    """
+    sources = QuerySource.objects.select_related('chunk').only(
+        'query_id', 'similarity_score', 'rank',
+        *(f'chunk__{field}' for field in DocumentChunkQuerySet.DISPLAY_FIELDS)
+    )
+    return queryset.select_related('user').prefetch_related(
+        Prefetch('sources', queryset=sources)
+    )
 
 
 class QueryHistoryView(generics.ListAPIView):
@@ -186,15 +683,13 @@ class QueryHistoryView(generics.ListAPIView):
     
     def get_queryset(self):
         user = self.request.user
-        queryset = Query.objects.filter(user=user).prefetch_related('sources')
+        queryset = with_serialized_sources(Query.objects.filter(user=user))
         
-        # Search filter
+        # Search filter, best matches first
         search = self.request.query_params.get('search')
         if search:
-            queryset = queryset.filter(
-                models.Q(question__icontains=search) |
-                models.Q(answer__icontains=search)
-            )
+            queryset = trigram_search(queryset, search, ['question', 'answer'])
+            return queryset.order_by('-search_rank', '-created_at')
         
         return queryset.order_by('-created_at')
 
@@ -206,8 +701,8 @@ class QueryDetailView(generics.RetrieveAPIView):
     def get_queryset(self):
 
         if self.request.user.is_admin():
-            return Query.objects.all()
-        return Query.objects.filter(user=self.request.user)
+            return with_serialized_sources(Query.objects.all())
+        return with_serialized_sources(Query.objects.filter(user=self.request.user))
 
 
 class FeedbackCreateView(views.APIView):
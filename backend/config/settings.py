@@ -19,6 +19,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     
     # Third-party apps
     'rest_framework',
@@ -164,10 +165,12 @@ CELERY_TASK_TRACK_STARTED = True
 CELERY_TASK_TIME_LIMIT = 30 * 60  # 30 minutes max per task
 
 # Cache Config  Redis
+REDIS_URL = config('REDIS_URL', default='redis://localhost:6379/1')
+
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.redis.RedisCache',
-        'LOCATION': config('REDIS_URL', default='redis://localhost:6379/1'),
+        'LOCATION': REDIS_URL,
     }
 }
 
@@ -184,6 +187,61 @@ LLM_CONFIG = {
     'MODEL': 'mistralai/Mistral-7B-Instruct-v0.2', 
     'EMBEDDING_MODEL': 'BAAI/bge-base-en-v1.5',
     'EMBEDDING_DIMENSION': 768, 
+    # 'huggingface' (router API), 'onnx' (local CPU) or a dotted path
+    'EMBEDDING_BACKEND': config('EMBEDDING_BACKEND', default='huggingface'),
+    'EMBEDDING_MAX_LENGTH': config('EMBEDDING_MAX_LENGTH', default=512, cast=int),
+    # onnx backend: directory with tokenizer.json and the exported model
+    'ONNX_MODEL_DIR': config('EMBEDDING_ONNX_MODEL_DIR', default=str(BASE_DIR / 'models' / 'bge-base-en-v1.5')),
+    'ONNX_MODEL_FILE': config('EMBEDDING_ONNX_MODEL_FILE', default='model.onnx'),
+    # Intra-op threads per process (0 = one per core); keep
+    # threads x worker processes <= cores
+    'ONNX_THREADS': config('EMBEDDING_ONNX_THREADS', default=1, cast=int),
+    'ONNX_BATCH_SIZE': config('EMBEDDING_ONNX_BATCH_SIZE', default=32, cast=int),
+    'ONNX_MAX_BATCH_TOKENS': config('EMBEDDING_ONNX_MAX_BATCH_TOKENS', default=8192, cast=int),
+    # Concurrent single-query embeddings in a process share one call. Off by
+    # default: with sync gunicorn workers every batch holds one query and
+    # only adds the wait.
+    'QUERY_BATCHING': config('EMBEDDING_QUERY_BATCHING', default=False, cast=bool),
+    'QUERY_BATCH_MAX_SIZE': config('EMBEDDING_QUERY_BATCH_MAX_SIZE', default=32, cast=int),
+    'QUERY_BATCH_MAX_WAIT_MS': config('EMBEDDING_QUERY_BATCH_MAX_WAIT_MS', default=5, cast=float),
+    'QUERY_BATCH_TIMEOUT': config('EMBEDDING_QUERY_BATCH_TIMEOUT', default=60, cast=float),
+    # Prompt budget: min(MAX_CONTEXT_TOKENS, CONTEXT_WINDOW - answer tokens - prompt)
+    'CONTEXT_WINDOW': config('LLM_CONTEXT_WINDOW', default=32768, cast=int),
+    'MAX_CONTEXT_TOKENS': config('MAX_CONTEXT_TOKENS', default=3000, cast=int),
+    # Identical concurrent prompts share one upstream call across workers
+    'SINGLE_FLIGHT_ENABLED': config('LLM_SINGLE_FLIGHT', default=True, cast=bool),
+    'SINGLE_FLIGHT_WAIT_SECONDS': config('LLM_SINGLE_FLIGHT_WAIT_SECONDS', default=75, cast=int),
+    # While the generation breaker is open: 'retrieval' answers with sources
+    # only, 'fail_fast' returns 503
+    'DEGRADED_MODE': config('LLM_DEGRADED_MODE', default='retrieval'),
+}
+
+# Client-side limits for the Hugging Face APIs, shared through Redis
+HF_API_CONFIG = {
+    'EMBEDDING_RPS': config('HF_EMBEDDING_RPS', default=5, cast=float),
+    'EMBEDDING_BURST': config('HF_EMBEDDING_BURST', default=10, cast=int),
+    'EMBEDDING_LATENCY_TARGET_MS': config('HF_EMBEDDING_LATENCY_TARGET_MS', default=5000, cast=int),
+    'EMBEDDING_BATCH_SIZE': config('HF_EMBEDDING_BATCH_SIZE', default=32, cast=int),
+    'GENERATION_RPS': config('HF_GENERATION_RPS', default=2, cast=float),
+    'GENERATION_BURST': config('HF_GENERATION_BURST', default=5, cast=int),
+    'GENERATION_LATENCY_TARGET_MS': config('HF_GENERATION_LATENCY_TARGET_MS', default=30000, cast=int),
+    # AIMD concurrency bounds per endpoint
+    'MIN_CONCURRENCY': config('HF_MIN_CONCURRENCY', default=1, cast=int),
+    'MAX_CONCURRENCY': config('HF_MAX_CONCURRENCY', default=8, cast=int),
+    'MAX_RETRIES': config('HF_MAX_RETRIES', default=4, cast=int),
+    'RETRY_BASE_DELAY': config('HF_RETRY_BASE_DELAY', default=1.0, cast=float),
+    'RETRY_MAX_DELAY': config('HF_RETRY_MAX_DELAY', default=30.0, cast=float),
+    # How long a caller waits for a rate/concurrency slot before giving up
+    'ACQUIRE_TIMEOUT': config('HF_ACQUIRE_TIMEOUT', default=30.0, cast=float),
+    # Slots not released by a crashed process expire after this
+    'SLOT_TTL': config('HF_SLOT_TTL', default=90, cast=int),
+    # Budget for calls made while serving a request (query/search): retries
+    # and slot wait before answering 503. The values above apply to ingestion.
+    'SYNC_MAX_RETRIES': config('HF_SYNC_MAX_RETRIES', default=1, cast=int),
+    'SYNC_ACQUIRE_TIMEOUT': config('HF_SYNC_ACQUIRE_TIMEOUT', default=3.0, cast=float),
+    # Circuit breaker: open after N consecutive failures, probe again after
+    'BREAKER_FAILURE_THRESHOLD': config('HF_BREAKER_FAILURE_THRESHOLD', default=5, cast=int),
+    'BREAKER_RESET_SECONDS': config('HF_BREAKER_RESET_SECONDS', default=30, cast=int),
 }
 
 # Document Processing Configuration
@@ -192,18 +250,78 @@ DOCUMENT_CONFIG = {
     'ALLOWED_FILE_TYPES': config('ALLOWED_FILE_TYPES', default='pdf,docx,txt').split(','),
     'CHUNK_SIZE': config('CHUNK_SIZE', default=500, cast=int),
     'CHUNK_OVERLAP': config('CHUNK_OVERLAP', default=50, cast=int),
+    # Bulk upload (POST /api/documents/bulk-upload/)
+    'BULK_UPLOAD_MAX_FILES': config('BULK_UPLOAD_MAX_FILES', default=5000, cast=int),
+    'BULK_UPLOAD_MAX_ARCHIVE_MB': config('BULK_UPLOAD_MAX_ARCHIVE_MB', default=2048, cast=int),
+    # Resumable uploads (/api/documents/uploads/): parts go straight to
+    # MEDIA_ROOT, so the limit is disk space rather than worker memory
+    'CHUNKED_UPLOAD_MAX_SIZE_MB': config('CHUNKED_UPLOAD_MAX_SIZE_MB', default=2048, cast=int),
+    'CHUNKED_UPLOAD_PART_SIZE_MB': config('CHUNKED_UPLOAD_PART_SIZE_MB', default=8, cast=int),
+    'CHUNKED_UPLOAD_EXPIRY_HOURS': config('CHUNKED_UPLOAD_EXPIRY_HOURS', default=24, cast=int),
+    # Tag filter counts (GET /api/documents/tags/)
+    'TAG_FACETS_LIMIT': config('TAG_FACETS_LIMIT', default=50, cast=int),
+    'TAG_FACETS_CACHE_SECONDS': config('TAG_FACETS_CACHE_SECONDS', default=60, cast=int),
 }
 
 # Vector Search 
 VECTOR_SEARCH_CONFIG = {
     'TOP_K_RESULTS': config('TOP_K_RESULTS', default=5, cast=int),
     'SIMILARITY_THRESHOLD': config('SIMILARITY_THRESHOLD', default=0.7, cast=float),
+    # Filtered ANN search: exact scan below this many candidate chunks
+    'EXACT_SCAN_THRESHOLD': config('EXACT_SCAN_THRESHOLD', default=5000, cast=int),
+    'CHUNK_COUNT_CACHE_SECONDS': config('CHUNK_COUNT_CACHE_SECONDS', default=300, cast=int),
+    # HNSW ef_search starts here and doubles until enough rows survive the filter
+    'HNSW_EF_SEARCH': config('HNSW_EF_SEARCH', default=40, cast=int),
+    'HNSW_MAX_EF_SEARCH': config('HNSW_MAX_EF_SEARCH', default=400, cast=int),
+    # pgvector >= 0.8 only: 'relaxed_order' or 'strict_order', blank to disable
+    'HNSW_ITERATIVE_SCAN': config('HNSW_ITERATIVE_SCAN', default=''),
+    # ANN index to scan: 'halfvec' or 'binary'
+    'INDEX_QUANTIZATION': config('INDEX_QUANTIZATION', default='halfvec'),
+    # Candidates fetched from the compact index per result, rescored at full precision
+    'RESCORE_MULTIPLIER': config('RESCORE_MULTIPLIER', default=4, cast=int),
+    # 'pgvector' (default) or 'numpy' for the in-process index
+    'BACKEND': config('VECTOR_SEARCH_BACKEND', default='pgvector'),
+    'NUMPY_INDEX_DIR': config('NUMPY_INDEX_DIR', default=str(BASE_DIR / 'vector_index')),
+    'NUMPY_INDEX_MAX_SEGMENTS': config('NUMPY_INDEX_MAX_SEGMENTS', default=32, cast=int),
+    # MMR diversification: 1.0 = pure relevance, lower trades relevance for variety
+    'MMR_LAMBDA': config('MMR_LAMBDA', default=0.7, cast=float),
+    'MMR_CANDIDATES': config('MMR_CANDIDATES', default=20, cast=int),
+    # Adjacent chunks added around each hit when budget allows, 0 to disable
+    'NEIGHBOR_WINDOW': config('NEIGHBOR_WINDOW', default=1, cast=int),
 }
 
 # Rate Limiting
 RATE_LIMIT_CONFIG = {
     'MAX_QUERIES_PER_DAY': config('MAX_QUERIES_PER_DAY', default=100, cast=int),
+    # Questions in any sliding 60s window on top of the daily cap, 0 to disable
+    'MAX_QUERIES_PER_MINUTE': config('MAX_QUERIES_PER_MINUTE', default=0, cast=int),
     'MAX_TOKENS_PER_QUERY': config('MAX_TOKENS_PER_QUERY', default=2000, cast=int),
+    # How often Redis query counters are copied to User.daily_query_count
+    'QUOTA_SYNC_SECONDS': config('QUOTA_SYNC_SECONDS', default=300, cast=int),
+    # How often the token ledger is rolled up into daily and per-user totals
+    'TOKEN_USAGE_AGGREGATE_SECONDS': config('TOKEN_USAGE_AGGREGATE_SECONDS', default=300, cast=int),
+}
+
+CELERY_BEAT_SCHEDULE = {
+    'sync-query-counts': {
+        'task': 'apps.core.tasks.sync_query_counts_task',
+        'schedule': RATE_LIMIT_CONFIG['QUOTA_SYNC_SECONDS'],
+    },
+    'aggregate-token-usage': {
+        'task': 'apps.analytics.tasks.aggregate_token_usage_task',
+        'schedule': RATE_LIMIT_CONFIG['TOKEN_USAGE_AGGREGATE_SECONDS'],
+    },
+    'cleanup-upload-sessions': {
+        'task': 'apps.documents.tasks.cleanup_upload_sessions_task',
+        'schedule': 60 * 60,
+    },
+}
+
+# Batch query endpoint (/api/retrieval/query/batch/)
+BATCH_QUERY_CONFIG = {
+    'MAX_QUESTIONS': config('BATCH_MAX_QUESTIONS', default=100, cast=int),
+    'SEARCH_CONCURRENCY': config('BATCH_SEARCH_CONCURRENCY', default=4, cast=int),
+    'GENERATION_CONCURRENCY': config('BATCH_GENERATION_CONCURRENCY', default=4, cast=int),
 }
 
 # Logging 
@@ -0,0 +1,35 @@
+import pytest
+from rest_framework.test import APIClient
+
+from apps.core.models import UserRole
+from apps.core.tests.factories import UserFactory
+
+
+@pytest.fixture(autouse=True)
+def test_settings(settings, tmp_path):
+    # Uploads go to a throwaway directory; upstream calls are stubbed per
+    # test, but the services refuse to start without an API key
+    settings.MEDIA_ROOT = tmp_path / 'media'
+    settings.HF_EMBEDDING_API_KEY = 'test-key'
+    settings.HF_LLM_API_KEY = 'test-key'
+    return settings
+
+
+@pytest.fixture
+def user(db):
+    return UserFactory(role=UserRole.EMPLOYEE)
+
+
+@pytest.fixture
+def content_owner(db):
+    return UserFactory(role=UserRole.CONTENT_OWNER)
+
+
+@pytest.fixture
+def admin(db):
+    return UserFactory(role=UserRole.ADMIN)
+
+
+@pytest.fixture
+def api_client():
+    return APIClient()